@@ -1,19 +1,23 @@
 """
 Chat and conversational AI endpoints for FinMDA-Bot.
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
 from datetime import datetime
+import json
 import time
 
-from app.database import get_db
+from app.database import get_db, SessionLocal
 from app.models import ChatSession, ChatMessage, Document
 from app.schemas import (
     ChatQueryRequest, ChatQueryResponse, ChatSessionCreate, 
     ChatSessionResponse, ChatMessageResponse
 )
-from app.services.agent_system import AgentSystem
+from app.services.agent_system import AgentSystem, get_agent_system
+from app.services.document_processor import content_document_ids
 from app.services.rag_service import RAGService
 
 router = APIRouter()
@@ -75,6 +79,61 @@ async def get_chat_session(
     )
 
 
+def _get_or_create_session(db: Session, query_data: ChatQueryRequest) -> ChatSession:
+    """Load the requested chat session or start a new one."""
+    if query_data.session_id:
+        session = db.query(ChatSession).filter(ChatSession.id == query_data.session_id).first()
+        if not session:
+            raise HTTPException(status_code=404, detail="Chat session not found")
+        return session
+
+    session = ChatSession(
+        document_id=query_data.document_id,
+        session_name=f"Session {datetime.utcnow().strftime('%Y-%m-%d %H:%M')}"
+    )
+    db.add(session)
+    db.commit()
+    db.refresh(session)
+    return session
+
+
+def _save_message(db: Session, session_id: int, role: str, content: str, **fields) -> ChatMessage:
+    """Persist a chat message and bump the session's last activity."""
+    message = ChatMessage(session_id=session_id, role=role, content=content, **fields)
+    db.add(message)
+    db.query(ChatSession).filter(ChatSession.id == session_id).update(
+        {ChatSession.last_activity: datetime.utcnow()}
+    )
+    db.commit()
+    db.refresh(message)
+    return message
+
+
+def _content_document_id(db: Session, session: ChatSession) -> Optional[int]:
+    """ID the session document's content is indexed (and cached) under."""
+    if not session.document_id:
+        return None
+    return content_document_ids(db, [session.document_id]).get(session.document_id)
+
+
+async def _retrieve_context(db: Session, session: ChatSession, query: str) -> str:
+    """RAG context for the session's document, if it has a processed one.
+
+    Duplicate uploads are served from their canonical document's index.
+    """
+    if not session.document_id:
+        return ""
+    document = db.query(Document).filter(Document.id == session.document_id).first()
+    if not document or not document.is_processed:
+        return ""
+
+    rag_service = RAGService()
+    try:
+        return await rag_service.retrieve_context(query, document_id=document.content_document_id)
+    finally:
+        rag_service.close()
+
+
 @router.post("/query", response_model=ChatQueryResponse)
 async def chat_query(
     query_data: ChatQueryRequest,
@@ -84,74 +143,35 @@ async def chat_query(
     
     start_time = time.time()
     
-    # Get or create session
-    if query_data.session_id:
-        session = db.query(ChatSession).filter(ChatSession.id == query_data.session_id).first()
-        if not session:
-            raise HTTPException(status_code=404, detail="Chat session not found")
-    else:
-        # Create new session
-        session = ChatSession(
-            document_id=query_data.document_id,
-            session_name=f"Session {datetime.utcnow().strftime('%Y-%m-%d %H:%M')}"
-        )
-        db.add(session)
-        db.commit()
-        db.refresh(session)
-    
-    # Save user message
-    user_message = ChatMessage(
-        session_id=session.id,
-        role="user",
-        content=query_data.query
-    )
-    db.add(user_message)
-    db.commit()
-    db.refresh(user_message)
+    session = _get_or_create_session(db, query_data)
+    _save_message(db, session.id, "user", query_data.query)
     
     try:
         # Initialize services
-        agent_system = AgentSystem()
-        rag_service = RAGService()
+        agent_system = get_agent_system()
         
         # Get document context if available
-        context = ""
-        if session.document_id:
-            document = db.query(Document).filter(Document.id == session.document_id).first()
-            if document and document.is_processed:
-                # Retrieve relevant context using RAG
-                context = await rag_service.retrieve_context(
-                    query_data.query,
-                    document_id=session.document_id
-                )
+        context = await _retrieve_context(db, session, query_data.query)
         
         # Process query through agent system
         response_data = await agent_system.process_query(
             query=query_data.query,
             context=context,
             session_id=session.id,
-            document_id=session.document_id
+            document_id=_content_document_id(db, session)
         )
         
+        processing_time = time.time() - start_time
+        
         # Save assistant response
-        assistant_message = ChatMessage(
-            session_id=session.id,
-            role="assistant",
-            content=response_data["response"],
+        assistant_message = _save_message(
+            db, session.id, "assistant", response_data["response"],
             model_used=response_data.get("model_used"),
             tokens_used=response_data.get("tokens_used"),
             confidence_score=response_data.get("confidence_score"),
-            citations=response_data.get("citations")
+            citations=response_data.get("citations"),
+            processing_time=processing_time
         )
-        db.add(assistant_message)
-        db.commit()
-        db.refresh(assistant_message)
-        
-        # Update session activity
-        session.last_activity = datetime.utcnow()
-        db.commit()
-        
-        processing_time = time.time() - start_time
         
         return ChatQueryResponse(
             response=response_data["response"],
@@ -166,16 +186,11 @@ async def chat_query(
     except Exception as e:
         # Save error message and return a graceful ChatQueryResponse
         error_text = f"I apologize, but I encountered an error processing your request: {str(e)}"
-        error_message = ChatMessage(
-            session_id=session.id,
-            role="assistant",
-            content=error_text
+        processing_time = time.time() - start_time
+        error_message = _save_message(
+            db, session.id, "assistant", error_text, processing_time=processing_time
         )
-        db.add(error_message)
-        db.commit()
-        db.refresh(error_message)
 
-        processing_time = time.time() - start_time
         return ChatQueryResponse(
             response=error_text,
             session_id=session.id,
@@ -187,6 +202,144 @@ async def chat_query(
         )
 
 
+async def _stream_chat(
+    agent_system: AgentSystem,
+    query: str,
+    context: str,
+    session_id: int,
+    document_id: Optional[int],
+    start_time: float
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """Yield ``(event, data)`` pairs for a streamed answer.
+
+    Emits ``start``, then one ``token`` per generated piece, then ``done``
+    with the saved message once the stream completes, or ``error`` if
+    generation fails part-way. The assistant message is written with its
+    own database session because the request's session is closed before
+    a streamed body runs.
+    """
+    yield "start", {"session_id": session_id}
+
+    pieces: List[str] = []
+    time_to_first_token: Optional[float] = None
+    try:
+        async for text in agent_system.stream_query(
+            query=query,
+            context=context,
+            session_id=session_id,
+            document_id=document_id
+        ):
+            if time_to_first_token is None:
+                time_to_first_token = time.time() - start_time
+            pieces.append(text)
+            yield "token", {"text": text}
+    except Exception as e:
+        error_text = f"I apologize, but I encountered an error processing your request: {str(e)}"
+        with SessionLocal() as db:
+            message = _save_message(
+                db, session_id, "assistant", "".join(pieces) or error_text,
+                processing_time=time.time() - start_time,
+                time_to_first_token=time_to_first_token
+            )
+        yield "error", {"detail": error_text, "session_id": session_id, "message_id": message.id}
+        return
+
+    response = "".join(pieces) or "I couldn't generate a response."
+    metadata = agent_system.response_metadata(response, context)
+    processing_time = time.time() - start_time
+    with SessionLocal() as db:
+        message = _save_message(
+            db, session_id, "assistant", response,
+            **metadata,
+            processing_time=processing_time,
+            time_to_first_token=time_to_first_token
+        )
+
+    yield "done", ChatQueryResponse(
+        response=response,
+        session_id=session_id,
+        message_id=message.id,
+        confidence_score=metadata["confidence_score"],
+        citations=metadata["citations"],
+        processing_time=processing_time,
+        model_used=metadata["model_used"],
+        time_to_first_token=time_to_first_token
+    ).model_dump()
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Encode one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post("/query/stream")
+async def chat_query_stream(
+    query_data: ChatQueryRequest,
+    db: Session = Depends(get_db)
+):
+    """Stream a chat answer token by token as server-sent events."""
+    
+    start_time = time.time()
+    
+    session = _get_or_create_session(db, query_data)
+    _save_message(db, session.id, "user", query_data.query)
+    
+    agent_system = get_agent_system()
+    context = await _retrieve_context(db, session, query_data.query)
+    
+    session_id, document_id = session.id, _content_document_id(db, session)
+    
+    async def events():
+        async for event, data in _stream_chat(
+            agent_system, query_data.query, context, session_id, document_id, start_time
+        ):
+            yield format_sse(event, data)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/ws")
+async def chat_websocket(websocket: WebSocket):
+    """Stream chat answers over a WebSocket.
+
+    Each client message is a ``ChatQueryRequest`` JSON object; the server
+    replies with ``{"type": event, ...data}`` messages using the same
+    events as the SSE endpoint.
+    """
+    await websocket.accept()
+    agent_system = get_agent_system()
+    try:
+        while True:
+            payload = await websocket.receive_text()
+            start_time = time.time()
+            try:
+                query_data = ChatQueryRequest.model_validate_json(payload)
+            except ValidationError as e:
+                await websocket.send_json({"type": "error", "detail": json.loads(e.json())})
+                continue
+
+            with SessionLocal() as db:
+                try:
+                    session = _get_or_create_session(db, query_data)
+                except HTTPException as e:
+                    await websocket.send_json({"type": "error", "detail": e.detail})
+                    continue
+                _save_message(db, session.id, "user", query_data.query)
+                context = await _retrieve_context(db, session, query_data.query)
+                session_id, document_id = session.id, _content_document_id(db, session)
+
+            async for event, data in _stream_chat(
+                agent_system, query_data.query, context, session_id, document_id, start_time
+            ):
+                await websocket.send_json({"type": event, **data})
+    except WebSocketDisconnect:
+        pass
+
+
 @router.get("/sessions/{session_id}/messages", response_model=List[ChatMessageResponse])
 async def get_chat_messages(
     session_id: int,
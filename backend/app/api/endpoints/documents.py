@@ -3,26 +3,32 @@ Document processing endpoints for FinMDA-Bot.
 """
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import os
-import uuid
 from datetime import datetime
 
 from app.database import get_db
 from app.models import Document
-from app.schemas import DocumentResponse, DocumentDetail, FileUploadResponse
+from app.schemas import DocumentResponse, DocumentDetail, FileUploadResponse, DocumentStatusResponse
 from app.services.document_processor import DocumentProcessor
+from app.services.ingestion_queue import get_ingestion_queue, report_job_status, IngestionQueueFull
+from app.services.upload_storage import stream_upload, store_blob, UploadTooLarge
 from app.config import settings
 
 router = APIRouter()
 
 
-@router.post("/upload", response_model=FileUploadResponse)
+@router.post("/upload", response_model=FileUploadResponse, status_code=202)
 async def upload_document(
     file: UploadFile = File(...),
+    company: Optional[str] = Form(None),
     db: Session = Depends(get_db)
 ):
-    """Upload and process a financial document."""
+    """Upload a financial document and queue it for processing.
+
+    Returns immediately with a job ID; poll ``/documents/{id}/status``
+    for progress.
+    """
     
     # Validate file type
     file_extension = file.filename.split('.')[-1].lower()
@@ -32,55 +38,61 @@ async def upload_document(
             detail=f"File type {file_extension} not allowed. Allowed types: {settings.allowed_file_types}"
         )
     
-    # Validate file size
-    file_size = 0
-    content = await file.read()
-    file_size = len(content)
-    
-    if file_size > settings.max_file_size_mb * 1024 * 1024:
+    # Stream to disk, enforcing the size limit as bytes arrive
+    file_extension = file.filename.split('.')[-1]
+    try:
+        stored = await stream_upload(file, extension=file_extension)
+    except UploadTooLarge:
         raise HTTPException(
             status_code=400,
-            detail=f"File size {file_size / 1024 / 1024:.2f}MB exceeds limit of {settings.max_file_size_mb}MB"
+            detail=f"File size exceeds limit of {settings.max_file_size_mb}MB"
         )
-    
-    # Generate unique filename
-    file_id = str(uuid.uuid4())
-    file_extension = file.filename.split('.')[-1]
-    safe_filename = f"{file_id}.{file_extension}"
-    file_path = os.path.join(settings.upload_directory, safe_filename)
-    
-    # Save file
-    with open(file_path, "wb") as buffer:
-        buffer.write(content)
+    file_path = store_blob(stored, file_extension.lower())
+    file_size = stored.file_size
     
     # Create database record
     document = Document(
         filename=file.filename,
         file_path=file_path,
         file_type=file_extension,
-        file_size=file_size
+        file_size=file_size,
+        content_hash=stored.sha256,
+        processing_stage="queued"
     )
     
     db.add(document)
     db.commit()
     db.refresh(document)
     
-    # Process document asynchronously
+    # Identical content already processed: share its extraction and index
+    if settings.upload_dedup_enabled:
+        original = db.query(Document).filter(
+            Document.content_hash == stored.sha256,
+            Document.processing_stage == "completed",
+            Document.id != document.id
+        ).order_by(Document.id.desc()).first()
+        if original and DocumentProcessor().link_duplicate(original.id, document.id, company=company):
+            await report_job_status(document.id, "completed")
+            return FileUploadResponse(
+                document_id=document.id,
+                filename=document.filename,
+                file_type=document.file_type,
+                file_size=document.file_size,
+                upload_date=document.upload_date,
+                processing_status="completed"
+            )
+    
+    # Hand off to the background ingestion queue
     try:
-        processor = DocumentProcessor()
-        await processor.process_document(document.id, file_path, file_extension)
-        
-        # Update processing status
-        document.is_processed = True
-        db.commit()
-        
-        processing_status = "completed"
-    except Exception as e:
-        # Update error status
+        job_id = await get_ingestion_queue().submit(document.id, file_path, file_extension, company=company)
+    except IngestionQueueFull as e:
+        document.processing_stage = "failed"
         document.processing_error = str(e)
         db.commit()
-        
-        processing_status = "failed"
+        raise HTTPException(status_code=503, detail="Ingestion queue is full, retry later")
+    
+    document.job_id = job_id
+    db.commit()
     
     return FileUploadResponse(
         document_id=document.id,
@@ -88,7 +100,8 @@ async def upload_document(
         file_type=document.file_type,
         file_size=document.file_size,
         upload_date=document.upload_date,
-        processing_status=processing_status
+        processing_status="queued",
+        job_id=job_id
     )
 
 
@@ -99,7 +112,7 @@ async def list_documents(
     db: Session = Depends(get_db)
 ):
     """List all uploaded documents."""
-    documents = db.query(Document).offset(skip).limit(limit).all()
+    documents = db.query(Document).filter(Document.is_deleted.isnot(True)).offset(skip).limit(limit).all()
     return documents
 
 
@@ -111,10 +124,40 @@ async def get_document(
     """Get detailed information about a specific document."""
     document = db.query(Document).filter(Document.id == document_id).first()
     
-    if not document:
+    if not document or document.is_deleted:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    return document
+    detail = DocumentDetail.model_validate(document)
+    if document.canonical_document_id:
+        # Duplicate upload: content lives on the canonical document
+        canonical = db.query(Document).filter(Document.id == document.canonical_document_id).first()
+        if canonical:
+            detail.extracted_text = canonical.extracted_text
+            detail.extracted_tables = canonical.extracted_tables
+    return detail
+
+
+@router.get("/{document_id}/status", response_model=DocumentStatusResponse)
+async def get_document_status(
+    document_id: int,
+    db: Session = Depends(get_db)
+):
+    """Get the background ingestion status of a document."""
+    document = db.query(Document).filter(Document.id == document_id).first()
+    
+    if not document or document.is_deleted:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    return DocumentStatusResponse(
+        document_id=document.id,
+        job_id=document.job_id,
+        stage=document.processing_stage or ("completed" if document.is_processed else "uploaded"),
+        progress=document.processing_progress or 0.0,
+        is_processed=bool(document.is_processed),
+        error=document.processing_error,
+        started_at=document.processing_started_at,
+        completed_at=document.processing_completed_at
+    )
 
 
 @router.delete("/{document_id}")
@@ -122,18 +165,16 @@ async def delete_document(
     document_id: int,
     db: Session = Depends(get_db)
 ):
-    """Delete a document and its associated data."""
+    """Delete a document and its associated data.
+
+    Content shared with duplicate uploads (file, extraction, index) is
+    removed together with the last document referencing it.
+    """
     document = db.query(Document).filter(Document.id == document_id).first()
     
-    if not document:
+    if not document or document.is_deleted:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    # Delete file from filesystem
-    if os.path.exists(document.file_path):
-        os.remove(document.file_path)
-    
-    # Delete from database (cascade will handle related records)
-    db.delete(document)
-    db.commit()
+    await DocumentProcessor().delete_document(document_id)
     
     return {"message": "Document deleted successfully"}
@@ -3,16 +3,16 @@ Health check endpoints for FinMDA-Bot.
 """
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-<<<<<<< HEAD
 from sqlalchemy import text
-=======
->>>>>>> 5c3a0a0f3539fc0d352cb6c8a94fa282129f33e9
 from datetime import datetime
 import os
 
 from app.database import get_db
 from app.schemas import HealthResponse
 from app.config import settings
+from app.services.embedding_registry import embedding_registry
+from app.services.cache_service import query_embedding_cache, retrieval_cache, response_cache
+from app.services.reranker import get_reranker_stats
 
 router = APIRouter()
 
@@ -23,11 +23,7 @@ async def health_check(db: Session = Depends(get_db)):
     
     # Check database connection
     try:
-<<<<<<< HEAD
         db.execute(text("SELECT 1"))
-=======
-        db.execute("SELECT 1")
->>>>>>> 5c3a0a0f3539fc0d352cb6c8a94fa282129f33e9
         database_status = "healthy"
     except Exception as e:
         database_status = f"unhealthy: {str(e)}"
@@ -35,11 +31,7 @@ async def health_check(db: Session = Depends(get_db)):
     # Check services status
     services_status = {
         "database": database_status,
-<<<<<<< HEAD
         "gemini_api": "configured" if settings.gemini_api_key else "missing",
-=======
-        "openai_api": "configured" if settings.openai_api_key else "missing",
->>>>>>> 5c3a0a0f3539fc0d352cb6c8a94fa282129f33e9
         "upload_directory": "ready" if os.path.exists(settings.upload_directory) else "missing",
         "chroma_directory": "ready" if os.path.exists(settings.chroma_persist_directory) else "missing"
     }
@@ -55,5 +47,19 @@ async def health_check(db: Session = Depends(get_db)):
         timestamp=datetime.utcnow(),
         version=settings.app_version,
         database_status=database_status,
-        services_status=services_status
+        services_status=services_status,
+        cache_stats={
+            "query_embeddings": query_embedding_cache.get_stats(),
+            "retrievals": retrieval_cache.get_stats(),
+            "responses": response_cache.get_stats()
+        }
     )
+
+
+@router.get("/health/embeddings", response_model=dict)
+async def embedding_health():
+    """Report load times and reference counts of shared embedding resources."""
+    return {
+        **embedding_registry.get_metrics(),
+        "reranker": get_reranker_stats()
+    }
@@ -35,6 +35,7 @@ async def generate_mda_report(
     5. Provides citations to source data
     """
     
+    mda_generator = None
     try:
         # Initialize services
         mda_generator = MDAGenerator()
@@ -74,11 +75,16 @@ async def generate_mda_report(
             "citations": result.get("citations", []),
             "confidence": result.get("confidence", 0.0),
             "generation_time": result.get("generation_time", 0.0),
+            "failed_sections": result.get("failed_sections", []),
+            "partial": result.get("partial", False),
             "period": period
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating MD&A: {str(e)}")
+    finally:
+        if mda_generator is not None:
+            mda_generator.close()
 
 
 @router.post("/generate-section", response_model=Dict[str, Any])
@@ -105,6 +111,7 @@ async def generate_mda_section(
             detail=f"Invalid section type. Must be one of: {', '.join(valid_sections)}"
         )
     
+    mda_generator = None
     try:
         # Initialize services
         mda_generator = MDAGenerator()
@@ -125,8 +132,8 @@ async def generate_mda_section(
         }
         
         # Generate specific section
-        from app.services.agent_system import AgentSystem
-        agent_system = AgentSystem()
+        from app.services.agent_system import get_agent_system
+        agent_system = get_agent_system()
         
         section_result = await agent_system.generate_md_a_section(
             section_type=section_type,
@@ -143,6 +150,9 @@ async def generate_mda_section(
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating section: {str(e)}")
+    finally:
+        if mda_generator is not None:
+            mda_generator.close()
 
 
 @router.post("/analyze-financials", response_model=Dict[str, Any])
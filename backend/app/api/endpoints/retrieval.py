@@ -0,0 +1,71 @@
+"""
+Retrieval API endpoints.
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+import time
+
+from app.database import get_db
+from app.models import Document
+from app.schemas import BulkRetrievalRequest, BulkRetrievalResponse
+from app.services.document_processor import content_document_ids
+from app.services.rag_service import RAGService
+from app.config import settings
+
+router = APIRouter()
+
+
+@router.post("/bulk", response_model=BulkRetrievalResponse)
+async def bulk_retrieve(
+    request: BulkRetrievalRequest,
+    db: Session = Depends(get_db)
+):
+    """Run several queries over several documents in one batched vector search."""
+    start_time = time.time()
+
+    if len(request.queries) > settings.bulk_max_queries:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.bulk_max_queries} queries per request"
+        )
+
+    # Duplicate uploads are searched through their canonical document's index
+    content_ids = {}
+    if request.document_ids:
+        found = {
+            doc_id for (doc_id,) in db.query(Document.id).filter(
+                Document.id.in_(request.document_ids),
+                Document.is_processed == True
+            )
+        }
+        missing = sorted(set(request.document_ids) - found)
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Documents not found or not processed: {missing}")
+        content_ids = content_document_ids(db, request.document_ids)
+
+    rag_service = RAGService()
+    try:
+        result = await rag_service.retrieve_bulk(
+            request.queries,
+            document_ids=[content_ids[doc_id] for doc_id in request.document_ids] if request.document_ids else None,
+            max_chunks_per_document=request.max_chunks_per_document,
+            top_documents=request.top_documents
+        )
+    finally:
+        rag_service.close()
+
+    # Report hits under the IDs the caller asked for
+    requested = {}
+    for doc_id, content_id in content_ids.items():
+        if content_id not in requested or doc_id == content_id:
+            requested[content_id] = doc_id
+    if requested:
+        result["document_ids"] = [requested.get(doc_id, doc_id) for doc_id in result["document_ids"]]
+        for entry in result["results"]:
+            for document in entry["documents"]:
+                document["document_id"] = requested.get(document["document_id"], document["document_id"])
+
+    return BulkRetrievalResponse(
+        **result,
+        processing_time=time.time() - start_time
+    )
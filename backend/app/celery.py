@@ -0,0 +1,26 @@
+"""
+Celery application for background work (``celery -A app.celery worker``).
+"""
+import asyncio
+
+from celery import Celery
+
+from app.config import settings
+
+
+celery = Celery("finmda", broker=settings.redis_url, backend=settings.redis_url)
+celery.conf.update(
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+    worker_concurrency=settings.ingestion_workers,
+    task_serializer="json",
+    result_serializer="json",
+)
+
+
+@celery.task(name="documents.process")
+def process_document_task(document_id: int, file_path: str, file_type: str, company: str = None) -> bool:
+    """Ingest one uploaded document (same pipeline as the in-process queue)."""
+    from app.services.ingestion_queue import run_ingestion
+
+    return asyncio.run(run_ingestion(document_id, file_path, file_type, company))
@@ -17,6 +17,15 @@ class Settings(BaseSettings):
     # API Keys
     gemini_api_key: str = "default-key-change-in-env"
     
+    # LLM Client
+    gemini_base_url: str = "https://generativelanguage.googleapis.com"
+    gemini_model: str = "gemini-1.5-flash"
+    llm_max_concurrency: int = 8  # in-flight requests (and pooled connections)
+    llm_requests_per_second: float = 5.0  # 0 disables the rate limit
+    llm_max_retries: int = 4
+    llm_timeout_seconds: float = 60.0
+    llm_backoff_base_seconds: float = 0.5
+    
     # Database
     database_url: str = "sqlite:///./finmda.db"
     
@@ -28,11 +37,76 @@ class Settings(BaseSettings):
     # File Upload
     max_file_size_mb: int = 50
     allowed_file_types: List[str] = ["pdf", "xlsx", "xls", "csv"]
+    upload_chunk_size_kb: int = 1024
+    upload_dedup_enabled: bool = True
     upload_directory: str = "./uploads"
     
+    # PDF Extraction
+    pdf_extraction_workers: int = 4  # processes; 1 disables page-parallel extraction
+    pdf_pages_per_task: int = 25
+    pdf_parallel_min_pages: int = 50
+    table_extractors: List[str] = ["pdfplumber", "camelot", "tabula"]  # cheapest first
+    table_confidence_threshold: float = 0.75
+    table_page_min_numeric_ratio: float = 0.3
+    table_duplicate_similarity: float = 0.7
+    extraction_cache_enabled: bool = True
+    extraction_cache_directory: str = "./extraction_cache"
+    
     # ChromaDB
     chroma_persist_directory: str = "./chromadb"
     embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    embedding_warmup_on_startup: bool = True
+    embedding_batch_max_size: int = 32
+    embedding_batch_max_wait_ms: float = 5.0
+    embedding_batch_workers: int = 1
+    query_embedding_cache_size: int = 2048
+    query_embedding_cache_ttl_seconds: int = 3600
+    retrieval_cache_size: int = 1024
+    retrieval_cache_ttl_seconds: int = 900
+    response_cache_enabled: bool = True
+    response_cache_size: int = 512
+    response_cache_ttl_seconds: int = 3600
+    response_cache_similarity_threshold: float = 0.95  # cosine, same document and context
+    index_batch_size: int = 64
+    chunking_strategy: str = "text"  # 'text' or 'structured'
+    retrieval_mode: str = "dense"  # 'dense' or 'hybrid'
+    hybrid_rrf_k: int = 60
+    hybrid_candidate_multiplier: int = 4
+    rerank_enabled: bool = False
+    reranker_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    rerank_candidates: int = 20
+    rerank_batch_size: int = 16
+    rerank_budget_ms: float = 250.0
+    rerank_workers: int = 1
+    bulk_max_queries: int = 20
+    bulk_max_chunks_per_document: int = 3
+    bulk_candidate_multiplier: int = 4
+    vector_store_backend: str = "chroma"  # 'chroma' or 'numpy'
+    vector_store_directory: str = "./vectorstore"
+    vector_index_type: str = "flat"  # 'flat' or 'ivf' (numpy backend)
+    ivf_nlist: int = 256
+    ivf_nprobe: int = 8
+    vector_quantization: str = "none"  # 'none', 'float16' or 'int8' (numpy backend)
+    vector_exact_rerank: bool = True
+    vector_rerank_factor: int = 4
+    vector_shard_strategy: str = "none"  # 'none', 'document', 'company' or 'hash'
+    vector_shard_buckets: int = 16
+    vector_max_open_shards: int = 64
+    
+    # Prompt Packing
+    prompt_context_token_budget: int = 3000
+    prompt_data_token_budget: int = 1500
+    prompt_dedup_min_overlap_chars: int = 40
+    
+    # MD&A Generation
+    mda_section_concurrency: int = 4
+    mda_section_timeout_seconds: float = 60.0
+    
+    # Background Ingestion
+    ingestion_backend: str = "asyncio"  # 'asyncio' (in-process) or 'celery'
+    ingestion_workers: int = 2
+    ingestion_max_pending: int = 100
+    redis_url: str = "redis://localhost:6379/0"
     
     # Rate Limiting
     rate_limit_per_minute: int = 60
@@ -1,7 +1,7 @@
 """
 Database configuration and session management.
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
@@ -28,7 +28,51 @@ def get_db():
         db.close()
 
 
+def _column_default(column) -> str:
+    """Render a scalar Python-side column default as a DDL ``DEFAULT`` clause."""
+    default = column.default
+    if default is None or not default.is_scalar:
+        return ""
+    value = default.arg
+    if isinstance(value, bool):
+        return f" DEFAULT {int(value)}"
+    if isinstance(value, (int, float)):
+        return f" DEFAULT {value}"
+    if isinstance(value, str):
+        return " DEFAULT '{}'".format(value.replace("'", "''"))
+    return ""
+
+
+def add_missing_columns(bind=None) -> list:
+    """Add model columns missing from existing tables.
+
+    ``create_all`` only creates missing tables, so columns added to a model
+    later are added here with ``ALTER TABLE ... ADD COLUMN`` (plus their
+    indexes). Returns the ``table.column`` names added.
+    """
+    bind = bind or engine
+    inspector = inspect(bind)
+    added = []
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            new_columns = [column for column in table.columns if column.name not in existing]
+            for column in new_columns:
+                column_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{_column_default(column)}"
+                ))
+                added.append(f"{table.name}.{column.name}")
+            for index in table.indexes:
+                if any(column in new_columns for column in index.columns):
+                    index.create(conn, checkfirst=True)
+    return added
+
+
 def create_tables():
-    """Create all database tables."""
+    """Create all database tables and add any columns missing from them."""
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
 
@@ -6,12 +6,20 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import uvicorn
 from datetime import datetime
+import asyncio
 import os
 
 from app.config import settings
 from app.database import create_tables, get_db
-from app.api.endpoints import documents, chat, analytics, health, voice, faq, mda
+from app.api.endpoints import documents, chat, analytics, health, voice, faq, mda, retrieval
 from app.schemas import HealthResponse
+from app.services.embedding_registry import embedding_registry
+from app.services.embedding_batcher import get_query_embedder, shutdown_query_embedders
+from app.services.reranker import shutdown_reranker
+from app.services.vector_store import shutdown_vector_stores
+from app.services.ingestion_queue import get_ingestion_queue
+from app.services.document_processor import shutdown_pdf_executor
+from app.services.llm_client import close_llm_client
 
 
 # Create FastAPI application
@@ -39,6 +47,7 @@ app.include_router(analytics.router, prefix="/api/v1/analytics", tags=["analytic
 app.include_router(voice.router, prefix="/api/v1/voice", tags=["voice"])
 app.include_router(faq.router, prefix="/api/v1/faq", tags=["faq"])
 app.include_router(mda.router, prefix="/api/v1/mda", tags=["mda"])
+app.include_router(retrieval.router, prefix="/api/v1/retrieval", tags=["retrieval"])
 app.include_router(health.router, prefix="/api/v1", tags=["health"])
 
 
@@ -51,6 +60,26 @@ async def startup_event():
     # Create necessary directories
     os.makedirs(settings.upload_directory, exist_ok=True)
     os.makedirs(settings.chroma_persist_directory, exist_ok=True)
+    os.makedirs(settings.vector_store_directory, exist_ok=True)
+    
+    # Load the shared embedding model and collection before serving traffic
+    if settings.embedding_warmup_on_startup:
+        try:
+            loop = asyncio.get_running_loop()
+            metrics = await loop.run_in_executor(None, embedding_registry.warmup)
+            print(f"🔥 Embedding registry warmed up in {metrics['warmup_time_seconds']:.2f}s")
+        except Exception as e:
+            print(f"⚠️ Embedding warmup skipped: {str(e)}")
+    
+    # Start the micro-batching query embedder on the serving event loop
+    await get_query_embedder().start()
+    
+    # Start ingestion workers and pick up uploads interrupted by a restart
+    queue = get_ingestion_queue()
+    await queue.start()
+    recovered = await queue.recover()
+    if recovered:
+        print(f"📥 Re-queued {recovered} interrupted document ingestions")
     
     print(f"🚀 {settings.app_name} v{settings.app_version} started successfully!")
 
@@ -58,6 +87,13 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on application shutdown."""
+    await get_ingestion_queue().stop()
+    await shutdown_query_embedders()
+    shutdown_reranker()
+    shutdown_pdf_executor()
+    await close_llm_client()
+    shutdown_vector_stores()
+    embedding_registry.shutdown()
     print("👋 FinMDA-Bot shutting down...")
 
 
@@ -17,23 +17,33 @@ class Document(Base):
     file_path = Column(String(500), nullable=False)
     file_type = Column(String(10), nullable=False)
     file_size = Column(Integer, nullable=False)
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256; duplicates share file_path
+    # Duplicate uploads: extraction and index are those of this document
+    canonical_document_id = Column(Integer, ForeignKey("documents.id"), nullable=True, index=True)
+    is_deleted = Column(Boolean, default=False)  # deleted but still referenced by duplicates
     upload_date = Column(DateTime(timezone=True), server_default=func.now())
     
     # Processing status
     is_processed = Column(Boolean, default=False)
     processing_error = Column(Text, nullable=True)
+    processing_stage = Column(String(20), default="uploaded")  # queued, extracting, indexing, completed, failed
+    processing_progress = Column(Float, default=0.0)
+    job_id = Column(String(64), nullable=True)
+    processing_started_at = Column(DateTime(timezone=True), nullable=True)
+    processing_completed_at = Column(DateTime(timezone=True), nullable=True)
     
     # Extracted content
     extracted_text = Column(Text, nullable=True)
     extracted_tables = Column(JSON, nullable=True)
-<<<<<<< HEAD
     document_metadata = Column(JSON, nullable=True)
-=======
-    metadata = Column(JSON, nullable=True)
->>>>>>> 5c3a0a0f3539fc0d352cb6c8a94fa282129f33e9
     
     # Relationships
     chat_sessions = relationship("ChatSession", back_populates="document")
+    
+    @property
+    def content_document_id(self) -> int:
+        """ID this document's extraction and index are stored under."""
+        return self.canonical_document_id or self.id
 
 
 class ChatSession(Base):
@@ -68,6 +78,8 @@ class ChatMessage(Base):
     tokens_used = Column(Integer, nullable=True)
     confidence_score = Column(Float, nullable=True)
     citations = Column(JSON, nullable=True)
+    processing_time = Column(Float, nullable=True)  # seconds, request to full answer
+    time_to_first_token = Column(Float, nullable=True)  # seconds; streamed responses only
     
     # Relationships
     session = relationship("ChatSession", back_populates="messages")
@@ -99,11 +111,7 @@ class DocumentChunk(Base):
     document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
     chunk_index = Column(Integer, nullable=False)
     content = Column(Text, nullable=False)
-<<<<<<< HEAD
     chunk_metadata = Column(JSON, nullable=True)
-=======
-    metadata = Column(JSON, nullable=True)
->>>>>>> 5c3a0a0f3539fc0d352cb6c8a94fa282129f33e9
     embedding_id = Column(String(100), nullable=True)  # ChromaDB embedding ID
     
     # Chunk characteristics
@@ -25,6 +25,8 @@ class DocumentResponse(DocumentBase):
     upload_date: datetime
     is_processed: bool
     processing_error: Optional[str] = None
+    processing_stage: Optional[str] = None
+    canonical_document_id: Optional[int] = None
     
     class Config:
         from_attributes = True
@@ -56,6 +58,8 @@ class ChatMessageResponse(ChatMessageBase):
     model_used: Optional[str] = None
     confidence_score: Optional[float] = None
     citations: Optional[List[Dict[str, Any]]] = None
+    processing_time: Optional[float] = None
+    time_to_first_token: Optional[float] = None
     
     class Config:
         from_attributes = True
@@ -145,6 +149,24 @@ class ChatQueryResponse(BaseModel):
     citations: Optional[List[Dict[str, Any]]] = None
     processing_time: float
     model_used: str
+    time_to_first_token: Optional[float] = None
+
+
+# Bulk Retrieval Schemas
+class BulkRetrievalRequest(BaseModel):
+    """Schema for multi-query, multi-document retrieval."""
+    queries: List[str] = Field(..., min_length=1)
+    document_ids: Optional[List[int]] = None
+    max_chunks_per_document: Optional[int] = Field(None, ge=1, le=20)
+    top_documents: Optional[int] = Field(None, ge=1)
+
+
+class BulkRetrievalResponse(BaseModel):
+    """Schema for bulk retrieval response."""
+    results: List[Dict[str, Any]]
+    total_queries: int
+    document_ids: List[int]
+    processing_time: float
 
 
 # Health Check Schema
@@ -155,6 +177,7 @@ class HealthResponse(BaseModel):
     version: str
     database_status: str
     services_status: Dict[str, str]
+    cache_stats: Optional[Dict[str, Any]] = None
 
 
 # Error Schemas
@@ -174,4 +197,17 @@ class FileUploadResponse(BaseModel):
     file_size: int
     upload_date: datetime
     processing_status: str
+    job_id: Optional[str] = None
+
+
+class DocumentStatusResponse(BaseModel):
+    """Schema for background ingestion status."""
+    document_id: int
+    job_id: Optional[str] = None
+    stage: str
+    progress: float
+    is_processed: bool
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
 
@@ -1,20 +1,33 @@
 """
 Multi-agent system for financial analysis and conversation.
 """
-from typing import Dict, Any, Optional, List
-import google.generativeai as genai
-import json
+from typing import Dict, Any, Optional, List, AsyncIterator
+import logging
 from datetime import datetime
 
+import numpy as np
+
 from app.config import settings
+from app.services.cache_service import ResponseCache, response_cache
+from app.services.embedding_batcher import embed_query
+from app.services.llm_client import GeminiClient, get_llm_client
+from app.services.prompt_packer import PromptPacker, prompt_packer
 
 
 class AgentSystem:
     """Lightweight agent that queries Gemini with optional context."""
 
-    def __init__(self):
-        genai.configure(api_key=settings.gemini_api_key)
-        self.model = genai.GenerativeModel("gemini-1.5-flash")
+    def __init__(
+        self,
+        llm_client: Optional[GeminiClient] = None,
+        cache: Optional[ResponseCache] = None,
+        packer: Optional[PromptPacker] = None
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.llm_client = llm_client or get_llm_client()
+        self.model_name = self.llm_client.model
+        self.cache = cache if cache is not None else (response_cache if settings.response_cache_enabled else None)
+        self.packer = packer or prompt_packer
 
     async def process_query(
         self,
@@ -26,28 +39,85 @@ class AgentSystem:
         """Return a structured response for the chat endpoint.
 
         Always returns a dict with keys: response, model_used, confidence_score, citations, tokens_used.
+        Answers to near-identical questions over the same context come from
+        the response cache (flagged with ``cached: True``) without an LLM call;
+        otherwise ``context_packing`` reports the tokens the prompt packer saved.
         """
         try:
-            prompt = self._build_prompt(query, context)
-            response = self.model.generate_content(prompt)
-            text = getattr(response, "text", None) or "I couldn't generate a response."
-            return {
-                "response": text,
-                "model_used": "gemini-1.5-flash",
-                "confidence_score": 0.85 if text else 0.0,
-                "citations": self._extract_citations(context),
-                "tokens_used": len(text.split()) if text else 0,
-            }
+            embedding = await self._cache_embedding(query)
+            if embedding is not None:
+                cached = self.cache.lookup(embedding, document_id, context)
+                if cached is not None:
+                    return {**cached, "cached": True}
+
+            packing = self.packer.pack_context(context)
+            prompt = self._build_prompt(query, packing.text)
+            response = await self.llm_client.generate(prompt)
+            text = response.text or "I couldn't generate a response."
+            result = {"response": text, **self.response_metadata(text, context)}
+            if embedding is not None and response.text:
+                self.cache.store(embedding, document_id, context, result)
+            return {**result, "context_packing": packing.to_dict()}
         except Exception as e:
             # Return a graceful error string instead of raising
             return {
                 "response": f"I encountered an error processing your request: {str(e)}",
-                "model_used": "gemini-1.5-flash",
+                "model_used": self.model_name,
                 "confidence_score": 0.0,
                 "citations": [],
                 "tokens_used": 0,
             }
 
+    async def stream_query(
+        self,
+        query: str,
+        context: str = "",
+        session_id: Optional[int] = None,
+        document_id: Optional[int] = None,
+    ) -> AsyncIterator[str]:
+        """Yield the response text piece by piece as Gemini generates it.
+
+        A cached answer (see ``process_query``) is yielded in one piece, and
+        a stream that completes is cached for later questions. Errors
+        propagate to the caller, which decides how to report them
+        mid-stream.
+        """
+        embedding = await self._cache_embedding(query)
+        if embedding is not None:
+            cached = self.cache.lookup(embedding, document_id, context)
+            if cached is not None:
+                yield cached["response"]
+                return
+
+        prompt = self._build_prompt(query, self.packer.pack_context(context).text)
+        pieces: List[str] = []
+        async for text in self.llm_client.stream(prompt):
+            pieces.append(text)
+            yield text
+
+        if embedding is not None and pieces:
+            text = "".join(pieces)
+            self.cache.store(embedding, document_id, context, {"response": text, **self.response_metadata(text, context)})
+
+    async def _cache_embedding(self, query: str) -> Optional[np.ndarray]:
+        """Query embedding for the response cache; ``None`` disables caching for this call."""
+        if self.cache is None:
+            return None
+        try:
+            return await embed_query(query)
+        except Exception as e:
+            self.logger.warning(f"Response cache skipped, could not embed query: {str(e)}")
+            return None
+
+    def response_metadata(self, text: str, context: str = "") -> Dict[str, Any]:
+        """Model, confidence, citations and token count for a finished response."""
+        return {
+            "model_used": self.model_name,
+            "confidence_score": 0.85 if text else 0.0,
+            "citations": self._extract_citations(context),
+            "tokens_used": len(text.split()) if text else 0,
+        }
+
     def _build_prompt(self, query: str, context: str) -> str:
         """Build prompt for Gemini with system instructions and context."""
         system_instruction = (
@@ -85,28 +155,29 @@ class AgentSystem:
         context: str = ""
     ) -> Dict[str, Any]:
         """Generate a specific MD&A section."""
+        data = self.packer.pack_financial_data(financial_data).text
         
         prompts = {
             "executive_summary": (
                 "Generate an executive summary for the MD&A report based on the following financial data:\n"
-                f"{json.dumps(financial_data, indent=2)}\n\n"
+                f"{data}\n\n"
                 "Include: Overall performance, key drivers, major challenges, strategic outlook.\n"
                 "Keep it concise (2-3 paragraphs) and professional."
             ),
             "results_of_operations": (
                 "Generate a 'Results of Operations' section based on:\n"
-                f"{json.dumps(financial_data, indent=2)}\n\n"
+                f"{data}\n\n"
                 "Focus on: Revenue analysis, cost structure, profitability trends, operational performance.\n"
                 "Provide specific numbers and percentages."
             ),
             "liquidity": (
                 "Generate a 'Liquidity and Capital Resources' section based on:\n"
-                f"{json.dumps(financial_data, indent=2)}\n\n"
+                f"{data}\n\n"
                 "Cover: Liquidity position, cash generation, debt levels, capital allocation."
             ),
             "risks": (
                 "Generate a 'Risk Factors' section based on:\n"
-                f"{json.dumps(financial_data, indent=2)}\n\n"
+                f"{data}\n\n"
                 "Identify: Financial risks, operational risks, regulatory risks, market risks."
             )
         }
@@ -114,8 +185,8 @@ class AgentSystem:
         prompt = prompts.get(section_type, prompts["executive_summary"])
         
         try:
-            response = self.model.generate_content(prompt)
-            text = getattr(response, "text", "")
+            response = await self.llm_client.generate(prompt)
+            text = response.text
             
             return {
                 "section_type": section_type,
@@ -128,3 +199,14 @@ class AgentSystem:
                 "content": f"Error generating section: {str(e)}",
                 "success": False
             }
+
+
+_agent_system: Optional[AgentSystem] = None
+
+
+def get_agent_system() -> AgentSystem:
+    """Return the shared agent (one per process, reusing the pooled LLM client)."""
+    global _agent_system
+    if _agent_system is None:
+        _agent_system = AgentSystem()
+    return _agent_system
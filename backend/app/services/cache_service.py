@@ -0,0 +1,253 @@
+"""
+In-process caches for the RAG pipeline.
+"""
+from typing import Dict, Any, Optional, Hashable, Tuple
+from collections import OrderedDict
+import threading
+import hashlib
+import copy
+import time
+import re
+
+import numpy as np
+
+from app.config import settings
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after ``ttl_seconds``."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        """Initialize empty cache."""
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value or ``None`` on miss/expiry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, stored_at = entry
+            if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self._removed(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store ``value``, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._removed(evicted)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        """Remove ``key`` if present."""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._removed(key)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            for key in self._entries:
+                self._removed(key)
+            self._entries.clear()
+
+    def _removed(self, key: Hashable) -> None:
+        """Called with the lock held after ``key`` leaves the cache."""
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and occupancy."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def normalize_query(query: str) -> str:
+    """Normalize query text so trivially different phrasings share a key."""
+    normalized = re.sub(r'\s+', ' ', query.strip().lower())
+    return normalized.rstrip('?.! ')
+
+
+class QueryEmbeddingCache(TTLCache):
+    """Cache of query embeddings keyed on (model name, normalized query)."""
+
+    def get_embedding(self, query: str, model_name: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for ``query`` or ``None``."""
+        return self.get((model_name, normalize_query(query)))
+
+    def set_embedding(self, query: str, model_name: str, embedding: np.ndarray) -> np.ndarray:
+        """Store ``embedding`` as read-only float32 and return the stored array."""
+        stored = np.array(embedding, dtype=np.float32)
+        stored.setflags(write=False)
+        self.set((model_name, normalize_query(query)), stored)
+        return stored
+
+
+class RetrievalCache(TTLCache):
+    """Cache of retrieval results keyed on the indexed state of the corpus.
+
+    Every key embeds a generation number that is bumped whenever a
+    document's chunks change, so stale results simply stop matching and
+    age out of the LRU instead of needing to be found and deleted.
+    Document-scoped lookups depend on that document's generation only;
+    corpus-wide lookups depend on a global generation bumped by any change.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        """Initialize empty cache with all generations at zero."""
+        super().__init__(max_entries, ttl_seconds)
+        self._document_generations: Dict[int, int] = {}
+        self._global_generation = 0
+
+    def generation(self, document_id: Optional[int] = None) -> Tuple[int, int]:
+        """Return the generation a lookup scoped to ``document_id`` depends on."""
+        if document_id is None:
+            return (-1, self._global_generation)
+        return (document_id, self._document_generations.get(document_id, 0))
+
+    def make_key(self, query: str, document_id: Optional[int], top_k: int, *options: Hashable) -> Tuple:
+        """Build a cache key for one retrieval call."""
+        query_hash = hashlib.sha1(normalize_query(query).encode()).hexdigest()
+        return (query_hash, document_id, top_k, self.generation(document_id), options)
+
+    def get_result(self, key: Tuple) -> Optional[Any]:
+        """Return a copy of the cached result so callers can mutate it."""
+        result = self.get(key)
+        return copy.deepcopy(result) if result is not None else None
+
+    def set_result(self, key: Tuple, result: Any) -> None:
+        """Store a copy of ``result``."""
+        self.set(key, copy.deepcopy(result))
+
+    def invalidate_document(self, document_id: int) -> None:
+        """Mark every cached retrieval touching ``document_id`` as stale."""
+        with self._lock:
+            self._document_generations[document_id] = self._document_generations.get(document_id, 0) + 1
+            self._global_generation += 1
+
+
+class ResponseCache(TTLCache):
+    """Semantic cache of chat answers.
+
+    Entries are scoped to a document and the exact retrieval context the
+    answer was generated from; within that scope a new question reuses a
+    stored answer when the cosine similarity of the (unit-normalized)
+    query embeddings reaches ``similarity_threshold``. Eviction is LRU
+    with the usual TTL, and re-indexing a document drops its entries.
+
+    Entries are also indexed by scope, so a lookup scores only the
+    answers in its own scope, with one matrix-vector product.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, similarity_threshold: float):
+        """Initialize empty cache."""
+        super().__init__(max_entries, ttl_seconds)
+        self.similarity_threshold = similarity_threshold
+        self._sequence = 0
+        self._scopes: Dict[Tuple[Optional[int], str], Dict[Hashable, np.ndarray]] = {}
+
+    @staticmethod
+    def _scope(document_id: Optional[int], context: str) -> Tuple[Optional[int], str]:
+        return (document_id, hashlib.sha1(context.encode()).hexdigest())
+
+    @staticmethod
+    def _unit(embedding: Any) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding: Any, document_id: Optional[int], context: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the closest stored answer in scope, or ``None``."""
+        scope = self._scope(document_id, context)
+        query = self._unit(embedding)
+        best_key = None
+        with self._lock:
+            vectors = self._scopes.get(scope)
+            if vectors:
+                keys = list(vectors)
+                scores = np.stack(list(vectors.values())) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    best_key = keys[best]
+            if best_key is None:
+                self.misses += 1
+                return None
+
+        # get() applies TTL expiry, LRU promotion and the hit counter
+        entry = self.get(best_key)
+        return copy.deepcopy(entry[1]) if entry is not None else None
+
+    def store(self, embedding: Any, document_id: Optional[int], context: str, response: Dict[str, Any]) -> None:
+        """Cache ``response`` for questions similar to ``embedding``."""
+        vector = self._unit(embedding)
+        vector.setflags(write=False)
+        scope = self._scope(document_id, context)
+        with self._lock:
+            self._sequence += 1
+            key = (scope, self._sequence)
+        self.set(key, (vector, copy.deepcopy(response)))
+        with self._lock:
+            if key in self._entries:
+                self._scopes.setdefault(scope, {})[key] = vector
+
+    def invalidate_document(self, document_id: int) -> None:
+        """Drop every answer generated from ``document_id``."""
+        with self._lock:
+            for scope in [scope for scope in self._scopes if scope[0] == document_id]:
+                for key in self._scopes.pop(scope):
+                    self._entries.pop(key, None)
+
+    def _removed(self, key: Hashable) -> None:
+        vectors = self._scopes.get(key[0])
+        if vectors is not None:
+            vectors.pop(key, None)
+            if not vectors:
+                del self._scopes[key[0]]
+
+
+# Global cache instances
+query_embedding_cache = QueryEmbeddingCache(
+    max_entries=settings.query_embedding_cache_size,
+    ttl_seconds=settings.query_embedding_cache_ttl_seconds
+)
+
+retrieval_cache = RetrievalCache(
+    max_entries=settings.retrieval_cache_size,
+    ttl_seconds=settings.retrieval_cache_ttl_seconds
+)
+
+response_cache = ResponseCache(
+    max_entries=settings.response_cache_size,
+    ttl_seconds=settings.response_cache_ttl_seconds,
+    similarity_threshold=settings.response_cache_similarity_threshold
+)
@@ -1,13 +1,22 @@
 """
 Document processing service for FinMDA-Bot.
 """
-from typing import Optional
+from typing import Optional, List, Dict, Any, AsyncIterator, Awaitable, Callable, Iterable, Tuple
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import asyncio
+import logging
+import multiprocessing
+import threading
 import io
 
-from app.models import Document
+from app.config import settings
+from app.models import Document, DocumentChunk
 from app.database import SessionLocal
 from app.services.rag_service import RAGService
+from app.services.text_chunker import TextChunk, iter_page_chunks
+from app.services.upload_storage import release_blob
+from app.utils.helpers import iterate_in_thread
 
 try:
     import fitz  # PyMuPDF
@@ -20,27 +29,234 @@ except Exception:
     openpyxl = None
 
 
+_pdf_executor: Optional[ProcessPoolExecutor] = None
+_pdf_executor_lock = threading.Lock()
+
+
+def page_ranges(page_count: int, pages_per_task: int) -> List[Tuple[int, int]]:
+    """Split ``page_count`` pages into consecutive ``(start, stop)`` ranges."""
+    step = max(pages_per_task, 1)
+    return [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
+
+def extract_page_range(file_path: str, start: int, stop: int) -> List[str]:
+    """Return the text of pages ``start:stop`` (runs in a worker process).
+
+    Each worker opens the PDF itself; PyMuPDF documents cannot be shared
+    across processes.
+    """
+    with fitz.open(file_path) as doc:
+        return [doc[i].get_text() for i in range(start, stop)]
+
+
+def get_pdf_executor() -> ProcessPoolExecutor:
+    """Return the process pool used for page-parallel PDF extraction.
+
+    Workers are spawned rather than forked: the server process holds
+    threads, an event loop and open database/vector store handles that
+    must not be duplicated into children.
+    """
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is None:
+            _pdf_executor = ProcessPoolExecutor(
+                max_workers=settings.pdf_extraction_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pdf_executor
+
+
+def shutdown_pdf_executor() -> None:
+    """Stop the PDF extraction worker processes."""
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is not None:
+            _pdf_executor.shutdown(wait=False, cancel_futures=True)
+            _pdf_executor = None
+
+
+def content_document_ids(db, document_ids: Iterable[int]) -> Dict[int, int]:
+    """Map document IDs to the IDs their extraction and index are stored under.
+
+    Duplicate uploads resolve to their canonical document; unknown IDs are
+    left out.
+    """
+    document_ids = list(document_ids)
+    if not document_ids:
+        return {}
+    rows = db.query(Document.id, Document.canonical_document_id).filter(Document.id.in_(document_ids))
+    return {doc_id: canonical_id or doc_id for doc_id, canonical_id in rows}
+
+
 class DocumentProcessor:
     """Service class for processing uploaded documents."""
 
-    async def process_document(self, document_id: int, file_path: str, file_type: str) -> None:
-        """Extract lightweight text and index into RAG (best-effort)."""
-        extracted_text = ""
+    async def process_document(
+        self,
+        document_id: int,
+        file_path: str,
+        file_type: str,
+        company: Optional[str] = None,
+        progress: Optional[Callable[[str, float], Awaitable[None]]] = None
+    ) -> None:
+        """Extract lightweight text and index it into RAG.
+
+        ``progress(stage, fraction)`` is awaited as ingestion moves through
+        its stages so background jobs can report status. The document is
+        marked processed only once indexing succeeds; indexing errors are
+        raised so the job is recorded as failed.
+        """
         metadata = {
             "processing_timestamp": datetime.utcnow().isoformat(),
             "file_type": file_type,
         }
+        if company:
+            # Also used by the 'company' vector shard strategy
+            metadata["company"] = company
+
+        ft = (file_type or "").lower()
+        if progress:
+            await progress("extracting", 0.1)
+        # Parsing is CPU-bound; keep the event loop free for other uploads
+        loop = asyncio.get_running_loop()
+        extracted_text = await loop.run_in_executor(None, self._extract_text, file_path, ft, metadata)
+
+        # Persist results, then index into RAG
+        with SessionLocal() as db:
+            document = db.query(Document).filter(Document.id == document_id).first()
+            if not document:
+                return
+            content_hash = document.content_hash
+            document.extracted_text = extracted_text[:1_000_000] if extracted_text else None
+            document.document_metadata = metadata
+            # Nothing to index without text
+            document.is_processed = not extracted_text
+            db.commit()
+
+        if extracted_text:
+            if progress:
+                await progress("indexing", 0.4)
+            rag = None
+            try:
+                rag = RAGService()
+                
+                chunks = None
+                if ft == "pdf" and settings.chunking_strategy == "structured":
+                    chunks = self._structured_chunks(file_path, content_hash)
+                    if chunks is not None:
+                        metadata["chunking_strategy"] = "structured"
+                
+                self._clear_chunks(document_id)
+                index_report = await rag.index_document(
+                    document_id,
+                    extracted_text,
+                    metadata,
+                    chunks=chunks,
+                    chunk_sink=lambda records: self._persist_chunks(document_id, records)
+                )
+                if not index_report["success"]:
+                    raise RuntimeError(index_report.get("error") or "indexing failed")
+                
+                with SessionLocal() as db:
+                    document = db.query(Document).filter(Document.id == document_id).first()
+                    if document:
+                        document.document_metadata = {**metadata, "index_report": index_report}
+                        document.is_processed = True
+                        db.commit()
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Indexing document {document_id} failed: {str(e)}")
+                raise
+            finally:
+                if rag is not None:
+                    rag.close()
+
+
+    def link_duplicate(
+        self,
+        source_id: int,
+        target_id: int,
+        company: Optional[str] = None
+    ) -> bool:
+        """Point a duplicate upload at the extraction and index of an identical document.
+
+        Nothing is copied: the duplicate records ``canonical_document_id``
+        and retrieval resolves through it (see ``content_document_ids``).
+        """
+        with SessionLocal() as db:
+            source = db.query(Document).filter(Document.id == source_id).first()
+            document = db.query(Document).filter(Document.id == target_id).first()
+            if not source or not document:
+                return False
+            canonical_id = source.content_document_id
+            document.canonical_document_id = canonical_id
+            document.document_metadata = {"deduplicated_from": canonical_id}
+            if company:
+                document.document_metadata["company"] = company
+            document.is_processed = True
+            db.commit()
+        return True
+
+    async def delete_document(self, document_id: int) -> bool:
+        """Delete a document, keeping content that duplicates still reference.
+
+        A canonical document with live duplicates is only marked deleted;
+        its extraction, index and file go when the last duplicate does.
+        """
+        with SessionLocal() as db:
+            document = db.query(Document).filter(Document.id == document_id).first()
+            if not document:
+                return False
+            content_id = document.content_document_id
+            references = db.query(Document).filter(
+                Document.canonical_document_id == content_id,
+                Document.id != document_id
+            ).count()
+
+            if content_id == document_id and references:
+                document.is_deleted = True
+                db.commit()
+                return True
+
+            removed = [document]
+            canonical = None
+            if content_id != document_id:
+                canonical = db.query(Document).filter(Document.id == content_id).first()
+                if canonical is not None and canonical.is_deleted and not references:
+                    removed.append(canonical)
+            drop_index = canonical is None or canonical in removed
+
+            removed_ids = [d.id for d in removed]
+            for file_path in {d.file_path for d in removed}:
+                remaining = db.query(Document).filter(
+                    Document.file_path == file_path,
+                    Document.id.notin_(removed_ids)
+                ).count()
+                release_blob(file_path, remaining)
+            db.query(DocumentChunk).filter(
+                DocumentChunk.document_id.in_(removed_ids)
+            ).delete(synchronize_session=False)
+            for d in removed:
+                db.delete(d)
+            db.commit()
 
+        if drop_index:
+            rag = None
+            try:
+                rag = RAGService()
+                await rag.delete_document(content_id)
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Removing index of document {content_id} failed: {str(e)}")
+            finally:
+                if rag is not None:
+                    rag.close()
+        return True
+
+    def _extract_text(self, file_path: str, ft: str, metadata: Dict[str, Any]) -> str:
+        """Read text from the file; extraction errors are recorded in ``metadata``."""
+        extracted_text = ""
         try:
-            ft = (file_type or "").lower()
             if ft == "pdf" and fitz is not None:
-                doc = fitz.open(file_path)
-                texts = []
-                for page in doc:
-                    texts.append(page.get_text())
-                extracted_text = "\n\n".join(texts)
-                metadata["page_count"] = len(doc)
-                doc.close()
+                extracted_text = self._extract_pdf_text(file_path, metadata)
             elif ft in ("csv",):
                 # Read as text; limit size to avoid memory blowups
                 with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
@@ -64,21 +280,83 @@ class DocumentProcessor:
         except Exception as e:
             # Best-effort extraction; continue
             metadata["extraction_error"] = str(e)
+        return extracted_text
 
-        # Persist results and best-effort index into RAG
+    def _extract_pdf_text(self, file_path: str, metadata: Dict[str, Any]) -> str:
+        """Extract PDF text, splitting long documents into page ranges across processes.
+
+        Ranges are mapped in order so pages are reassembled as in the
+        source. Falls back to serial extraction if the pool is unusable.
+        """
+        with fitz.open(file_path) as doc:
+            page_count = len(doc)
+            metadata["page_count"] = page_count
+            if settings.pdf_extraction_workers <= 1 or page_count < settings.pdf_parallel_min_pages:
+                return "\n\n".join(page.get_text() for page in doc)
+
+        ranges = page_ranges(page_count, settings.pdf_pages_per_task)
+        try:
+            parts = get_pdf_executor().map(
+                extract_page_range,
+                [file_path] * len(ranges),
+                [start for start, _ in ranges],
+                [stop for _, stop in ranges]
+            )
+            texts = [text for part in parts for text in part]
+            metadata["extraction_workers"] = min(settings.pdf_extraction_workers, len(ranges))
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Parallel PDF extraction failed, using serial: {str(e)}")
+            texts = extract_page_range(file_path, 0, page_count)
+            metadata["extraction_workers"] = 1
+        return "\n\n".join(texts)
+
+    def _structured_chunks(
+        self,
+        file_path: str,
+        content_hash: Optional[str] = None
+    ) -> Optional[AsyncIterator[TextChunk]]:
+        """Stream section/table-aligned chunks while the PDF is still being parsed.
+
+        Pages are parsed and chunked on a worker thread; indexing consumes
+        chunks as they arrive instead of waiting for the whole document.
+        ``content_hash`` (the upload's SHA-256) keys the extraction cache
+        without re-hashing the file.
+        """
+        try:
+            # Heavy optional dependencies (camelot, tabula, cv2); import lazily
+            from app.services.enhanced_pdf_reader import EnhancedPDFReader
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"Structured chunking unavailable: {str(e)}")
+            return None
+
+        pages = (
+            (page.page_number, page.text_blocks, page.tables)
+            for page in EnhancedPDFReader().iter_pages(file_path, content_hash=content_hash)
+        )
+        return iterate_in_thread(iter_page_chunks(pages))
+
+    def _clear_chunks(self, document_id: int) -> None:
+        """Remove stored chunk rows before re-indexing a document."""
         with SessionLocal() as db:
-            document = db.query(Document).filter(Document.id == document_id).first()
-            if not document:
-                return
-            document.extracted_text = extracted_text[:1_000_000] if extracted_text else None
-            document.document_metadata = metadata
-            document.is_processed = True
+            db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).delete()
             db.commit()
 
-        # Index into Chroma (ignore failures)
-        if extracted_text:
-            try:
-                rag = RAGService()
-                await rag.index_document(document_id, extracted_text, metadata)
-            except Exception:
-                pass
+    def _persist_chunks(self, document_id: int, records: List[Dict[str, Any]]) -> None:
+        """Store one indexed batch as DocumentChunk rows."""
+        with SessionLocal() as db:
+            for record in records:
+                chunk = record["chunk"]
+                db.add(DocumentChunk(
+                    document_id=document_id,
+                    chunk_index=chunk.index,
+                    content=chunk.text,
+                    chunk_metadata={
+                        k: v for k, v in record["metadata"].items()
+                        if k in ("chunk_hash", "chunk_length", "char_start", "char_end")
+                    },
+                    embedding_id=record["id"],
+                    chunk_type=chunk.chunk_type,
+                    page_number=chunk.page_number,
+                    section=chunk.section
+                ))
+            db.commit()
@@ -0,0 +1,214 @@
+"""
+Micro-batching embedder that coalesces concurrent query encodes.
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.services.embedding_registry import embedding_registry, normalize_model_name
+from app.services.cache_service import query_embedding_cache
+
+
+class MicroBatchEmbedder:
+    """Queue texts from many coroutines and encode them in shared batches.
+
+    Each caller awaits a future; background workers drain the queue into
+    batches of at most ``max_batch_size`` texts, waiting no longer than
+    ``max_wait_ms`` for a batch to fill, and run ``encode`` in a thread pool
+    so the event loop is never blocked by the model.
+    """
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        num_workers: Optional[int] = None,
+        encoder: Any = None
+    ):
+        """Initialize embedder; workers start on first use or ``start()``."""
+        self.logger = logging.getLogger(__name__)
+        self.model_name = model_name or settings.embedding_model
+        self.max_batch_size = max_batch_size or settings.embedding_batch_max_size
+        self.max_wait_ms = settings.embedding_batch_max_wait_ms if max_wait_ms is None else max_wait_ms
+        self.num_workers = num_workers or settings.embedding_batch_workers
+        self._encoder = encoder
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self._stats = {
+            "requests": 0,
+            "batches": 0,
+            "max_batch_seen": 0,
+            "encode_time_seconds": 0.0,
+        }
+
+    @property
+    def is_running(self) -> bool:
+        """Whether workers are running on the current event loop."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        return bool(self._workers) and self._loop is loop
+
+    async def start(self) -> None:
+        """Start batch workers on the running event loop."""
+        if self.is_running:
+            return
+        self._discard_workers()
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.num_workers,
+            thread_name_prefix="embedder"
+        )
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.num_workers)
+        ]
+
+    async def stop(self) -> None:
+        """Cancel workers and shut the thread pool down."""
+        if self.is_running:
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            self._workers = []
+        self._discard_workers()
+        self._queue = None
+        self._loop = None
+
+    def _discard_workers(self) -> None:
+        """Drop workers left on another event loop and shut the thread pool down.
+
+        That loop may be closed or running elsewhere, so its workers cannot
+        be awaited from here; they are cancelled on their own loop.
+        """
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            for worker in self._workers:
+                loop.call_soon_threadsafe(worker.cancel)
+        self._workers = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Return the embedding for a single text."""
+        if not self.is_running:
+            await self.start()
+        future = self._loop.create_future()
+        self._stats["requests"] += 1
+        await self._queue.put((text, future))
+        return await future
+
+    async def embed_many(self, texts: List[str]) -> np.ndarray:
+        """Return embeddings for several texts, batched with other callers."""
+        vectors = await asyncio.gather(*(self.embed(text) for text in texts))
+        return np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    def _get_encoder(self):
+        """Resolve the shared encoder lazily (inside the worker thread)."""
+        if self._encoder is None:
+            self._encoder = embedding_registry.get_model(self.model_name)
+        return self._encoder
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Encode a batch synchronously; runs in the thread pool."""
+        start_time = time.perf_counter()
+        vectors = self._get_encoder().encode(texts, convert_to_numpy=True)
+        self._stats["encode_time_seconds"] += time.perf_counter() - start_time
+        return np.asarray(vectors, dtype=np.float32)
+
+    async def _collect_batch(self) -> List[Tuple[str, asyncio.Future]]:
+        """Wait for one item, then fill the batch until size or deadline."""
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait_ms / 1000.0
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        # Anything already queued rides along without further waiting
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+        return batch
+
+    async def _worker(self) -> None:
+        """Drain the queue into batches forever."""
+        while True:
+            batch = await self._collect_batch()
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            self._stats["batches"] += 1
+            self._stats["max_batch_seen"] = max(self._stats["max_batch_seen"], len(batch))
+
+            try:
+                vectors = await self._loop.run_in_executor(
+                    self._executor, self._encode, [text for text, _ in batch]
+                )
+            except Exception as e:
+                self.logger.error(f"Batch embedding failed: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return batching statistics."""
+        batches = self._stats["batches"]
+        return {
+            **self._stats,
+            "avg_batch_size": self._stats["requests"] / batches if batches else 0.0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+        }
+
+
+_embedders: Dict[str, MicroBatchEmbedder] = {}
+
+
+def get_query_embedder(model_name: Optional[str] = None) -> MicroBatchEmbedder:
+    """Return the process-wide micro-batching embedder for ``model_name``."""
+    key = normalize_model_name(model_name or settings.embedding_model)
+    if key not in _embedders:
+        _embedders[key] = MicroBatchEmbedder(model_name=model_name)
+    return _embedders[key]
+
+
+async def embed_query(query: str, model_name: Optional[str] = None) -> np.ndarray:
+    """Embed a query, reusing cached embeddings for repeated questions."""
+    model_name = model_name or settings.embedding_model
+    vector = query_embedding_cache.get_embedding(query, model_name)
+    if vector is None:
+        vector = await get_query_embedder(model_name).embed(query)
+        vector = query_embedding_cache.set_embedding(query, model_name, vector)
+    return vector
+
+
+async def shutdown_query_embedders() -> None:
+    """Stop every running micro-batching embedder."""
+    for embedder in list(_embedders.values()):
+        await embedder.stop()
+    _embedders.clear()
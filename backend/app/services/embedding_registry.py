@@ -0,0 +1,255 @@
+"""
+Process-wide registry for embedding models and vector collections.
+"""
+from typing import Dict, Any, Optional, List, Tuple, Callable
+from contextlib import contextmanager
+from datetime import datetime
+import threading
+import logging
+import time
+
+from app.config import settings
+
+try:
+    from sentence_transformers import SentenceTransformer
+except Exception:
+    SentenceTransformer = None
+
+try:
+    import chromadb
+    from chromadb.config import Settings as ChromaSettings
+except Exception:
+    chromadb = None
+    ChromaSettings = None
+
+
+DEFAULT_COLLECTION_NAME = "financial_documents"
+DEFAULT_COLLECTION_METADATA = {"description": "Financial document embeddings for FinMDA-Bot"}
+
+
+def normalize_model_name(model_name: str) -> str:
+    """Map equivalent model identifiers onto one registry key."""
+    prefix = "sentence-transformers/"
+    if model_name.startswith(prefix):
+        return model_name[len(prefix):]
+    return model_name
+
+
+class EmbeddingRegistry:
+    """Shared, lazily-initialized embedding models and Chroma collections.
+
+    Loading a SentenceTransformer or opening a PersistentClient is expensive,
+    so each is created once per process and handed out to every caller.
+    Models are reference-counted so idle ones can be released explicitly.
+    """
+
+    def __init__(self):
+        """Initialize empty registry."""
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._models: Dict[str, Any] = {}
+        self._refcounts: Dict[str, int] = {}
+        self._clients: Dict[str, Any] = {}
+        self._collections: Dict[Tuple[str, str], Any] = {}
+        self._metrics: Dict[str, Dict[str, Any]] = {}
+        self._warmup_time: Optional[float] = None
+
+    def _load_lock(self, key: str) -> threading.Lock:
+        """Return the lock guarding the one-time load of ``key``."""
+        with self._lock:
+            return self._load_locks.setdefault(key, threading.Lock())
+
+    def get_model(
+        self,
+        model_name: Optional[str] = None,
+        loader: Optional[Callable[[str], Any]] = None,
+        acquire: bool = False
+    ):
+        """Return the shared model for ``model_name``, loading it on first use.
+
+        ``loader`` builds the model from its name; it defaults to
+        ``SentenceTransformer`` and lets other model kinds (e.g. a
+        cross-encoder) share the same one-time loading and metrics. With
+        ``acquire`` a reference is taken under the same lock that finds or
+        publishes the model, so ``unload_idle`` cannot evict it in between.
+        """
+        model_name = model_name or settings.embedding_model
+        key = normalize_model_name(model_name)
+
+        model = self._lookup_model(key, acquire)
+        if model is not None:
+            return model
+
+        with self._load_lock(f"model:{key}"):
+            model = self._lookup_model(key, acquire)
+            if model is not None:
+                return model
+
+            if loader is None:
+                if SentenceTransformer is None:
+                    raise ImportError("sentence-transformers is not installed")
+                loader = SentenceTransformer
+
+            start_time = time.perf_counter()
+            model = loader(model_name)
+            load_time = time.perf_counter() - start_time
+
+            with self._lock:
+                self._models[key] = model
+                self._refcounts[key] = self._refcounts.get(key, 0) + (1 if acquire else 0)
+                self._metrics[key] = {
+                    "load_time_seconds": load_time,
+                    "loaded_at": datetime.utcnow().isoformat(),
+                }
+            self.logger.info(f"Loaded model {model_name} in {load_time:.2f}s")
+            return model
+
+    def _lookup_model(self, key: str, acquire: bool):
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None and acquire:
+                self._refcounts[key] = self._refcounts.get(key, 0) + 1
+            return model
+
+    def acquire_model(self, model_name: Optional[str] = None):
+        """Return the shared model and take a reference on it."""
+        return self.get_model(model_name, acquire=True)
+
+    def release_model(self, model_name: Optional[str] = None) -> None:
+        """Drop a reference taken with ``acquire_model``."""
+        key = normalize_model_name(model_name or settings.embedding_model)
+        with self._lock:
+            if self._refcounts.get(key, 0) > 0:
+                self._refcounts[key] -= 1
+
+    @contextmanager
+    def model(self, model_name: Optional[str] = None):
+        """Context manager holding a model reference for the block."""
+        model = self.acquire_model(model_name)
+        try:
+            yield model
+        finally:
+            self.release_model(model_name)
+
+    def get_client(self, persist_directory: Optional[str] = None):
+        """Return the shared Chroma client for ``persist_directory``.
+
+        ``None`` yields a process-local in-memory client.
+        """
+        key = persist_directory or ":memory:"
+
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        with self._load_lock(f"client:{key}"):
+            client = self._clients.get(key)
+            if client is not None:
+                return client
+
+            if chromadb is None:
+                raise ImportError("chromadb is not installed")
+
+            start_time = time.perf_counter()
+            if persist_directory:
+                client = chromadb.PersistentClient(
+                    path=persist_directory,
+                    settings=ChromaSettings(anonymized_telemetry=False)
+                )
+            else:
+                client = chromadb.Client(ChromaSettings(anonymized_telemetry=False))
+
+            with self._lock:
+                self._clients[key] = client
+                self._metrics[f"chroma:{key}"] = {
+                    "load_time_seconds": time.perf_counter() - start_time,
+                    "loaded_at": datetime.utcnow().isoformat(),
+                }
+            return client
+
+    def get_collection(
+        self,
+        name: str = DEFAULT_COLLECTION_NAME,
+        persist_directory: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        """Return the shared collection ``name`` on the given client."""
+        key = (persist_directory or ":memory:", name)
+
+        collection = self._collections.get(key)
+        if collection is not None:
+            return collection
+
+        client = self.get_client(persist_directory)
+        with self._lock:
+            collection = self._collections.get(key)
+            if collection is None:
+                if metadata:
+                    collection = client.get_or_create_collection(name=name, metadata=metadata)
+                else:
+                    collection = client.get_or_create_collection(name=name)
+                self._collections[key] = collection
+            return collection
+
+    def warmup(self, model_names: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Load the default model(s) and collection ahead of the first request."""
+        start_time = time.perf_counter()
+
+        for model_name in model_names or [settings.embedding_model]:
+            model = self.get_model(model_name)
+            # First encode call initialises tokenizer and kernels
+            model.encode(["warmup"])
+
+        if settings.vector_store_backend == "chroma":
+            self.get_collection(
+                DEFAULT_COLLECTION_NAME,
+                settings.chroma_persist_directory,
+                DEFAULT_COLLECTION_METADATA
+            )
+
+        self._warmup_time = time.perf_counter() - start_time
+        return self.get_metrics()
+
+    def unload_idle(self) -> List[str]:
+        """Unload models that currently have no references."""
+        unloaded = []
+        with self._lock:
+            for key in list(self._models):
+                if self._refcounts.get(key, 0) == 0:
+                    del self._models[key]
+                    self._metrics.pop(key, None)
+                    unloaded.append(key)
+        return unloaded
+
+    def shutdown(self) -> None:
+        """Drop every cached model, client and collection."""
+        with self._lock:
+            self._models.clear()
+            self._refcounts.clear()
+            self._collections.clear()
+            self._clients.clear()
+            self._metrics.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Return load-time and reference metrics for loaded resources."""
+        with self._lock:
+            return {
+                "models": {
+                    key: {
+                        **self._metrics.get(key, {}),
+                        "refcount": self._refcounts.get(key, 0)
+                    }
+                    for key in self._models
+                },
+                "clients": {
+                    key: self._metrics.get(f"chroma:{key}", {})
+                    for key in self._clients
+                },
+                "collections": [f"{path}/{name}" for path, name in self._collections],
+                "warmup_time_seconds": self._warmup_time,
+            }
+
+
+# Global registry instance
+embedding_registry = EmbeddingRegistry()
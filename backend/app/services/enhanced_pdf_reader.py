@@ -6,7 +6,10 @@ import pandas as pd
 import numpy as np
 import re
 import json
-from typing import Dict, List, Any, Optional, Tuple
+import time
+import hashlib
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Tuple, Iterator, AsyncIterator
 from datetime import datetime
 import logging
 from dataclasses import dataclass
@@ -21,6 +24,12 @@ from PIL import Image
 import io
 
 from app.config import settings
+from app.utils.helpers import iterate_in_thread
+from app.services.extraction_cache import extraction_cache, frame_to_json, frame_from_json
+
+
+# Bump when parsing output changes so cached extractions are not reused
+READER_VERSION = "2"
 
 
 class DocumentType(Enum):
@@ -55,12 +64,74 @@ class TextBlock:
     block_type: str  # paragraph, heading, table, etc.
 
 
+@dataclass
+class PageResult:
+    """Parsed content of a single page."""
+    page_number: int
+    page_count: int
+    text_blocks: List[TextBlock]
+    tables: List[FinancialTable]
+    financial_data: Dict[str, Any]
+
+
+_NUMERIC_CELL = re.compile(r'^\(?-?\$?[\d,]+(\.\d+)?%?\)?$')
+
+
+def _table_cells(df: pd.DataFrame) -> set:
+    """Normalized non-empty cell strings, for comparing tables."""
+    values = [str(c) for c in df.columns] + [str(v) for v in df.to_numpy().ravel()]
+    return {' '.join(v.split()).lower() for v in values if v and v.lower() not in ('none', 'nan')}
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _score_table(df: pd.DataFrame) -> float:
+    """Heuristic confidence for extractors that report none.
+
+    Well-formed financial tables are mostly filled and have a good share
+    of numeric cells; one-row or one-column "tables" score zero.
+    """
+    if df.shape[0] < 2 or df.shape[1] < 2:
+        return 0.0
+    values = [str(v).strip() for v in df.to_numpy().ravel()]
+    filled = [v for v in values if v and v.lower() not in ('none', 'nan')]
+    if not filled:
+        return 0.0
+    fill_ratio = len(filled) / len(values)
+    numeric_ratio = sum(1 for v in filled if _NUMERIC_CELL.match(v.replace(' ', ''))) / len(filled)
+    return round(0.6 * fill_ratio + 0.4 * min(numeric_ratio / 0.3, 1.0), 3)
+
+
+@contextmanager
+def _open_plumber(pdf_path: str, enabled: bool = True):
+    """Open the PDF with pdfplumber once for many page extractions."""
+    pdf = None
+    if enabled and 'pdfplumber' in settings.table_extractors:
+        try:
+            pdf = PDF.open(pdf_path)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"pdfplumber could not open {pdf_path}: {str(e)}")
+    try:
+        yield pdf
+    finally:
+        if pdf is not None:
+            pdf.close()
+
+
 class EnhancedPDFReader:
     """Enhanced PDF reader with financial document intelligence."""
     
     def __init__(self):
         """Initialize enhanced PDF reader."""
         self.logger = logging.getLogger(__name__)
+        self.table_stats = {
+            'pages_scanned': 0,
+            'candidate_pages': 0,
+            'duplicates_removed': 0,
+            'extractors': {}
+        }
         self.financial_keywords = {
             'income_statement': [
                 'revenue', 'sales', 'income', 'profit', 'loss', 'earnings',
@@ -76,9 +147,17 @@ class EnhancedPDFReader:
             ]
         }
     
-    def read_pdf(self, pdf_path: str) -> Dict[str, Any]:
-        """Read PDF with enhanced financial document processing."""
+    def read_pdf(self, pdf_path: str, use_cache: bool = True, content_hash: Optional[str] = None) -> Dict[str, Any]:
+        """Read PDF with enhanced financial document processing.
+        
+        Parsed blocks and tables are cached on disk by file hash and reader
+        version, so re-reading the same filing skips parsing entirely.
+        ``content_hash`` is the file's SHA-256 when already known.
+        """
         try:
+            start_time = datetime.utcnow()
+            cache_key, cached = self._cache_lookup(pdf_path, use_cache, content_hash=content_hash)
+            
             doc = fitz.open(pdf_path)
             result = {
                 'document_info': self._extract_document_info(doc),
@@ -90,16 +169,23 @@ class EnhancedPDFReader:
                 'success': False
             }
             
-            start_time = datetime.utcnow()
-            
-            # Extract text blocks
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                text_blocks = self._extract_text_blocks(page, page_num)
-                result['text_blocks'].extend(text_blocks)
-            
-            # Extract tables
-            tables = self._extract_tables_advanced(pdf_path)
+            if cached is not None:
+                result['text_blocks'], tables, _ = cached
+                result['metadata']['extraction_cache'] = 'hit'
+            else:
+                # Extract text blocks and note which pages look like tables
+                page_profiles = {}
+                for page_num in range(len(doc)):
+                    page = doc[page_num]
+                    text_blocks = self._extract_text_blocks(page, page_num)
+                    result['text_blocks'].extend(text_blocks)
+                    page_profiles[page_num] = self._classify_table_page(page, text_blocks)
+                
+                # Extract tables
+                tables = self._extract_tables_advanced(pdf_path, page_profiles=page_profiles)
+                result['metadata']['table_extraction'] = self.get_table_stats()
+                if cache_key:
+                    self._cache_store(cache_key, result['text_blocks'], tables, len(doc))
             result['tables'] = tables
             
             # Analyze financial content
@@ -127,6 +213,172 @@ class EnhancedPDFReader:
                 'success': False
             }
     
+    def iter_pages(
+        self,
+        pdf_path: str,
+        extract_tables: bool = True,
+        use_cache: bool = True,
+        content_hash: Optional[str] = None
+    ) -> Iterator[PageResult]:
+        """Parse a PDF lazily, yielding each page's blocks, tables and financial data.
+
+        Unlike ``read_pdf`` results are yielded as they are produced, so
+        callers can chunk and index page 1 while later pages are still
+        being parsed. Whole-document analysis (type, key metrics) is left
+        to the caller. A cached extraction is replayed page by page; a
+        fully consumed parse is written to the cache.
+        """
+        cache_key, cached = self._cache_lookup(pdf_path, use_cache, extract_tables, content_hash)
+        if cached is not None:
+            yield from self._replay_pages(*cached)
+            return
+        
+        parsed_blocks: List[TextBlock] = []
+        parsed_tables: List[FinancialTable] = []
+        with fitz.open(pdf_path) as doc, _open_plumber(pdf_path, extract_tables) as plumber_pdf:
+            page_count = len(doc)
+            for page_num in range(page_count):
+                page = doc[page_num]
+                try:
+                    text_blocks = self._extract_text_blocks(page, page_num)
+                except Exception as e:
+                    self.logger.warning(f"Text extraction failed on page {page_num}: {str(e)}")
+                    text_blocks = []
+                tables = []
+                if extract_tables:
+                    profile = self._classify_table_page(page, text_blocks)
+                    tables = self._extract_page_tables(pdf_path, page_num, profile, plumber_pdf)
+                if cache_key:
+                    parsed_blocks.extend(text_blocks)
+                    parsed_tables.extend(tables)
+                yield PageResult(
+                    page_number=page_num,
+                    page_count=page_count,
+                    text_blocks=text_blocks,
+                    tables=tables,
+                    financial_data=self._analyze_financial_content(text_blocks, tables)
+                )
+        if cache_key:
+            self._cache_store(cache_key, parsed_blocks, parsed_tables, page_count)
+    
+    def aiter_pages(
+        self,
+        pdf_path: str,
+        extract_tables: bool = True,
+        content_hash: Optional[str] = None
+    ) -> AsyncIterator[PageResult]:
+        """Async version of ``iter_pages``; parsing runs on a worker thread."""
+        return iterate_in_thread(self.iter_pages(pdf_path, extract_tables, content_hash=content_hash))
+    
+    def _replay_pages(
+        self,
+        text_blocks: List[TextBlock],
+        tables: List[FinancialTable],
+        page_count: int
+    ) -> Iterator[PageResult]:
+        """Yield cached blocks and tables as ``PageResult`` objects."""
+        blocks_by_page: Dict[int, List[TextBlock]] = {}
+        tables_by_page: Dict[int, List[FinancialTable]] = {}
+        for block in text_blocks:
+            blocks_by_page.setdefault(block.page_number, []).append(block)
+        for table in tables:
+            tables_by_page.setdefault(table.page_number, []).append(table)
+        for page_num in range(page_count):
+            page_blocks = blocks_by_page.get(page_num, [])
+            page_tables = tables_by_page.get(page_num, [])
+            yield PageResult(
+                page_number=page_num,
+                page_count=page_count,
+                text_blocks=page_blocks,
+                tables=page_tables,
+                financial_data=self._analyze_financial_content(page_blocks, page_tables)
+            )
+    
+    def _cache_version(self, extract_tables: bool = True) -> str:
+        """Reader version plus the settings that change extraction output."""
+        config = json.dumps([
+            READER_VERSION,
+            extract_tables,
+            settings.table_extractors,
+            settings.table_confidence_threshold,
+            settings.table_page_min_numeric_ratio,
+            settings.table_duplicate_similarity
+        ])
+        return f"v{READER_VERSION}-{hashlib.md5(config.encode()).hexdigest()[:12]}"
+    
+    def _cache_lookup(
+        self,
+        pdf_path: str,
+        use_cache: bool,
+        extract_tables: bool = True,
+        content_hash: Optional[str] = None
+    ) -> Tuple[Optional[str], Optional[Tuple[List[TextBlock], List[FinancialTable], int]]]:
+        """Return the cache key for ``pdf_path`` and the cached extraction, if any."""
+        if not use_cache or not extraction_cache.enabled:
+            return None, None
+        try:
+            key = extraction_cache.key_for(pdf_path, self._cache_version(extract_tables), content_hash)
+        except OSError:
+            return None, None
+        
+        entry = extraction_cache.load(key)
+        if entry is None:
+            return key, None
+        frames, meta = entry
+        try:
+            text_blocks = [
+                TextBlock(
+                    page_number=int(row.page_number),
+                    text=row.text,
+                    coordinates=json.loads(row.coordinates),
+                    font_info=json.loads(row.font_info),
+                    block_type=row.block_type
+                )
+                for row in frames['text_blocks'].itertuples(index=False)
+            ]
+            tables = [
+                FinancialTable(
+                    page_number=int(row.page_number),
+                    table_type=row.table_type,
+                    data=frame_from_json(row.data),
+                    confidence=float(row.confidence),
+                    coordinates=json.loads(row.coordinates),
+                    metadata=json.loads(row.metadata)
+                )
+                for row in frames['tables'].itertuples(index=False)
+            ]
+        except Exception as e:
+            self.logger.warning(f"Ignoring malformed extraction cache entry {key}: {str(e)}")
+            return key, None
+        return key, (text_blocks, tables, int(meta['page_count']))
+    
+    def _cache_store(
+        self,
+        key: str,
+        text_blocks: List[TextBlock],
+        tables: List[FinancialTable],
+        page_count: int
+    ) -> None:
+        """Write parsed blocks and tables to the extraction cache as two columnar frames."""
+        frames = {
+            'text_blocks': pd.DataFrame({
+                'page_number': [b.page_number for b in text_blocks],
+                'text': [b.text for b in text_blocks],
+                'block_type': [b.block_type for b in text_blocks],
+                'coordinates': [json.dumps(b.coordinates, default=float) for b in text_blocks],
+                'font_info': [json.dumps(b.font_info, default=str) for b in text_blocks]
+            }, columns=['page_number', 'text', 'block_type', 'coordinates', 'font_info']),
+            'tables': pd.DataFrame({
+                'page_number': [int(t.page_number) for t in tables],
+                'table_type': [t.table_type for t in tables],
+                'confidence': [float(t.confidence) for t in tables],
+                'coordinates': [json.dumps(t.coordinates, default=float) for t in tables],
+                'metadata': [json.dumps(t.metadata, default=str) for t in tables],
+                'data': [frame_to_json(t.data) for t in tables]
+            }, columns=['page_number', 'table_type', 'confidence', 'coordinates', 'metadata', 'data'])
+        }
+        extraction_cache.store(key, frames, {'page_count': page_count, 'reader_version': READER_VERSION})
+    
     def _extract_document_info(self, doc) -> Dict[str, Any]:
         """Extract document metadata."""
         metadata = doc.metadata
@@ -192,63 +444,178 @@ class EnhancedPDFReader:
         
         return 'paragraph'
     
-    def _extract_tables_advanced(self, pdf_path: str) -> List[FinancialTable]:
-        """Extract tables using multiple methods."""
+    def _classify_table_page(self, page, text_blocks: List[TextBlock]) -> Dict[str, Any]:
+        """Cheaply decide whether a page is worth running table extractors on.
+
+        Uses ruling lines from the page's vector drawings and the share of
+        numeric/financial text blocks already produced by
+        ``_extract_text_blocks``.
+        """
+        horizontal = vertical = 0
+        try:
+            for drawing in page.get_drawings():
+                for item in drawing.get("items", ()):
+                    if item[0] == "l":
+                        start, end = item[1], item[2]
+                        if abs(start.y - end.y) < 1:
+                            horizontal += 1
+                        elif abs(start.x - end.x) < 1:
+                            vertical += 1
+                    elif item[0] == "re":
+                        rect = item[1]
+                        if rect.height < 3:
+                            horizontal += 1
+                        elif rect.width < 3:
+                            vertical += 1
+                        else:
+                            horizontal += 2
+                            vertical += 2
+        except Exception as e:
+            self.logger.debug(f"Could not read drawings on page {page.number}: {str(e)}")
+        
+        numeric_blocks = sum(1 for b in text_blocks if b.block_type in ('table_data', 'financial_data'))
+        numeric_ratio = numeric_blocks / len(text_blocks) if text_blocks else 0.0
+        ruled = horizontal >= 3 and vertical >= 2
+        return {
+            'candidate': ruled or horizontal >= 3 or numeric_ratio >= settings.table_page_min_numeric_ratio,
+            'ruled': ruled,
+            'horizontal_rules': horizontal,
+            'vertical_rules': vertical,
+            'numeric_ratio': numeric_ratio
+        }
+    
+    def _extract_tables_advanced(
+        self,
+        pdf_path: str,
+        pages: Optional[List[int]] = None,
+        page_profiles: Optional[Dict[int, Dict[str, Any]]] = None
+    ) -> List[FinancialTable]:
+        """Extract tables with the extractor cascade.
+        
+        ``pages`` restricts extraction to those 0-based pages (default: all).
+        Pages without a profile from ``_classify_table_page`` are profiled
+        here first.
+        """
+        page_profiles = dict(page_profiles or {})
+        with fitz.open(pdf_path) as doc:
+            pages = list(range(len(doc))) if pages is None else pages
+            for page_num in pages:
+                if page_num not in page_profiles:
+                    page = doc[page_num]
+                    page_profiles[page_num] = self._classify_table_page(
+                        page, self._extract_text_blocks(page, page_num)
+                    )
+        
         tables = []
+        with _open_plumber(pdf_path) as plumber_pdf:
+            for page_num in pages:
+                tables.extend(self._extract_page_tables(pdf_path, page_num, page_profiles[page_num], plumber_pdf))
+        return tables
+    
+    def _extract_page_tables(
+        self,
+        pdf_path: str,
+        page_num: int,
+        profile: Dict[str, Any],
+        plumber_pdf=None
+    ) -> List[FinancialTable]:
+        """Run extractors cheapest-first on one page until one is confident enough."""
+        stats = self.table_stats
+        stats['pages_scanned'] += 1
+        if not profile['candidate']:
+            return []
+        stats['candidate_pages'] += 1
+        
+        found: List[FinancialTable] = []
+        for method in settings.table_extractors:
+            if method == 'camelot' and not profile['ruled']:
+                continue  # lattice mode needs ruling lines
+            
+            start = time.perf_counter()
+            try:
+                tables = self._run_table_extractor(method, pdf_path, page_num, plumber_pdf)
+            except Exception as e:
+                self.logger.warning(f"{method} extraction failed on page {page_num}: {str(e)}")
+                tables = []
+            method_stats = stats['extractors'].setdefault(method, {'calls': 0, 'seconds': 0.0, 'tables': 0})
+            method_stats['calls'] += 1
+            method_stats['seconds'] += time.perf_counter() - start
+            method_stats['tables'] += len(tables)
+            
+            found.extend(tables)
+            if found and max(t.confidence for t in found) >= settings.table_confidence_threshold:
+                break
         
-        try:
-            # Method 1: Camelot
-            camelot_tables = camelot.read_pdf(pdf_path, pages='all', flavor='lattice')
-            for i, table in enumerate(camelot_tables):
+        unique = self._deduplicate_tables(found)
+        stats['duplicates_removed'] += len(found) - len(unique)
+        return unique
+    
+    def _run_table_extractor(self, method: str, pdf_path: str, page_num: int, plumber_pdf=None) -> List[FinancialTable]:
+        """Extract the tables on one page with a single method."""
+        tables = []
+        if method == 'pdfplumber':
+            if plumber_pdf is None:
+                with PDF.open(pdf_path) as pdf:
+                    return self._run_table_extractor(method, pdf_path, page_num, pdf)
+            for i, table in enumerate(plumber_pdf.pages[page_num].extract_tables()):
+                if table and len(table) > 1:
+                    df = pd.DataFrame(table[1:], columns=table[0])
+                    tables.append(FinancialTable(
+                        page_number=page_num,
+                        table_type='pdfplumber',
+                        data=df,
+                        confidence=_score_table(df),
+                        coordinates={},
+                        metadata={'method': 'pdfplumber', 'index': i}
+                    ))
+        elif method == 'camelot':
+            for i, table in enumerate(camelot.read_pdf(pdf_path, pages=str(page_num + 1), flavor='lattice')):
                 if not table.df.empty:
                     tables.append(FinancialTable(
-                        page_number=table.page,
+                        page_number=page_num,
                         table_type='camelot',
                         data=table.df,
-                        confidence=table.accuracy,
+                        confidence=table.accuracy / 100.0,
                         coordinates=table._bbox,
                         metadata={'method': 'camelot', 'index': i}
                     ))
-        except Exception as e:
-            self.logger.warning(f"Camelot extraction failed: {str(e)}")
-        
-        try:
-            # Method 2: Tabula
-            tabula_tables = tabula.read_pdf(pdf_path, pages='all', multiple_tables=True)
-            for i, table in enumerate(tabula_tables):
-                if not table.empty:
+        elif method == 'tabula':
+            for i, df in enumerate(tabula.read_pdf(pdf_path, pages=page_num + 1, multiple_tables=True)):
+                if not df.empty:
                     tables.append(FinancialTable(
-                        page_number=0,  # Tabula doesn't provide page info easily
+                        page_number=page_num,
                         table_type='tabula',
-                        data=table,
-                        confidence=0.8,  # Default confidence
+                        data=df,
+                        confidence=_score_table(df),
                         coordinates={},
                         metadata={'method': 'tabula', 'index': i}
                     ))
-        except Exception as e:
-            self.logger.warning(f"Tabula extraction failed: {str(e)}")
-        
-        try:
-            # Method 3: PDFPlumber
-            with PDF(pdf_path) as pdf:
-                for page_num, page in enumerate(pdf.pages):
-                    page_tables = page.extract_tables()
-                    for i, table in enumerate(page_tables):
-                        if table:
-                            df = pd.DataFrame(table[1:], columns=table[0])
-                            tables.append(FinancialTable(
-                                page_number=page_num,
-                                table_type='pdfplumber',
-                                data=df,
-                                confidence=0.7,
-                                coordinates={},
-                                metadata={'method': 'pdfplumber', 'index': i}
-                            ))
-        except Exception as e:
-            self.logger.warning(f"PDFPlumber extraction failed: {str(e)}")
-        
+        else:
+            raise ValueError(f"Unknown table extractor: {method}")
         return tables
     
+    def _deduplicate_tables(self, tables: List[FinancialTable]) -> List[FinancialTable]:
+        """Drop tables that repeat a higher-confidence table from another extractor."""
+        kept: List[Tuple[FinancialTable, set]] = []
+        for table in sorted(tables, key=lambda t: t.confidence, reverse=True):
+            cells = _table_cells(table.data)
+            duplicate_of = next(
+                (k for k, k_cells in kept if _jaccard(cells, k_cells) >= settings.table_duplicate_similarity),
+                None
+            )
+            if duplicate_of is None:
+                kept.append((table, cells))
+            else:
+                duplicate_of.metadata.setdefault('also_found_by', []).append(table.table_type)
+        return [table for table, _ in kept]
+    
+    def get_table_stats(self) -> Dict[str, Any]:
+        """Pages scanned, candidates and per-extractor calls/time/tables so far."""
+        return {
+            **self.table_stats,
+            'extractors': {k: dict(v) for k, v in self.table_stats['extractors'].items()}
+        }
+    
     def _analyze_financial_content(self, text_blocks: List[TextBlock], tables: List[FinancialTable]) -> Dict[str, Any]:
         """Analyze financial content and extract key information."""
         financial_data = {
@@ -0,0 +1,161 @@
+"""
+On-disk cache of parsed PDF extraction results.
+"""
+from typing import Dict, Any, Optional, Tuple
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+
+import pandas as pd
+
+from app.config import settings
+
+try:
+    import pyarrow  # noqa: F401  (enables Parquet in pandas)
+except Exception:
+    pyarrow = None
+
+
+class ExtractionCache:
+    """Content-addressed store for extraction results.
+
+    An entry is a directory named after the file's SHA-256 and the
+    reader version, holding one columnar file per frame (Parquet when
+    pyarrow is installed, gzipped JSON otherwise) plus a small JSON
+    document for everything else. Entries are written to a temporary
+    directory and renamed into place, so readers never see a partial
+    entry.
+    """
+
+    def __init__(self, directory: Optional[str] = None, enabled: Optional[bool] = None):
+        """Initialize cache rooted at ``directory``."""
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory or settings.extraction_cache_directory
+        self.enabled = settings.extraction_cache_enabled if enabled is None else enabled
+        self.format = "parquet" if pyarrow is not None else "json"
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+    @staticmethod
+    def file_hash(path: str, chunk_size: int = 1024 * 1024) -> str:
+        """SHA-256 of a file, read in chunks."""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def key_for(self, path: str, version: str, content_hash: Optional[str] = None) -> str:
+        """Cache key for ``path`` parsed by reader ``version``.
+
+        Pass the file's known SHA-256 as ``content_hash`` (uploads store it)
+        to skip re-reading the file; it is hashed only as a fallback.
+        """
+        return f"{content_hash or self.file_hash(path)}-{version}"
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def load(self, key: str) -> Optional[Tuple[Dict[str, pd.DataFrame], Dict[str, Any]]]:
+        """Return ``(frames, meta)`` stored under ``key``, or ``None``."""
+        if not self.enabled:
+            return None
+        path = self._entry_path(key)
+        manifest_path = os.path.join(path, "manifest.json")
+        if not os.path.exists(manifest_path):
+            self._count("misses")
+            return None
+
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            frames = {
+                name: self._read_frame(os.path.join(path, filename), manifest["format"])
+                for name, filename in manifest["frames"].items()
+            }
+        except Exception as e:
+            self.logger.warning(f"Discarding unreadable extraction cache entry {key}: {str(e)}")
+            shutil.rmtree(path, ignore_errors=True)
+            self._count("errors")
+            return None
+
+        self._count("hits")
+        return frames, manifest["meta"]
+
+    def store(self, key: str, frames: Dict[str, pd.DataFrame], meta: Dict[str, Any]) -> bool:
+        """Persist ``frames`` and JSON-serializable ``meta`` under ``key``."""
+        if not self.enabled:
+            return False
+        path = self._entry_path(key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(temp_path)
+            extension = "parquet" if self.format == "parquet" else "json.gz"
+            manifest = {"format": self.format, "frames": {}, "meta": meta}
+            for name, frame in frames.items():
+                filename = f"{name}.{extension}"
+                self._write_frame(frame, os.path.join(temp_path, filename))
+                manifest["frames"][name] = filename
+            with open(os.path.join(temp_path, "manifest.json"), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, default=str)
+
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(temp_path, path)
+        except Exception as e:
+            self.logger.warning(f"Could not write extraction cache entry {key}: {str(e)}")
+            shutil.rmtree(temp_path, ignore_errors=True)
+            self._count("errors")
+            return False
+
+        self._count("stores")
+        return True
+
+    def _write_frame(self, frame: pd.DataFrame, path: str) -> None:
+        if self.format == "parquet":
+            frame.to_parquet(path, index=False, compression="zstd")
+        else:
+            frame.to_json(path, orient="split", index=False, compression="gzip")
+
+    @staticmethod
+    def _read_frame(path: str, fmt: str) -> pd.DataFrame:
+        if fmt == "parquet":
+            return pd.read_parquet(path)
+        return pd.read_json(
+            path, orient="split", compression="gzip",
+            dtype=False, convert_dates=False, convert_axes=False
+        )
+
+    def _count(self, field: str) -> None:
+        with self._lock:
+            self._stats[field] += 1
+
+    def clear(self) -> None:
+        """Remove every cache entry."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and storage format."""
+        with self._lock:
+            return {"enabled": self.enabled, "format": self.format, **self._stats}
+
+
+def frame_to_json(frame: pd.DataFrame) -> str:
+    """Serialize a table's data for storage in a single cache column."""
+    return frame.to_json(orient="split", index=False)
+
+
+def frame_from_json(payload: str) -> pd.DataFrame:
+    """Inverse of ``frame_to_json``; keeps cell values as stored."""
+    return pd.read_json(
+        io.StringIO(payload), orient="split",
+        dtype=False, convert_dates=False, convert_axes=False
+    )
+
+
+# Global cache instance
+extraction_cache = ExtractionCache()
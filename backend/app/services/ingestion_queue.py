@@ -0,0 +1,266 @@
+"""
+Background ingestion queue for uploaded documents.
+"""
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+from datetime import datetime
+import asyncio
+import logging
+import uuid
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Document
+
+
+# Ingestion stages, in order
+STAGE_QUEUED = "queued"
+STAGE_EXTRACTING = "extracting"
+STAGE_INDEXING = "indexing"
+STAGE_COMPLETED = "completed"
+STAGE_FAILED = "failed"
+ACTIVE_STAGES = (STAGE_QUEUED, STAGE_EXTRACTING, STAGE_INDEXING)
+
+
+class IngestionQueueFull(Exception):
+    """Raised when no more ingestion jobs can be accepted."""
+
+
+def update_job_status(
+    document_id: int,
+    stage: str,
+    progress: Optional[float] = None,
+    error: Optional[str] = None
+) -> None:
+    """Record a document's ingestion stage (readable by any process)."""
+    with SessionLocal() as db:
+        document = db.query(Document).filter(Document.id == document_id).first()
+        if not document:
+            return
+        document.processing_stage = stage
+        if progress is not None:
+            document.processing_progress = progress
+        if stage == STAGE_EXTRACTING and document.processing_started_at is None:
+            document.processing_started_at = datetime.utcnow()
+        if stage in (STAGE_COMPLETED, STAGE_FAILED):
+            document.processing_completed_at = datetime.utcnow()
+        if stage == STAGE_COMPLETED:
+            document.is_processed = True
+            document.processing_progress = 1.0
+        if error:
+            document.processing_error = error
+        db.commit()
+
+
+async def report_job_status(
+    document_id: int,
+    stage: str,
+    progress: Optional[float] = None,
+    error: Optional[str] = None
+) -> None:
+    """``update_job_status`` in a worker thread, off the event loop."""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, update_job_status, document_id, stage, progress, error)
+
+
+async def run_ingestion(
+    document_id: int,
+    file_path: str,
+    file_type: str,
+    company: Optional[str] = None
+) -> bool:
+    """Process one uploaded document, recording every stage transition."""
+    from app.services.document_processor import DocumentProcessor
+
+    try:
+        await DocumentProcessor().process_document(
+            document_id,
+            file_path,
+            file_type,
+            company=company,
+            progress=lambda stage, fraction: report_job_status(document_id, stage, fraction)
+        )
+        await report_job_status(document_id, STAGE_COMPLETED)
+        return True
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Ingestion of document {document_id} failed: {str(e)}")
+        await report_job_status(document_id, STAGE_FAILED, error=str(e))
+        return False
+
+
+class IngestionQueue:
+    """In-process queue drained by a fixed pool of asyncio workers.
+
+    ``num_workers`` bounds how many documents are ingested at once and
+    ``max_pending`` bounds how many may wait; beyond that ``submit``
+    raises ``IngestionQueueFull`` instead of letting work pile up.
+    """
+
+    backend = "asyncio"
+
+    def __init__(
+        self,
+        num_workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        runner: Callable[..., Awaitable[bool]] = run_ingestion
+    ):
+        """Initialize queue; workers start on ``start()`` or first submit."""
+        self.logger = logging.getLogger(__name__)
+        self.num_workers = num_workers or settings.ingestion_workers
+        self.max_pending = max_pending or settings.ingestion_max_pending
+        self._runner = runner
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._active = 0
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "max_active_seen": 0,
+        }
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self) -> None:
+        """Start worker tasks on the running event loop."""
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+
+    async def stop(self) -> None:
+        """Cancel workers; unfinished jobs are picked up by ``recover()``."""
+        for worker in self._workers:
+            worker.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    async def submit(
+        self,
+        document_id: int,
+        file_path: str,
+        file_type: str,
+        company: Optional[str] = None
+    ) -> str:
+        """Queue a document for ingestion and return its job ID."""
+        if not self.is_running:
+            await self.start()
+
+        job_id = uuid.uuid4().hex
+        try:
+            self._queue.put_nowait((job_id, document_id, file_path, file_type, company))
+        except asyncio.QueueFull:
+            raise IngestionQueueFull(f"Ingestion queue is full ({self.max_pending} pending)")
+        self._stats["submitted"] += 1
+        return job_id
+
+    async def join(self) -> None:
+        """Wait until every queued job has finished."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def _worker(self) -> None:
+        while True:
+            job_id, document_id, file_path, file_type, company = await self._queue.get()
+            self._active += 1
+            self._stats["max_active_seen"] = max(self._stats["max_active_seen"], self._active)
+            try:
+                ok = await self._runner(document_id, file_path, file_type, company)
+                self._stats["completed" if ok else "failed"] += 1
+            except Exception as e:
+                self._stats["failed"] += 1
+                self.logger.error(f"Ingestion job {job_id} crashed: {str(e)}")
+            finally:
+                self._active -= 1
+                self._queue.task_done()
+
+    async def recover(self) -> int:
+        """Re-queue documents whose ingestion was interrupted by a restart."""
+        with SessionLocal() as db:
+            documents = db.query(Document).filter(Document.processing_stage.in_(ACTIVE_STAGES)).all()
+            jobs = [(d.id, d.file_path, d.file_type, (d.document_metadata or {}).get("company")) for d in documents]
+
+        recovered = 0
+        for document_id, file_path, file_type, company in jobs:
+            try:
+                job_id = await self.submit(document_id, file_path, file_type, company)
+            except IngestionQueueFull:
+                break
+            with SessionLocal() as db:
+                document = db.query(Document).filter(Document.id == document_id).first()
+                document.job_id = job_id
+                document.processing_stage = STAGE_QUEUED
+                db.commit()
+            recovered += 1
+        return recovered
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return queue depth, concurrency and job counters."""
+        return {
+            "backend": self.backend,
+            "workers": self.num_workers,
+            "max_pending": self.max_pending,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "active": self._active,
+            **self._stats,
+        }
+
+
+class CeleryIngestionQueue:
+    """Hand ingestion jobs to the Celery workers from docker-compose.
+
+    Concurrency is bounded by the worker's ``--concurrency`` and status is
+    shared through the database, so ``/documents/{id}/status`` works the
+    same as with the in-process queue.
+    """
+
+    backend = "celery"
+
+    async def start(self) -> None:
+        return None
+
+    async def stop(self) -> None:
+        return None
+
+    async def recover(self) -> int:
+        # Celery redelivers unacknowledged tasks itself (acks_late)
+        return 0
+
+    async def submit(
+        self,
+        document_id: int,
+        file_path: str,
+        file_type: str,
+        company: Optional[str] = None
+    ) -> str:
+        """Send the job to the broker and return the Celery task ID."""
+        from app.celery import process_document_task
+
+        try:
+            result = process_document_task.delay(document_id, file_path, file_type, company)
+        except Exception as e:
+            raise IngestionQueueFull(f"Could not reach the task broker: {str(e)}")
+        return result.id
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "broker": settings.redis_url}
+
+
+_ingestion_queue = None
+
+
+def get_ingestion_queue():
+    """Return the process-wide ingestion queue selected by ``settings.ingestion_backend``."""
+    global _ingestion_queue
+    if _ingestion_queue is None:
+        if settings.ingestion_backend == "celery":
+            _ingestion_queue = CeleryIngestionQueue()
+        elif settings.ingestion_backend == "asyncio":
+            _ingestion_queue = IngestionQueue()
+        else:
+            raise ValueError(f"Unknown ingestion backend: {settings.ingestion_backend}")
+    return _ingestion_queue
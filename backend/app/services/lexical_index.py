@@ -0,0 +1,203 @@
+"""
+Persistent BM25 inverted index maintained alongside the vector collection.
+"""
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+from collections import Counter
+import threading
+import logging
+import json
+import math
+import os
+import re
+
+from app.config import settings
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.&'\-][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word/number tokens; keeps 'q3', '2024', 'ebitda', 's&p', '10-k' whole."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """In-process BM25 index over RAG chunks.
+
+    Postings live in memory; each document's chunk term frequencies are
+    persisted to their own JSON file so indexing or deleting one document
+    only rewrites that document's file.
+    """
+
+    def __init__(self, persist_directory: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        """Initialize index, loading any persisted documents."""
+        self.logger = logging.getLogger(__name__)
+        self.persist_directory = persist_directory
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+
+        self._chunks: Dict[str, Dict[str, Any]] = {}      # chunk_id -> {document_id, tf, length}
+        self._postings: Dict[str, Dict[str, int]] = {}    # term -> {chunk_id: tf}
+        self._document_chunks: Dict[int, set] = {}        # document_id -> chunk_ids
+        self._total_length = 0
+
+        if persist_directory:
+            os.makedirs(persist_directory, exist_ok=True)
+            self._load()
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._chunks
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def _document_path(self, document_id: int) -> str:
+        return os.path.join(self.persist_directory, f"doc_{document_id}.json")
+
+    def _load(self) -> None:
+        """Load every persisted document file."""
+        for filename in os.listdir(self.persist_directory):
+            if not (filename.startswith("doc_") and filename.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(self.persist_directory, filename), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                for chunk_id, chunk in data["chunks"].items():
+                    self._add_tf(chunk_id, data["document_id"], chunk["tf"], chunk["length"])
+            except Exception as e:
+                self.logger.warning(f"Skipping corrupt lexical index file {filename}: {str(e)}")
+
+    def _add_tf(self, chunk_id: str, document_id: int, tf: Dict[str, int], length: int) -> None:
+        if chunk_id in self._chunks:
+            self._remove_chunk(chunk_id)
+        self._chunks[chunk_id] = {"document_id": document_id, "tf": tf, "length": length}
+        self._document_chunks.setdefault(document_id, set()).add(chunk_id)
+        self._total_length += length
+        for term, count in tf.items():
+            self._postings.setdefault(term, {})[chunk_id] = count
+
+    def _remove_chunk(self, chunk_id: str) -> None:
+        chunk = self._chunks.pop(chunk_id, None)
+        if chunk is None:
+            return
+        self._total_length -= chunk["length"]
+        for term in chunk["tf"]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[term]
+        document_chunks = self._document_chunks.get(chunk["document_id"])
+        if document_chunks is not None:
+            document_chunks.discard(chunk_id)
+            if not document_chunks:
+                del self._document_chunks[chunk["document_id"]]
+
+    def add(self, document_id: int, chunk_id: str, text: str) -> None:
+        """Add or replace one chunk."""
+        tokens = tokenize(text)
+        with self._lock:
+            self._add_tf(chunk_id, document_id, dict(Counter(tokens)), len(tokens))
+
+    def remove(self, chunk_ids: Iterable[str]) -> None:
+        """Remove chunks by ID."""
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._remove_chunk(chunk_id)
+
+    def remove_document(self, document_id: int) -> None:
+        """Remove every chunk of a document, including its persisted file."""
+        with self._lock:
+            for chunk_id in list(self._document_chunks.get(document_id, ())):
+                self._remove_chunk(chunk_id)
+            if self.persist_directory and os.path.exists(self._document_path(document_id)):
+                os.remove(self._document_path(document_id))
+
+    def persist_document(self, document_id: int) -> None:
+        """Atomically write one document's chunks to disk."""
+        if not self.persist_directory:
+            return
+        with self._lock:
+            chunk_ids = self._document_chunks.get(document_id, set())
+            data = {
+                "document_id": document_id,
+                "chunks": {
+                    chunk_id: {"tf": self._chunks[chunk_id]["tf"], "length": self._chunks[chunk_id]["length"]}
+                    for chunk_id in chunk_ids
+                }
+            }
+        path = self._document_path(document_id)
+        if not data["chunks"]:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        document_ids: Optional[Iterable[int]] = None
+    ) -> List[Tuple[str, float]]:
+        """Return ``(chunk_id, bm25_score)`` pairs, best first."""
+        terms = set(tokenize(query))
+        with self._lock:
+            total_chunks = len(self._chunks)
+            if not terms or not total_chunks:
+                return []
+
+            allowed = None
+            if document_ids is not None:
+                allowed = set()
+                for document_id in document_ids:
+                    allowed |= self._document_chunks.get(document_id, set())
+
+            avg_length = self._total_length / total_chunks
+            scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total_chunks - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    if allowed is not None and chunk_id not in allowed:
+                        continue
+                    length = self._chunks[chunk_id]["length"]
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return index size statistics."""
+        return {
+            "chunks": len(self._chunks),
+            "documents": len(self._document_chunks),
+            "terms": len(self._postings),
+        }
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse several ranked ID lists with RRF: score = sum(1 / (k + rank))."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+_indexes: Dict[str, BM25Index] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(persist_directory: Optional[str] = None) -> BM25Index:
+    """Return the process-wide BM25 index stored next to the Chroma data."""
+    persist_directory = persist_directory or os.path.join(settings.chroma_persist_directory, "bm25")
+    with _indexes_lock:
+        if persist_directory not in _indexes:
+            _indexes[persist_directory] = BM25Index(persist_directory)
+        return _indexes[persist_directory]
@@ -0,0 +1,307 @@
+"""
+Shared async client for the Gemini REST API.
+"""
+from typing import Dict, Any, Optional, AsyncIterator, Tuple
+from collections import deque
+from dataclasses import dataclass, field
+import asyncio
+import json
+import logging
+import random
+import time
+
+import httpx
+import numpy as np
+
+from app.config import settings
+
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Raised when a generation request fails for good."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class LLMResponse:
+    """Text and accounting for one completed generation."""
+    text: str
+    model: str
+    latency: float
+    attempts: int = 1
+    usage: Dict[str, Any] = field(default_factory=dict)
+
+
+class TokenBucket:
+    """Async token bucket refilling ``rate`` tokens per second up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> float:
+        """Take one token, sleeping until one is available; returns seconds waited."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+
+class GeminiClient:
+    """Pooled, rate-limited and retrying client for Gemini text generation.
+
+    One ``httpx.AsyncClient`` (and so one keep-alive connection pool) is
+    shared by every caller. A semaphore caps in-flight requests and a
+    token bucket caps the request rate to stay under provider quotas;
+    429 and 5xx responses and transport errors are retried with
+    exponential backoff and jitter, honouring ``Retry-After``.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        model: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        requests_per_second: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        timeout: Optional[float] = None,
+        backoff_base: Optional[float] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        """Initialize client; the HTTP pool is created on first use."""
+        self.logger = logging.getLogger(__name__)
+        self.api_key = api_key or settings.gemini_api_key
+        self.base_url = (base_url or settings.gemini_base_url).rstrip("/")
+        self.model = model or settings.gemini_model
+        self.max_concurrency = max_concurrency or settings.llm_max_concurrency
+        self.max_retries = settings.llm_max_retries if max_retries is None else max_retries
+        self.timeout = timeout or settings.llm_timeout_seconds
+        self.backoff_base = settings.llm_backoff_base_seconds if backoff_base is None else backoff_base
+        rate = settings.llm_requests_per_second if requests_per_second is None else requests_per_second
+        self._transport = transport
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._bucket = TokenBucket(rate)
+
+        self._latencies: deque = deque(maxlen=1000)
+        self._stats = {
+            "requests": 0,
+            "failures": 0,
+            "retries": 0,
+            "throttle_wait_seconds": 0.0,
+            "prompt_tokens": 0,
+            "output_tokens": 0,
+        }
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"x-goog-api-key": self.api_key},
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                ),
+                transport=self._transport
+            )
+        return self._client
+
+    async def close(self) -> None:
+        """Close pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @staticmethod
+    def _payload(prompt: str, temperature: Optional[float], max_output_tokens: Optional[int]) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        generation_config = {}
+        if temperature is not None:
+            generation_config["temperature"] = temperature
+        if max_output_tokens is not None:
+            generation_config["maxOutputTokens"] = max_output_tokens
+        if generation_config:
+            payload["generationConfig"] = generation_config
+        return payload
+
+    @staticmethod
+    def _candidate_text(body: Dict[str, Any]) -> str:
+        candidates = body.get("candidates") or []
+        if not candidates:
+            return ""
+        parts = (candidates[0].get("content") or {}).get("parts") or []
+        return "".join(part.get("text", "") for part in parts)
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        delay = self.backoff_base * (2 ** attempt)
+        return delay + random.uniform(0, delay / 2)
+
+    async def _open(self, path: str, payload: Dict[str, Any], stream: bool = False) -> Tuple[httpx.Response, int]:
+        """Send a request with throttling and retries; returns the response and attempts used.
+
+        The caller owns the returned response and must close it.
+        """
+        client = self._get_client()
+        attempt = 0
+        while True:
+            self._stats["throttle_wait_seconds"] += await self._bucket.acquire()
+            try:
+                request = client.build_request("POST", path, json=payload)
+                response = await client.send(request, stream=stream)
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                if attempt >= self.max_retries:
+                    raise LLMError(f"Gemini request failed: {str(e)}")
+                delay = self._backoff(attempt)
+            else:
+                if response.status_code < 400:
+                    return response, attempt + 1
+                await response.aread()
+                await response.aclose()
+                if response.status_code not in RETRYABLE_STATUS or attempt >= self.max_retries:
+                    raise LLMError(
+                        f"Gemini returned {response.status_code}: {response.text[:200]}",
+                        status_code=response.status_code
+                    )
+                delay = self._backoff(attempt, response.headers.get("retry-after"))
+
+            attempt += 1
+            self._stats["retries"] += 1
+            self.logger.warning(f"Retrying Gemini request in {delay:.2f}s (attempt {attempt})")
+            await asyncio.sleep(delay)
+
+    def _record(self, model: str, started: float, attempts: int, usage: Dict[str, Any]) -> float:
+        latency = time.perf_counter() - started
+        self._latencies.append(latency)
+        self._stats["prompt_tokens"] += usage.get("promptTokenCount", 0)
+        self._stats["output_tokens"] += usage.get("candidatesTokenCount", 0)
+        self.logger.debug(f"Gemini {model} call took {latency:.3f}s in {attempts} attempt(s)")
+        return latency
+
+    async def generate(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_output_tokens: Optional[int] = None
+    ) -> LLMResponse:
+        """Generate a complete response for ``prompt``."""
+        model = model or self.model
+        payload = self._payload(prompt, temperature, max_output_tokens)
+        async with self._semaphore:
+            self._stats["requests"] += 1
+            started = time.perf_counter()
+            try:
+                response, attempts = await self._open(f"/v1beta/models/{model}:generateContent", payload)
+                try:
+                    body = response.json()
+                finally:
+                    await response.aclose()
+            except Exception:
+                self._stats["failures"] += 1
+                raise
+
+        usage = body.get("usageMetadata") or {}
+        latency = self._record(model, started, attempts, usage)
+        return LLMResponse(
+            text=self._candidate_text(body),
+            model=model,
+            latency=latency,
+            attempts=attempts,
+            usage=usage
+        )
+
+    async def stream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_output_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """Yield response text as Gemini generates it.
+
+        Only opening the stream is retried; once text has been yielded a
+        failure is raised to the caller.
+        """
+        model = model or self.model
+        payload = self._payload(prompt, temperature, max_output_tokens)
+        async with self._semaphore:
+            self._stats["requests"] += 1
+            started = time.perf_counter()
+            usage: Dict[str, Any] = {}
+            try:
+                response, attempts = await self._open(
+                    f"/v1beta/models/{model}:streamGenerateContent?alt=sse", payload, stream=True
+                )
+                try:
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        body = json.loads(line[len("data:"):])
+                        usage = body.get("usageMetadata") or usage
+                        text = self._candidate_text(body)
+                        if text:
+                            yield text
+                finally:
+                    await response.aclose()
+            except Exception:
+                self._stats["failures"] += 1
+                raise
+
+        self._record(model, started, attempts, usage)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return request counters and latency percentiles (seconds)."""
+        latencies = np.array(self._latencies) if self._latencies else None
+        return {
+            **self._stats,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.max_concurrency - self._semaphore._value,
+            "latency_avg": float(latencies.mean()) if latencies is not None else 0.0,
+            "latency_p50": float(np.percentile(latencies, 50)) if latencies is not None else 0.0,
+            "latency_p95": float(np.percentile(latencies, 95)) if latencies is not None else 0.0,
+        }
+
+
+_llm_client: Optional[GeminiClient] = None
+
+
+def get_llm_client() -> GeminiClient:
+    """Return the process-wide Gemini client."""
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = GeminiClient()
+    return _llm_client
+
+
+async def close_llm_client() -> None:
+    """Close the shared client's connection pool."""
+    global _llm_client
+    if _llm_client is not None:
+        await _llm_client.close()
+        _llm_client = None
@@ -3,18 +3,16 @@ Automated MD&A (Management Discussion & Analysis) draft generation from financia
 """
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Callable, Awaitable
 from datetime import datetime, timedelta
+import asyncio
 import logging
 import json
 import re
 from dataclasses import dataclass
 from enum import Enum
 
-import google.generativeai as genai
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
 from langchain.schema import Document
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain.vectorstores import Chroma
@@ -22,10 +20,12 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 from app.services.rag_service import RAGService
 from app.services.financial_analyzer import FinancialAnalyzer
+from app.services.llm_client import GeminiClient, get_llm_client
+from app.services.prompt_packer import prompt_packer
 from app.config import settings
 
 
-class MDASection(Enum):
+class MDASectionType(Enum):
     """MD&A section types."""
     EXECUTIVE_SUMMARY = "executive_summary"
     BUSINESS_OVERVIEW = "business_overview"
@@ -51,7 +51,7 @@ class FinancialMetric:
 @dataclass
 class MDASection:
     """MD&A section structure."""
-    section_type: MDASection
+    section_type: MDASectionType
     title: str
     content: str
     key_metrics: List[FinancialMetric]
@@ -62,25 +62,42 @@ class MDASection:
 class MDAGenerator:
     """Automated MD&A draft generator."""
     
-    def __init__(self):
-        """Initialize MD&A generator."""
+    def __init__(self, llm_client: Optional[GeminiClient] = None, rag_service: Optional[RAGService] = None):
+        """Initialize MD&A generator.
+        
+        A ``rag_service`` passed in stays owned by the caller; otherwise one
+        is created on first use and released by ``close()``.
+        """
         self.logger = logging.getLogger(__name__)
-        genai.configure(api_key=settings.gemini_api_key)
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            temperature=0.3,
-            google_api_key=settings.gemini_api_key
-        )
+        self.llm_client = llm_client or get_llm_client()
+        self.temperature = 0.3
+        self.prompt_packer = prompt_packer
+        self.section_concurrency = settings.mda_section_concurrency
+        self.section_timeout = settings.mda_section_timeout_seconds
         self.embeddings = GoogleGenerativeAIEmbeddings(
             model="models/embedding-001",
             google_api_key=settings.gemini_api_key
         )
-        self.rag_service = RAGService()
+        self._rag_service = rag_service
+        self._owns_rag_service = rag_service is None
         self.financial_analyzer = FinancialAnalyzer()
         
         # Initialize prompt templates
         self._initialize_prompts()
     
+    @property
+    def rag_service(self) -> RAGService:
+        """RAG service, taking a model reference only when actually needed."""
+        if self._rag_service is None:
+            self._rag_service = RAGService()
+        return self._rag_service
+    
+    def close(self) -> None:
+        """Release the embedding model reference held by an owned RAG service."""
+        if self._owns_rag_service and self._rag_service is not None:
+            self._rag_service.close()
+            self._rag_service = None
+    
     def _initialize_prompts(self):
         """Initialize prompt templates for MD&A generation."""
         self.prompts = {
@@ -185,6 +202,8 @@ class MDAGenerator:
             'citations': [],
             'confidence': 0.0,
             'generation_time': 0.0,
+            'failed_sections': [],
+            'partial': False,
             'success': False
         }
         
@@ -195,32 +214,26 @@ class MDAGenerator:
             metrics = await self._extract_financial_metrics(financial_data)
             result['key_metrics'] = metrics
             
-            # Step 2: Generate each MD&A section
-            sections = []
-            
-            # Executive Summary
-            exec_summary = await self._generate_executive_summary(
-                financial_data, metrics, period
-            )
-            sections.append(exec_summary)
-            
-            # Results of Operations
-            results_ops = await self._generate_results_of_operations(
-                financial_data, metrics, period
-            )
-            sections.append(results_ops)
-            
-            # Liquidity and Capital Resources
-            liquidity = await self._generate_liquidity_analysis(
-                financial_data, metrics, period
-            )
-            sections.append(liquidity)
-            
-            # Risk Factors
-            risks = await self._generate_risk_factors(
-                financial_data, company_info, period
-            )
-            sections.append(risks)
+            # Step 2: Generate the MD&A sections concurrently (they only share the metrics)
+            section_jobs = [
+                ("Executive Summary", lambda: self._generate_executive_summary(
+                    financial_data, metrics, period
+                )),
+                ("Results of Operations", lambda: self._generate_results_of_operations(
+                    financial_data, metrics, period
+                )),
+                ("Liquidity and Capital Resources", lambda: self._generate_liquidity_analysis(
+                    financial_data, metrics, period
+                )),
+                ("Risk Factors", lambda: self._generate_risk_factors(
+                    financial_data, company_info, period
+                )),
+            ]
+            sections, failed_sections = await self._generate_sections(section_jobs)
+            result['failed_sections'] = failed_sections
+            result['partial'] = bool(failed_sections)
+            if not sections:
+                raise RuntimeError("No MD&A section could be generated")
             
             # Step 3: Combine sections into complete draft
             md_a_draft = self._combine_sections(sections)
@@ -231,9 +244,9 @@ class MDAGenerator:
             citations = self._extract_citations(sections)
             result['citations'] = citations
             
-            # Step 5: Calculate confidence
+            # Step 5: Calculate confidence (scaled down for missing sections)
             confidence = self._calculate_confidence(sections, metrics)
-            result['confidence'] = confidence
+            result['confidence'] = confidence * len(sections) / len(section_jobs)
             
             result['success'] = True
             
@@ -247,6 +260,34 @@ class MDAGenerator:
         
         return result
     
+    async def _generate_sections(
+        self,
+        section_jobs: List[Tuple[str, Callable[[], Awaitable[MDASection]]]]
+    ) -> Tuple[List[MDASection], List[Dict[str, str]]]:
+        """Run section generators concurrently and keep whatever succeeds.
+        
+        At most ``section_concurrency`` sections run at once and each gets
+        ``section_timeout`` seconds once started. Returns the generated
+        sections in job order and a ``{section, error}`` entry per failure.
+        """
+        semaphore = asyncio.Semaphore(self.section_concurrency)
+        
+        async def run(title: str, generate: Callable[[], Awaitable[MDASection]]):
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(generate(), timeout=self.section_timeout)
+                except asyncio.TimeoutError:
+                    error = f"timed out after {self.section_timeout:g}s"
+                except Exception as e:
+                    error = str(e)
+            self.logger.warning(f"MD&A section '{title}' failed: {error}")
+            return {'section': title, 'error': error}
+        
+        outcomes = await asyncio.gather(*(run(title, generate) for title, generate in section_jobs))
+        sections = [outcome for outcome in outcomes if not isinstance(outcome, dict)]
+        failed = [outcome for outcome in outcomes if isinstance(outcome, dict)]
+        return sections, failed
+    
     async def _extract_financial_metrics(self, financial_data: Dict[str, Any]) -> List[FinancialMetric]:
         """Extract and analyze financial metrics."""
         metrics = []
@@ -320,15 +361,15 @@ class MDAGenerator:
         financial_data_text = self._format_financial_data_for_prompt(financial_data)
         
         # Generate content using LLM
-        chain = LLMChain(llm=self.llm, prompt=self.prompts['executive_summary'])
-        content = await chain.arun(
+        content = await self._complete(
+            'executive_summary',
             financial_data=financial_data_text,
             key_metrics=key_metrics_text,
             period=period
         )
         
         return MDASection(
-            section_type=MDASection.EXECUTIVE_SUMMARY,
+            section_type=MDASectionType.EXECUTIVE_SUMMARY,
             title="Executive Summary",
             content=content,
             key_metrics=metrics,
@@ -349,15 +390,15 @@ class MDAGenerator:
         metrics_text = self._format_metrics_for_prompt(metrics)
         
         # Generate content
-        chain = LLMChain(llm=self.llm, prompt=self.prompts['results_of_operations'])
-        content = await chain.arun(
+        content = await self._complete(
+            'results_of_operations',
             income_statement=income_statement,
             metrics=metrics_text,
             period=period
         )
         
         return MDASection(
-            section_type=MDASection.RESULTS_OF_OPERATIONS,
+            section_type=MDASectionType.RESULTS_OF_OPERATIONS,
             title="Results of Operations",
             content=content,
             key_metrics=metrics,
@@ -379,8 +420,8 @@ class MDAGenerator:
         ratios = self._extract_ratios_data(metrics)
         
         # Generate content
-        chain = LLMChain(llm=self.llm, prompt=self.prompts['liquidity_analysis'])
-        content = await chain.arun(
+        content = await self._complete(
+            'liquidity_analysis',
             balance_sheet=balance_sheet,
             cash_flow=cash_flow,
             ratios=ratios,
@@ -388,7 +429,7 @@ class MDAGenerator:
         )
         
         return MDASection(
-            section_type=MDASection.LIQUIDITY_AND_CAPITAL_RESOURCES,
+            section_type=MDASectionType.LIQUIDITY_AND_CAPITAL_RESOURCES,
             title="Liquidity and Capital Resources",
             content=content,
             key_metrics=metrics,
@@ -409,15 +450,15 @@ class MDAGenerator:
         industry_context = self._get_industry_context(company_info)
         
         # Generate content
-        chain = LLMChain(llm=self.llm, prompt=self.prompts['risk_factors'])
-        content = await chain.arun(
+        content = await self._complete(
+            'risk_factors',
             financial_data=financial_data_text,
             industry_context=industry_context,
             period=period
         )
         
         return MDASection(
-            section_type=MDASection.MARKET_RISKS,
+            section_type=MDASectionType.MARKET_RISKS,
             title="Risk Factors",
             content=content,
             key_metrics=[],
@@ -425,6 +466,12 @@ class MDAGenerator:
             confidence=0.7
         )
     
+    async def _complete(self, prompt_name: str, **variables) -> str:
+        """Fill a prompt template and generate its text with the shared LLM client."""
+        prompt = self.prompts[prompt_name].format(**variables)
+        response = await self.llm_client.generate(prompt, temperature=self.temperature)
+        return response.text
+    
     def _format_metrics_for_prompt(self, metrics: List[FinancialMetric]) -> str:
         """Format metrics for prompt."""
         formatted = []
@@ -436,17 +483,8 @@ class MDAGenerator:
         return "\n".join(formatted)
     
     def _format_financial_data_for_prompt(self, financial_data: Dict[str, Any]) -> str:
-        """Format financial data for prompt."""
-        formatted = []
-        
-        for category, data in financial_data.items():
-            if isinstance(data, list) and data:
-                formatted.append(f"{category.title()}:")
-                for item in data[-3:]:  # Last 3 periods
-                    if isinstance(item, dict) and 'value' in item:
-                        formatted.append(f"  - {item.get('period', 'N/A')}: ${item['value']:,.2f}")
-        
-        return "\n".join(formatted)
+        """Format financial data for prompt (last 3 periods, within the data token budget)."""
+        return self.prompt_packer.pack_financial_data(financial_data, max_periods=3).text
     
     def _extract_income_statement_data(self, financial_data: Dict[str, Any]) -> str:
         """Extract income statement data."""
@@ -561,26 +599,26 @@ class MDAGenerator:
     
     async def generate_section_specific(
         self, 
-        section_type: MDASection,
+        section_type: MDASectionType,
         financial_data: Dict[str, Any],
         company_info: Dict[str, Any],
         period: str
     ) -> MDASection:
         """Generate a specific MD&A section."""
         
-        if section_type == MDASection.EXECUTIVE_SUMMARY:
+        if section_type == MDASectionType.EXECUTIVE_SUMMARY:
             metrics = await self._extract_financial_metrics(financial_data)
             return await self._generate_executive_summary(financial_data, metrics, period)
         
-        elif section_type == MDASection.RESULTS_OF_OPERATIONS:
+        elif section_type == MDASectionType.RESULTS_OF_OPERATIONS:
             metrics = await self._extract_financial_metrics(financial_data)
             return await self._generate_results_of_operations(financial_data, metrics, period)
         
-        elif section_type == MDASection.LIQUIDITY_AND_CAPITAL_RESOURCES:
+        elif section_type == MDASectionType.LIQUIDITY_AND_CAPITAL_RESOURCES:
             metrics = await self._extract_financial_metrics(financial_data)
             return await self._generate_liquidity_analysis(financial_data, metrics, period)
         
-        elif section_type == MDASection.MARKET_RISKS:
+        elif section_type == MDASectionType.MARKET_RISKS:
             return await self._generate_risk_factors(financial_data, company_info, period)
         
         else:
@@ -0,0 +1,325 @@
+"""
+Token-budgeted packing of retrieved context and financial data into prompts.
+"""
+from typing import Dict, Any, List, Optional, Set, Tuple
+from dataclasses import dataclass
+from functools import lru_cache
+import json
+import logging
+import re
+import threading
+
+from app.config import settings
+
+try:
+    import tiktoken
+except Exception:
+    tiktoken = None
+
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_CONTEXT_LABEL = re.compile(r"^\[Context \d+\]: ", re.M)
+_TRAILING_ZERO_DECIMALS = re.compile(r"(\d)\.0+(?![\d])")
+_ALIGNED_COLUMNS = re.compile(r"\S(?: {2,}|\t)\S")
+_NUMBER = re.compile(r"\(?-?\$?\d[\d,]*(?:\.\d+)?%?\)?")
+_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n")
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Approximate prompt token count.
+
+    Uses tiktoken when installed; otherwise counts words and punctuation,
+    which tracks subword tokenizers closely enough for budgeting.
+    """
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+def split_context(context: str) -> List[Tuple[str, str]]:
+    """Split RAG context into ``(label, text)`` passages in relevance order.
+
+    Understands the ``[Context n]: ...`` blocks built by
+    ``RAGService._format_results``; any other text is one unlabeled passage.
+    """
+    matches = list(_CONTEXT_LABEL.finditer(context))
+    if not matches:
+        return [("", context.strip())] if context.strip() else []
+
+    passages = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(context)
+        passages.append((match.group(0), context[match.end():end].strip()))
+    return passages
+
+
+def overlap_length(left: str, right: str, min_overlap: int) -> int:
+    """Length of the longest suffix of ``left`` that is a prefix of ``right``."""
+    if min_overlap <= 0 or len(left) < min_overlap or len(right) < min_overlap:
+        return 0
+    probe = right[:min_overlap]
+    position = left.find(probe, max(0, len(left) - len(right)))
+    while position != -1:
+        size = len(left) - position
+        if right.startswith(left[position:]):
+            return size
+        position = left.find(probe, position + 1)
+    return 0
+
+
+def _is_table_line(line: str) -> bool:
+    if line.count("|") >= 1 and len(line.split("|")) >= 2:
+        return True
+    return len(_NUMBER.findall(line)) >= 2 and bool(_ALIGNED_COLUMNS.search(line))
+
+
+def compress_table_line(line: str) -> str:
+    """Compact one table row: tight separators, no padding, no ``.00``."""
+    if "|" in line:
+        cells = [cell.strip() for cell in line.split("|")]
+    else:
+        cells = re.split(r" {2,}|\t+", line.strip())
+    while cells and not cells[-1]:
+        cells.pop()
+    return _TRAILING_ZERO_DECIMALS.sub(r"\1", "|".join(cells))
+
+
+def format_number(value: Any) -> str:
+    """Render a number with thousands separators and no redundant decimals."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return str(value)
+    if float(value).is_integer():
+        return f"{int(value):,}"
+    return f"{value:,.2f}".rstrip("0").rstrip(".")
+
+
+@dataclass
+class PackResult:
+    """Packed prompt text and what packing it saved."""
+    text: str
+    tokens_before: int
+    tokens_after: int
+    passages_in: int = 0
+    passages_out: int = 0
+    duplicates_removed: int = 0
+    truncated: int = 0  # cut to fit the budget
+    dropped: int = 0  # left out for lack of budget
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_before - self.tokens_after)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Stats for logging and API responses (without the text)."""
+        return {
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": self.tokens_saved,
+            "passages_in": self.passages_in,
+            "passages_out": self.passages_out,
+            "duplicates_removed": self.duplicates_removed,
+            "truncated": self.truncated,
+            "dropped": self.dropped,
+        }
+
+
+class PromptPacker:
+    """Fit retrieved passages and financial data into a token budget.
+
+    Passages are taken in relevance order. Text a passage shares with an
+    already packed one (the chunker overlaps neighbouring chunks) is
+    trimmed, passages wholly contained in another are dropped, table rows
+    are compacted and repeated table rows (headers are repeated in every
+    table chunk) are emitted once. Passages are then added until the
+    budget is spent; the first one that does not fit is cut at a sentence
+    or row boundary if enough budget remains.
+    """
+
+    def __init__(
+        self,
+        context_token_budget: Optional[int] = None,
+        data_token_budget: Optional[int] = None,
+        min_overlap_chars: Optional[int] = None,
+        min_passage_tokens: int = 32
+    ):
+        """Initialize packer with budgets from settings by default."""
+        self.logger = logging.getLogger(__name__)
+        self.context_token_budget = context_token_budget or settings.prompt_context_token_budget
+        self.data_token_budget = data_token_budget or settings.prompt_data_token_budget
+        self.min_overlap_chars = settings.prompt_dedup_min_overlap_chars if min_overlap_chars is None else min_overlap_chars
+        self.min_passage_tokens = min_passage_tokens
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "tokens_before": 0, "tokens_after": 0, "truncated": 0, "dropped": 0}
+
+    def pack_context(self, context: str, token_budget: Optional[int] = None) -> PackResult:
+        """Pack RAG context (``[Context n]:`` blocks) into ``token_budget`` tokens."""
+        budget = token_budget or self.context_token_budget
+        passages = split_context(context)
+        result = PackResult(text="", tokens_before=count_tokens(context), tokens_after=0,
+                            passages_in=len(passages))
+
+        packed: List[str] = []  # bodies, for overlap checks
+        blocks: List[str] = []  # labelled output
+        seen_rows: Set[str] = set()
+        remaining = budget
+        for label, text in passages:
+            body = self._deduplicate(text, packed)
+            if body is None:
+                result.duplicates_removed += 1
+                continue
+            body, rows = self._compress(body, seen_rows)
+            if not body:
+                result.duplicates_removed += 1
+                continue
+
+            cost = count_tokens(label) + count_tokens(body) + 1
+            if cost > remaining:
+                if remaining - count_tokens(label) < self.min_passage_tokens:
+                    result.dropped += 1
+                    continue
+                body = self._truncate(body, remaining - count_tokens(label) - 1)
+                if not body:
+                    result.dropped += 1
+                    continue
+                cost = count_tokens(label) + count_tokens(body) + 1
+                result.truncated += 1
+
+            packed.append(body)
+            blocks.append(f"{label}{body}")
+            seen_rows.update(rows)
+            remaining -= cost
+
+        result.text = "\n\n".join(blocks)
+        result.tokens_after = count_tokens(result.text)
+        result.passages_out = len(blocks)
+        self._record(result)
+        return result
+
+    def pack_financial_data(
+        self,
+        financial_data: Dict[str, Any],
+        token_budget: Optional[int] = None,
+        max_periods: Optional[int] = None
+    ) -> PackResult:
+        """Render financial data as compact ``name: period value | ...`` lines within budget.
+
+        Savings are measured against the indented JSON the prompts used to embed.
+        """
+        budget = token_budget or self.data_token_budget
+        lines = list(self._data_lines(financial_data, max_periods))
+        result = PackResult(
+            text="",
+            tokens_before=count_tokens(json.dumps(financial_data, indent=2, default=str)),
+            tokens_after=0,
+            passages_in=len(lines)
+        )
+
+        kept, remaining = [], budget
+        for line in lines:
+            cost = count_tokens(line) + 1
+            if cost > remaining:
+                result.dropped += 1
+                continue
+            kept.append(line)
+            remaining -= cost
+
+        result.text = "\n".join(kept)
+        result.tokens_after = count_tokens(result.text)
+        result.passages_out = len(kept)
+        self._record(result)
+        return result
+
+    def _deduplicate(self, text: str, packed: List[str]) -> Optional[str]:
+        """Trim text shared with packed passages; ``None`` if nothing new remains."""
+        for other in packed:
+            if text in other:
+                return None
+        for other in packed:
+            size = overlap_length(other, text, self.min_overlap_chars)
+            if size:
+                text = text[size:].lstrip()
+            size = overlap_length(text, other, self.min_overlap_chars)
+            if size:
+                text = text[:-size].rstrip()
+        return text or None
+
+    @staticmethod
+    def _compress(text: str, seen_rows: Set[str]) -> Tuple[str, Set[str]]:
+        """Compact table rows and drop rows already emitted; returns text and its rows."""
+        lines, rows = [], set()
+        for line in text.split("\n"):
+            if _is_table_line(line):
+                line = compress_table_line(line)
+                if line in seen_rows or line in rows:
+                    continue
+                rows.add(line)
+            else:
+                line = " ".join(line.split())
+            if line:
+                lines.append(line)
+        return "\n".join(lines), rows
+
+    @staticmethod
+    def _truncate(text: str, token_budget: int) -> str:
+        """Longest prefix of whole sentences/rows within ``token_budget``."""
+        kept, used, position = [], 0, 0
+        for match in _BOUNDARY.finditer(text + "\n"):
+            piece = text[position:match.end()]
+            cost = count_tokens(piece)
+            if used + cost > token_budget:
+                break
+            kept.append(piece)
+            used += cost
+            position = match.end()
+        return "".join(kept).strip()
+
+    @staticmethod
+    def _data_lines(data: Dict[str, Any], max_periods: Optional[int], prefix: str = ""):
+        for key, value in data.items():
+            name = f"{prefix}{key}"
+            if isinstance(value, dict):
+                yield from PromptPacker._data_lines(value, max_periods, f"{name}.")
+            elif isinstance(value, list) and value and all(isinstance(item, dict) and "value" in item for item in value):
+                series = value[-max_periods:] if max_periods else value
+                points = " | ".join(
+                    f"{item['period']} {format_number(item['value'])}" if item.get("period") else format_number(item["value"])
+                    for item in series
+                )
+                yield f"{name}: {points}"
+            elif isinstance(value, list):
+                yield f"{name}: {json.dumps(value, separators=(',', ':'), default=str)}"
+            else:
+                yield f"{name}: {format_number(value)}"
+
+    def _record(self, result: PackResult) -> None:
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["tokens_before"] += result.tokens_before
+            self._stats["tokens_after"] += result.tokens_after
+            self._stats["truncated"] += result.truncated
+            self._stats["dropped"] += result.dropped
+        self.logger.debug(f"Packed prompt: {result.to_dict()}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cumulative token savings."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["tokens_saved"] = max(0, stats["tokens_before"] - stats["tokens_after"])
+        return stats
+
+
+# Global packer instance
+prompt_packer = PromptPacker()
@@ -1,71 +1,287 @@
 """
 RAG (Retrieval-Augmented Generation) service for document context retrieval.
 """
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Iterator, AsyncIterable, AsyncIterator, Union, Callable, Tuple
+import asyncio
 import json
 import re
 from datetime import datetime
 
 from app.config import settings
+from app.utils.helpers import generate_document_hash
+from app.services.embedding_registry import embedding_registry, DEFAULT_COLLECTION_NAME
+from app.services.embedding_batcher import embed_query
+from app.services.cache_service import retrieval_cache, response_cache
+from app.services.text_chunker import TextChunk, iter_text_chunks, chunk_text
+from app.services.lexical_index import get_lexical_index, reciprocal_rank_fusion
+from app.services.reranker import get_reranker
+from app.services.vector_store import get_vector_store
 
 
 class RAGService:
     """Service for document retrieval and context generation."""
     
     def __init__(self):
-        """Initialize RAG service with ChromaDB and embeddings."""
-        self.client = chromadb.PersistentClient(
-            path=settings.chroma_persist_directory,
-            settings=Settings(anonymized_telemetry=False)
-        )
+        """Initialize RAG service with the shared vector store and embeddings."""
+        # Shared embedding model (loaded once per process)
+        self.embedding_model = embedding_registry.acquire_model(settings.embedding_model)
+        self._released = False
         
-        # Initialize embedding model
-        self.embedding_model = SentenceTransformer(settings.embedding_model)
+        # Shared vector store (backend chosen by settings.vector_store_backend)
+        self.collection = get_vector_store(DEFAULT_COLLECTION_NAME)
         
-        # Get or create collection
-        self.collection = self.client.get_or_create_collection(
-            name="financial_documents",
-            metadata={"description": "Financial document embeddings for FinMDA-Bot"}
-        )
+        # BM25 index kept in step with the collection for hybrid retrieval
+        self.lexical_index = get_lexical_index()
+    
+    def close(self) -> None:
+        """Release this service's reference on the shared embedding model."""
+        if not self._released:
+            embedding_registry.release_model(settings.embedding_model)
+            self._released = True
     
-    async def index_document(self, document_id: int, content: str, metadata: Dict[str, Any]) -> bool:
-        """Index a document for retrieval."""
+    async def _embed_query(self, query: str) -> List[List[float]]:
+        """Embed a query, reusing cached embeddings for repeated questions."""
+        vector = await embed_query(query, settings.embedding_model)
+        return [vector.tolist()]
+    
+    async def index_document(
+        self,
+        document_id: int,
+        content: Union[str, Iterable[str]],
+        metadata: Dict[str, Any],
+        chunks: Optional[Union[Iterable[TextChunk], AsyncIterable[TextChunk]]] = None,
+        chunk_sink: Optional[Callable[[List[Dict[str, Any]]], None]] = None
+    ) -> Dict[str, Any]:
+        """Index a document for retrieval, embedding only new or changed chunks.
+        
+        Chunk IDs are derived from a content hash, so re-indexing a revised
+        document keeps unchanged chunks, embeds only new ones (reusing any
+        identical chunk already in the collection) and deletes orphans.
+        Chunks are produced lazily and embedded/written in fixed-size
+        batches, so memory stays flat regardless of document size.
+        
+        ``chunks`` overrides the default character chunker (e.g. with
+        structure-aware chunks) and may be an async iterable, so indexing
+        can start while the source is still being parsed. ``chunk_sink``
+        receives each written batch as records so callers can persist
+        chunk rows alongside.
+        
+        Failures are not raised: the returned report (always a truthy
+        dict) has ``success`` False and the ``error`` message, so callers
+        must check ``report["success"]``.
+        """
+        report = {
+            "success": False,
+            "total_chunks": 0,
+            "reused_chunks": 0,
+            "embedded_chunks": 0,
+            "deleted_chunks": 0,
+            "batches": 0
+        }
+        
         try:
-            # Split content into chunks
-            chunks = self._chunk_text(content)
-            
-            # Generate embeddings
-            embeddings = self.embedding_model.encode(chunks).tolist()
-            
-            # Prepare metadata for each chunk
-            chunk_metadata = []
-            chunk_ids = []
-            
-            for i, chunk in enumerate(chunks):
-                chunk_metadata.append({
-                    "document_id": document_id,
-                    "chunk_index": i,
-                    "chunk_length": len(chunk),
-                    **metadata
-                })
-                chunk_ids.append(f"doc_{document_id}_chunk_{i}")
-            
-            # Add to collection
-            self.collection.add(
-                embeddings=embeddings,
-                documents=chunks,
-                metadatas=chunk_metadata,
-                ids=chunk_ids
-            )
+            existing = self.collection.get(where={"document_id": document_id}, include=[])
+            existing_ids = set(existing['ids'])
+            seen_ids = set()
+            occurrences = {}
             
-            return True
+            if chunks is None:
+                chunks = iter_text_chunks(content)
+            
+            async for batch in self._aiter_batches(chunks, settings.index_batch_size):
+                chunk_ids = []
+                chunk_hashes = []
+                chunk_metadata = []
+                
+                for chunk in batch:
+                    # Content-addressed IDs; repeated chunks get an occurrence suffix
+                    chunk_hash = generate_document_hash(chunk.text)
+                    occurrence = occurrences.get(chunk_hash, 0)
+                    occurrences[chunk_hash] = occurrence + 1
+                    
+                    chunk_ids.append(
+                        f"doc_{document_id}_{chunk_hash}" + (f"_{occurrence}" if occurrence else "")
+                    )
+                    chunk_hashes.append(chunk_hash)
+                    chunk_metadata.append(self._build_chunk_metadata(
+                        document_id, chunk, chunk_hash, metadata
+                    ))
+                
+                seen_ids.update(chunk_ids)
+                embedded = await self._write_chunk_batch(
+                    [chunk.text for chunk in batch],
+                    chunk_ids,
+                    chunk_hashes,
+                    chunk_metadata,
+                    existing_ids
+                )
+                
+                for chunk_id, chunk in zip(chunk_ids, batch):
+                    if chunk_id not in existing_ids or chunk_id not in self.lexical_index:
+                        self.lexical_index.add(document_id, chunk_id, chunk.text)
+                
+                if chunk_sink is not None:
+                    chunk_sink([
+                        {"id": chunk_id, "chunk": chunk, "metadata": chunk_meta}
+                        for chunk_id, chunk, chunk_meta in zip(chunk_ids, batch, chunk_metadata)
+                    ])
+                
+                report["total_chunks"] += len(batch)
+                report["embedded_chunks"] += embedded
+                report["batches"] += 1
+            
+            orphaned = list(existing_ids - seen_ids)
+            if orphaned:
+                self.collection.delete(ids=orphaned)
+            self.lexical_index.remove(orphaned)
+            self.lexical_index.persist_document(document_id)
+            
+            report.update({
+                "success": True,
+                "reused_chunks": report["total_chunks"] - report["embedded_chunks"],
+                "deleted_chunks": len(orphaned)
+            })
+            return report
             
         except Exception as e:
             print(f"Error indexing document {document_id}: {str(e)}")
-            return False
+            report["error"] = str(e)
+            return report
+        
+        finally:
+            retrieval_cache.invalidate_document(document_id)
+            response_cache.invalidate_document(document_id)
+    
+    @staticmethod
+    def _build_chunk_metadata(
+        document_id: int,
+        chunk: TextChunk,
+        chunk_hash: str,
+        metadata: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Build Chroma metadata for a chunk (Chroma rejects ``None`` values)."""
+        chunk_metadata = {
+            "document_id": document_id,
+            "chunk_index": chunk.index,
+            "chunk_length": len(chunk.text),
+            "chunk_hash": chunk_hash,
+            "chunk_type": chunk.chunk_type,
+            **metadata
+        }
+        optional_fields = {
+            "char_start": chunk.start,
+            "char_end": chunk.end,
+            "page_number": chunk.page_number,
+            "section": chunk.section
+        }
+        chunk_metadata.update({k: v for k, v in optional_fields.items() if v is not None})
+        return chunk_metadata
+    
+    async def _write_chunk_batch(
+        self,
+        texts: List[str],
+        chunk_ids: List[str],
+        chunk_hashes: List[str],
+        chunk_metadata: List[Dict[str, Any]],
+        existing_ids: set
+    ) -> int:
+        """Write one batch of chunks and return how many had to be embedded."""
+        kept = [i for i, chunk_id in enumerate(chunk_ids) if chunk_id in existing_ids]
+        new = [i for i, chunk_id in enumerate(chunk_ids) if chunk_id not in existing_ids]
+        
+        # Kept chunks only need positions/metadata refreshed
+        if kept:
+            self.collection.update(
+                ids=[chunk_ids[i] for i in kept],
+                metadatas=[chunk_metadata[i] for i in kept]
+            )
+        
+        if not new:
+            return 0
+        
+        embeddings = self._lookup_embeddings_by_hash(
+            [chunk_hashes[i] for i in new], chunk_metadata[new[0]]
+        )
+        to_embed = [i for i in new if chunk_hashes[i] not in embeddings]
+        
+        if to_embed:
+            loop = asyncio.get_running_loop()
+            vectors = await loop.run_in_executor(
+                None, self._encode_texts, [texts[i] for i in to_embed]
+            )
+            for i, vector in zip(to_embed, vectors):
+                embeddings[chunk_hashes[i]] = vector
+        
+        self.collection.upsert(
+            embeddings=[embeddings[chunk_hashes[i]] for i in new],
+            documents=[texts[i] for i in new],
+            metadatas=[chunk_metadata[i] for i in new],
+            ids=[chunk_ids[i] for i in new]
+        )
+        return len(to_embed)
+    
+    def _encode_texts(self, texts: List[str]) -> List[List[float]]:
+        """Encode chunk texts synchronously (run in a worker thread)."""
+        return self.embedding_model.encode(texts).tolist()
+    
+    @staticmethod
+    def _iter_batches(items: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+        """Group an iterable into lists of at most ``batch_size`` items."""
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
+    @classmethod
+    async def _aiter_batches(
+        cls,
+        items: Union[Iterable[Any], AsyncIterable[Any]],
+        batch_size: int
+    ) -> AsyncIterator[List[Any]]:
+        """``_iter_batches`` that also accepts async iterables."""
+        if not hasattr(items, "__aiter__"):
+            for batch in cls._iter_batches(items, batch_size):
+                yield batch
+            return
+        batch = []
+        async for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
+    def _lookup_embeddings_by_hash(
+        self,
+        chunk_hashes: List[str],
+        metadata: Dict[str, Any]
+    ) -> Dict[str, List[float]]:
+        """Return stored embeddings for any of ``chunk_hashes`` already indexed.
+        
+        Only the shard the chunks (described by ``metadata``) are written to
+        is searched.
+        """
+        if not chunk_hashes:
+            return {}
+        
+        found = self.collection.get_in_shard(
+            metadata["document_id"],
+            metadata,
+            where={"chunk_hash": {"$in": list(set(chunk_hashes))}},
+            include=["embeddings", "metadatas"]
+        )
+        
+        embeddings = {}
+        for metadata, embedding in zip(found['metadatas'] or [], found['embeddings'] or []):
+            chunk_hash = metadata.get("chunk_hash")
+            if chunk_hash and chunk_hash not in embeddings:
+                embeddings[chunk_hash] = list(embedding)
+        return embeddings
     
     async def retrieve_context(
         self, 
@@ -74,9 +290,36 @@ class RAGService:
         top_k: int = 5
     ) -> str:
         """Retrieve relevant context for a query."""
+        if settings.retrieval_mode == "hybrid":
+            result = await self.retrieve_hybrid(query, document_id=document_id, top_k=top_k)
+        else:
+            result = await self.retrieve_with_citations(query, document_id=document_id, top_k=top_k)
+        return result["context"]
+    
+    async def retrieve_with_citations(
+        self, 
+        query: str, 
+        document_id: Optional[int] = None,
+        top_k: int = 5,
+        rerank: Optional[bool] = None
+    ) -> Dict[str, Any]:
+        """Retrieve context with detailed citation information.
+        
+        With ``rerank`` (default ``settings.rerank_enabled``) the query
+        over-fetches ``settings.rerank_candidates`` chunks and a
+        cross-encoder picks the final ``top_k``; if it exceeds its latency
+        budget the vector order is kept.
+        """
+        rerank = settings.rerank_enabled if rerank is None else rerank
+        cache_key = retrieval_cache.make_key(query, document_id or None, top_k, "rerank" if rerank else "vector")
+        cached = retrieval_cache.get_result(cache_key)
+        if cached is not None:
+            cached["query"] = query
+            return cached
+        
         try:
             # Generate query embedding
-            query_embedding = self.embedding_model.encode([query]).tolist()
+            query_embedding = await self._embed_query(query)
             
             # Build where clause for filtering
             where_clause = {}
@@ -86,89 +329,117 @@ class RAGService:
             # Query collection
             results = self.collection.query(
                 query_embeddings=query_embedding,
-                n_results=top_k,
+                n_results=max(top_k, settings.rerank_candidates) if rerank else top_k,
                 where=where_clause if where_clause else None
             )
             
-            # Format context
-            context_parts = []
-            citations = []
+            rows = [
+                (doc, metadata, 1 - distance, {})
+                for doc, metadata, distance in zip(
+                    results['documents'][0],
+                    results['metadatas'][0],
+                    results['distances'][0]
+                )
+            ]
             
-            for i, (doc, metadata, distance) in enumerate(zip(
-                results['documents'][0],
-                results['metadatas'][0],
-                results['distances'][0]
-            )):
-                context_parts.append(f"[Context {i+1}]: {doc}")
-                citations.append({
-                    "document_id": metadata.get("document_id"),
-                    "chunk_index": metadata.get("chunk_index"),
-                    "relevance_score": 1 - distance,
-                    "source": f"Document {metadata.get('document_id')}, Chunk {metadata.get('chunk_index')}"
-                })
+            if not rerank:
+                result = self._format_results(query, rows)
+                retrieval_cache.set_result(cache_key, result)
+                return result
             
-            context = "\n\n".join(context_parts)
+            ranking = await get_reranker().rerank(query, [row[0] for row in rows], top_k)
+            scores = ranking["scores"] or [None] * len(ranking["order"])
+            result = self._format_results(query, [
+                (rows[i][0], rows[i][1], rows[i][2] if score is None else score, {"vector_rank": i + 1})
+                for i, score in zip(ranking["order"], scores)
+            ])
+            result["rerank"] = {
+                "reranked": ranking["reranked"],
+                "timed_out": ranking["timed_out"],
+                "candidates": len(rows),
+                "elapsed_ms": ranking["elapsed_ms"]
+            }
+            # Fallback results are not cached so a later call can still rerank
+            if ranking["reranked"]:
+                retrieval_cache.set_result(cache_key, result)
             
-            return context
+            return result
             
         except Exception as e:
-            print(f"Error retrieving context: {str(e)}")
-            return ""
+            print(f"Error retrieving context with citations: {str(e)}")
+            return {
+                "context": "",
+                "citations": [],
+                "total_results": 0,
+                "query": query
+            }
     
-    async def retrieve_with_citations(
-        self, 
-        query: str, 
+    async def retrieve_hybrid(
+        self,
+        query: str,
         document_id: Optional[int] = None,
-        top_k: int = 5
+        top_k: int = 5,
+        candidate_k: Optional[int] = None
     ) -> Dict[str, Any]:
-        """Retrieve context with detailed citation information."""
+        """Retrieve context by fusing BM25 and vector rankings (reciprocal rank fusion).
+        
+        Exact tokens such as "EBITDA", "Q3 2024" or a ticker are matched by
+        the lexical ranking even when the embedding misses them.
+        """
+        candidate_k = candidate_k or top_k * settings.hybrid_candidate_multiplier
+        cache_key = retrieval_cache.make_key(query, document_id or None, top_k, "hybrid", candidate_k)
+        cached = retrieval_cache.get_result(cache_key)
+        if cached is not None:
+            cached["query"] = query
+            return cached
+        
         try:
-            # Generate query embedding
-            query_embedding = self.embedding_model.encode([query]).tolist()
+            query_embedding = await self._embed_query(query)
+            where_clause = {"document_id": document_id} if document_id else None
             
-            # Build where clause for filtering
-            where_clause = {}
-            if document_id:
-                where_clause["document_id"] = document_id
-            
-            # Query collection
-            results = self.collection.query(
+            dense = self.collection.query(
                 query_embeddings=query_embedding,
-                n_results=top_k,
-                where=where_clause if where_clause else None
+                n_results=candidate_k,
+                where=where_clause
+            )
+            lexical = self.lexical_index.search(
+                query,
+                top_k=candidate_k,
+                document_ids=[document_id] if document_id else None
             )
             
-            # Format results
-            context_parts = []
-            citations = []
+            dense_ids = dense['ids'][0]
+            lexical_ids = [chunk_id for chunk_id, _ in lexical]
+            fused = reciprocal_rank_fusion([dense_ids, lexical_ids], k=settings.hybrid_rrf_k)[:top_k]
             
-            for i, (doc, metadata, distance) in enumerate(zip(
-                results['documents'][0],
-                results['metadatas'][0],
-                results['distances'][0]
-            )):
-                relevance_score = 1 - distance
-                
-                context_parts.append(f"[Context {i+1}]: {doc}")
-                citations.append({
-                    "document_id": metadata.get("document_id"),
-                    "chunk_index": metadata.get("chunk_index"),
-                    "relevance_score": relevance_score,
-                    "source": f"Document {metadata.get('document_id')}, Chunk {metadata.get('chunk_index')}",
-                    "content": doc[:200] + "..." if len(doc) > 200 else doc
-                })
+            # Fetch text for lexical-only hits
+            rows = {
+                chunk_id: (doc, metadata)
+                for chunk_id, doc, metadata in zip(dense_ids, dense['documents'][0], dense['metadatas'][0])
+            }
+            missing = [chunk_id for chunk_id, _ in fused if chunk_id not in rows]
+            if missing:
+                fetched = self.collection.get(ids=missing, include=["documents", "metadatas"])
+                for chunk_id, doc, metadata in zip(fetched['ids'], fetched['documents'], fetched['metadatas']):
+                    rows[chunk_id] = (doc, metadata)
             
-            context = "\n\n".join(context_parts)
+            dense_rank = {chunk_id: rank for rank, chunk_id in enumerate(dense_ids, start=1)}
+            lexical_rank = {chunk_id: rank for rank, chunk_id in enumerate(lexical_ids, start=1)}
             
-            return {
-                "context": context,
-                "citations": citations,
-                "total_results": len(results['documents'][0]),
-                "query": query
-            }
+            result = self._format_results(query, [
+                (*rows[chunk_id], score, {
+                    "dense_rank": dense_rank.get(chunk_id),
+                    "lexical_rank": lexical_rank.get(chunk_id)
+                })
+                for chunk_id, score in fused if chunk_id in rows
+            ])
+            result["retrieval_mode"] = "hybrid"
+            retrieval_cache.set_result(cache_key, result)
+            
+            return result
             
         except Exception as e:
-            print(f"Error retrieving context with citations: {str(e)}")
+            print(f"Error retrieving hybrid context: {str(e)}")
             return {
                 "context": "",
                 "citations": [],
@@ -176,43 +447,47 @@ class RAGService:
                 "query": query
             }
     
-    def _chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-        """Split text into overlapping chunks."""
-        if len(text) <= chunk_size:
-            return [text]
-        
-        chunks = []
-        start = 0
+    def _format_results(
+        self,
+        query: str,
+        rows: List[Tuple[str, Dict[str, Any], float, Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """Format (document, metadata, relevance, extra) rows into context and citations."""
+        context_parts = []
+        citations = []
         
-        while start < len(text):
-            end = start + chunk_size
-            
-            # Try to break at sentence boundary
-            if end < len(text):
-                # Look for sentence endings
-                sentence_end = text.rfind('.', start, end)
-                if sentence_end > start + chunk_size // 2:
-                    end = sentence_end + 1
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            start = end - overlap
-            if start >= len(text):
-                break
+        for i, (doc, metadata, relevance_score, extra) in enumerate(rows):
+            context_parts.append(f"[Context {i+1}]: {doc}")
+            citations.append({
+                "document_id": metadata.get("document_id"),
+                "chunk_index": metadata.get("chunk_index"),
+                "relevance_score": relevance_score,
+                "source": f"Document {metadata.get('document_id')}, Chunk {metadata.get('chunk_index')}",
+                "content": doc[:200] + "..." if len(doc) > 200 else doc,
+                **extra
+            })
         
-        return chunks
+        return {
+            "context": "\n\n".join(context_parts),
+            "citations": citations,
+            "total_results": len(rows),
+            "query": query
+        }
+    
+    def _chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
+        """Split text into overlapping chunks."""
+        return chunk_text(text, chunk_size, overlap)
     
     async def search_similar_documents(
         self, 
         query: str, 
-        top_k: int = 10
+        top_k: int = 10,
+        max_chunks_per_document: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """Search for similar documents across all indexed content."""
         try:
             # Generate query embedding
-            query_embedding = self.embedding_model.encode([query]).tolist()
+            query_embedding = await self._embed_query(query)
             
             # Query collection
             results = self.collection.query(
@@ -220,48 +495,170 @@ class RAGService:
                 n_results=top_k
             )
             
-            # Group by document
-            document_scores = {}
-            for doc, metadata, distance in zip(
+            return self._group_by_document(
                 results['documents'][0],
                 results['metadatas'][0],
-                results['distances'][0]
-            ):
-                doc_id = metadata.get("document_id")
-                relevance_score = 1 - distance
-                
-                if doc_id not in document_scores:
-                    document_scores[doc_id] = {
-                        "document_id": doc_id,
-                        "max_relevance": relevance_score,
-                        "chunks": [],
-                        "total_chunks": 0
-                    }
-                
-                document_scores[doc_id]["chunks"].append({
-                    "content": doc,
-                    "relevance_score": relevance_score,
-                    "chunk_index": metadata.get("chunk_index")
-                })
-                document_scores[doc_id]["total_chunks"] += 1
-                document_scores[doc_id]["max_relevance"] = max(
-                    document_scores[doc_id]["max_relevance"], 
-                    relevance_score
-                )
-            
-            # Sort by relevance
-            similar_docs = sorted(
-                document_scores.values(),
-                key=lambda x: x["max_relevance"],
-                reverse=True
+                results['distances'][0],
+                max_chunks_per_document
             )
             
-            return similar_docs
-            
         except Exception as e:
             print(f"Error searching similar documents: {str(e)}")
             return []
     
+    async def retrieve_bulk(
+        self,
+        queries: List[str],
+        document_ids: Optional[List[int]] = None,
+        max_chunks_per_document: Optional[int] = None,
+        top_documents: Optional[int] = None,
+        candidate_k: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Answer several queries over several documents with one collection query.
+        
+        All query embeddings go to Chroma in a single batched call, filtered
+        to ``document_ids``; each query's hits are then grouped per document
+        and capped at ``max_chunks_per_document`` so one document with many
+        near-duplicate chunks cannot crowd out the others. When that call
+        comes back full and an explicitly requested document got fewer than
+        ``max_chunks_per_document`` hits, the document is topped up with its
+        own filtered query, so every requested document gets its share.
+        """
+        max_chunks_per_document = max_chunks_per_document or settings.bulk_max_chunks_per_document
+        document_ids = list(dict.fromkeys(document_ids or []))
+        candidate_k = candidate_k or (
+            max_chunks_per_document
+            * max(len(document_ids), top_documents or 1)
+            * settings.bulk_candidate_multiplier
+        )
+        
+        try:
+            # Concurrent embeds are coalesced into one batch by the embedder
+            embeddings = await asyncio.gather(*(self._embed_query(query) for query in queries))
+            
+            where_clause = None
+            if len(document_ids) == 1:
+                where_clause = {"document_id": document_ids[0]}
+            elif document_ids:
+                where_clause = {"document_id": {"$in": document_ids}}
+            
+            results = self.collection.query(
+                query_embeddings=[embedding[0] for embedding in embeddings],
+                n_results=candidate_k,
+                where=where_clause
+            )
+            
+            hits = [
+                list(zip(results['ids'][i], results['documents'][i], results['metadatas'][i], results['distances'][i]))
+                for i in range(len(queries))
+            ]
+            if len(document_ids) > 1:
+                self._top_up_documents(hits, embeddings, document_ids, max_chunks_per_document, candidate_k)
+            
+            per_query = []
+            for i, query in enumerate(queries):
+                rows = sorted(hits[i], key=lambda row: row[3])
+                documents = self._group_by_document(
+                    [row[1] for row in rows],
+                    [row[2] for row in rows],
+                    [row[3] for row in rows],
+                    max_chunks_per_document
+                )
+                per_query.append({
+                    "query": query,
+                    "documents": documents[:top_documents] if top_documents else documents
+                })
+            
+            return {
+                "results": per_query,
+                "total_queries": len(queries),
+                "document_ids": document_ids
+            }
+            
+        except Exception as e:
+            print(f"Error in bulk retrieval: {str(e)}")
+            return {
+                "results": [{"query": query, "documents": []} for query in queries],
+                "total_queries": len(queries),
+                "document_ids": document_ids
+            }
+    
+    def _top_up_documents(
+        self,
+        hits: List[List[Tuple[str, str, Dict[str, Any], float]]],
+        embeddings: List[List[List[float]]],
+        document_ids: List[int],
+        max_chunks_per_document: int,
+        candidate_k: int
+    ) -> None:
+        """Add per-document hits for documents crowded out of a full batched query.
+        
+        A query whose batched result is shorter than ``candidate_k`` already
+        saw every matching chunk and needs no top-up. Otherwise each short
+        document gets one filtered query covering all queries that need it.
+        """
+        needs: Dict[int, List[int]] = {}
+        for i, rows in enumerate(hits):
+            if len(rows) < candidate_k:
+                continue
+            counts: Dict[Any, int] = {}
+            for _, _, metadata, _ in rows:
+                counts[metadata.get("document_id")] = counts.get(metadata.get("document_id"), 0) + 1
+            for document_id in document_ids:
+                if counts.get(document_id, 0) < max_chunks_per_document:
+                    needs.setdefault(document_id, []).append(i)
+        
+        for document_id, query_indices in needs.items():
+            extra = self.collection.query(
+                query_embeddings=[embeddings[i][0] for i in query_indices],
+                n_results=max_chunks_per_document,
+                where={"document_id": document_id}
+            )
+            for row, i in enumerate(query_indices):
+                seen = {row_id for row_id, _, _, _ in hits[i]}
+                hits[i].extend(
+                    hit for hit in zip(extra['ids'][row], extra['documents'][row], extra['metadatas'][row], extra['distances'][row])
+                    if hit[0] not in seen
+                )
+    
+    @staticmethod
+    def _group_by_document(
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        distances: List[float],
+        max_chunks_per_document: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Group ranked hits by document, keeping at most N chunks per document."""
+        document_scores = {}
+        for doc, metadata, distance in zip(documents, metadatas, distances):
+            doc_id = metadata.get("document_id")
+            relevance_score = 1 - distance
+            
+            if doc_id not in document_scores:
+                document_scores[doc_id] = {
+                    "document_id": doc_id,
+                    "max_relevance": relevance_score,
+                    "chunks": [],
+                    "total_chunks": 0
+                }
+            
+            entry = document_scores[doc_id]
+            entry["total_chunks"] += 1
+            entry["max_relevance"] = max(entry["max_relevance"], relevance_score)
+            if max_chunks_per_document is None or len(entry["chunks"]) < max_chunks_per_document:
+                entry["chunks"].append({
+                    "content": doc,
+                    "relevance_score": relevance_score,
+                    "chunk_index": metadata.get("chunk_index")
+                })
+        
+        # Sort by relevance
+        return sorted(
+            document_scores.values(),
+            key=lambda x: x["max_relevance"],
+            reverse=True
+        )
+    
     async def delete_document(self, document_id: int) -> bool:
         """Delete all chunks for a document."""
         try:
@@ -273,12 +670,17 @@ class RAGService:
             if results['ids']:
                 # Delete chunks
                 self.collection.delete(ids=results['ids'])
+            self.lexical_index.remove_document(document_id)
             
             return True
             
         except Exception as e:
             print(f"Error deleting document {document_id}: {str(e)}")
             return False
+        
+        finally:
+            retrieval_cache.invalidate_document(document_id)
+            response_cache.invalidate_document(document_id)
     
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get statistics about the document collection."""
@@ -287,7 +689,8 @@ class RAGService:
             return {
                 "total_chunks": count,
                 "collection_name": self.collection.name,
-                "embedding_model": settings.embedding_model
+                "embedding_model": settings.embedding_model,
+                "vector_store": self.collection.get_stats()
             }
         except Exception as e:
             return {
@@ -0,0 +1,200 @@
+"""
+Cross-encoder reranking of retrieved chunks under a latency budget.
+"""
+from typing import Dict, Any, List, Optional, Set
+from concurrent.futures import ThreadPoolExecutor, Future
+import asyncio
+import logging
+import time
+
+from app.config import settings
+from app.services.embedding_registry import embedding_registry
+
+try:
+    from sentence_transformers import CrossEncoder
+except Exception:
+    CrossEncoder = None
+
+
+def _load_cross_encoder(model_name: str):
+    """Registry loader for cross-encoder models."""
+    if CrossEncoder is None:
+        raise ImportError("sentence-transformers is not installed")
+    return CrossEncoder(model_name)
+
+
+class CrossEncoderReranker:
+    """Score (query, passage) pairs with a cross-encoder and reorder candidates.
+
+    Scoring runs batch by batch in a thread pool so the event loop stays
+    free. Each request gets a latency budget; if it runs out before every
+    candidate is scored the caller gets the original vector order back.
+    A batch that is already running cannot be interrupted, so while the
+    pool is still busy with batches abandoned by earlier requests new
+    requests fall back immediately instead of queueing behind them.
+    """
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        budget_ms: Optional[float] = None,
+        num_workers: Optional[int] = None,
+        scorer: Any = None
+    ):
+        """Initialize reranker; the model is loaded on first use."""
+        self.logger = logging.getLogger(__name__)
+        self.model_name = model_name or settings.reranker_model
+        self.batch_size = batch_size or settings.rerank_batch_size
+        self.budget_ms = settings.rerank_budget_ms if budget_ms is None else budget_ms
+        self._scorer = scorer
+        self.num_workers = num_workers or settings.rerank_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.num_workers,
+            thread_name_prefix="reranker"
+        )
+        self._in_flight: Set[Future] = set()
+
+        self._stats = {
+            "requests": 0,
+            "reranked": 0,
+            "timeouts": 0,
+            "busy": 0,
+            "errors": 0,
+            "pairs_scored": 0,
+            "batches": 0,
+            "total_time_ms": 0.0,
+            "max_time_ms": 0.0,
+        }
+
+    def _get_scorer(self):
+        if self._scorer is None:
+            self._scorer = embedding_registry.get_model(self.model_name, loader=_load_cross_encoder)
+        return self._scorer
+
+    def _score_batch(self, query: str, passages: List[str]) -> List[float]:
+        """Score one batch of passages (runs in the thread pool)."""
+        scores = self._get_scorer().predict(
+            [(query, passage) for passage in passages],
+            batch_size=len(passages),
+            show_progress_bar=False
+        )
+        return [float(score) for score in scores]
+
+    async def rerank(
+        self,
+        query: str,
+        passages: List[str],
+        top_k: int,
+        budget_ms: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Return the top ``top_k`` candidate positions, best first.
+
+        The result holds ``order`` (indices into ``passages``), ``scores``
+        (cross-encoder scores aligned with ``order``, or ``None`` on
+        fallback), ``reranked``, ``timed_out`` and ``elapsed_ms``.
+        """
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        loop = asyncio.get_running_loop()
+        start_time = time.perf_counter()
+        deadline = loop.time() + budget_ms / 1000
+        scores: List[float] = []
+        timed_out = False
+        busy = False
+        error = None
+
+        try:
+            for offset in range(0, len(passages), self.batch_size):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                if offset == 0 and len(self._in_flight) >= self.num_workers:
+                    busy = True
+                    break
+                batch = passages[offset:offset + self.batch_size]
+                scores.extend(await asyncio.wait_for(
+                    asyncio.wrap_future(self._submit(query, batch)),
+                    timeout=remaining
+                ))
+                self._stats["batches"] += 1
+        except asyncio.TimeoutError:
+            timed_out = True
+        except Exception as e:
+            error = str(e)
+            self.logger.warning(f"Reranking failed, keeping vector order: {error}")
+
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        self._stats["requests"] += 1
+        self._stats["pairs_scored"] += len(scores)
+        self._stats["total_time_ms"] += elapsed_ms
+        self._stats["max_time_ms"] = max(self._stats["max_time_ms"], elapsed_ms)
+
+        if timed_out or busy or error is not None:
+            self._stats["timeouts" if timed_out else "busy" if busy else "errors"] += 1
+            return {
+                "order": list(range(min(top_k, len(passages)))),
+                "scores": None,
+                "reranked": False,
+                "timed_out": timed_out,
+                "elapsed_ms": elapsed_ms,
+            }
+
+        self._stats["reranked"] += 1
+        order = sorted(range(len(passages)), key=lambda i: scores[i], reverse=True)[:top_k]
+        return {
+            "order": order,
+            "scores": [scores[i] for i in order],
+            "reranked": True,
+            "timed_out": False,
+            "elapsed_ms": elapsed_ms,
+        }
+
+    def _submit(self, query: str, batch: List[str]) -> Future:
+        """Queue a batch, tracking it until it finishes even if the caller gives up.
+
+        Cancelling the awaiting task cancels a batch still waiting in the
+        queue; one already running is left to finish and stays in flight.
+        """
+        future = self._executor.submit(self._score_batch, query, batch)
+        self._in_flight.add(future)
+        future.add_done_callback(self._in_flight.discard)
+        return future
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return rerank counters and latency."""
+        requests = self._stats["requests"]
+        return {
+            "model": self.model_name,
+            "budget_ms": self.budget_ms,
+            **self._stats,
+            "in_flight_batches": len(self._in_flight),
+            "avg_time_ms": self._stats["total_time_ms"] / requests if requests else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        """Shut the scoring thread pool down."""
+        self._executor.shutdown(wait=False)
+
+
+_reranker: Optional[CrossEncoderReranker] = None
+
+
+def get_reranker() -> CrossEncoderReranker:
+    """Return the process-wide reranker."""
+    global _reranker
+    if _reranker is None:
+        _reranker = CrossEncoderReranker()
+    return _reranker
+
+
+def get_reranker_stats() -> Optional[Dict[str, Any]]:
+    """Return reranker stats, or ``None`` if reranking has not been used."""
+    return _reranker.get_stats() if _reranker is not None else None
+
+
+def shutdown_reranker() -> None:
+    """Stop the process-wide reranker's thread pool."""
+    global _reranker
+    if _reranker is not None:
+        _reranker.shutdown()
+        _reranker = None
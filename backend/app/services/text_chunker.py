@@ -0,0 +1,236 @@
+"""
+Streaming text chunkers for the RAG index.
+"""
+from typing import Iterable, Iterator, List, Union, Optional, Dict, Any, Tuple
+from dataclasses import dataclass
+from itertools import groupby
+
+import pandas as pd
+
+
+SECTION_MAX_LENGTH = 100  # DocumentChunk.section column width
+
+
+@dataclass
+class TextChunk:
+    """A chunk of document text with its offsets and structural position."""
+    index: int
+    text: str
+    start: Optional[int] = None
+    end: Optional[int] = None
+    chunk_type: str = "text"  # 'text', 'table'
+    page_number: Optional[int] = None
+    section: Optional[str] = None
+
+
+def iter_text_chunks(
+    source: Union[str, Iterable[str]],
+    chunk_size: int = 1000,
+    overlap: int = 200
+) -> Iterator[TextChunk]:
+    """Yield overlapping chunks lazily, preferring sentence boundaries.
+
+    ``source`` may be a single string or any iterable of text segments
+    (e.g. pages); segments are concatenated on the fly and only a window
+    of roughly ``chunk_size`` characters plus one segment is ever held in
+    memory.
+    """
+    # A single string is already resident; only trim buffers built from segments
+    trim_buffer = not isinstance(source, str)
+    segments = iter([source] if isinstance(source, str) else source)
+    buffer = ""
+    buffer_start = 0  # absolute offset of buffer[0]
+    exhausted = False
+    start = 0
+    index = 0
+
+    while True:
+        # Make sure we can tell whether start + chunk_size is inside the text
+        while not exhausted and buffer_start + len(buffer) <= start + chunk_size:
+            segment = next(segments, None)
+            if segment is None:
+                exhausted = True
+            else:
+                buffer += segment
+
+        text_length = buffer_start + len(buffer)
+        if start >= text_length:
+            break
+
+        end = start + chunk_size
+        at_end = end >= text_length
+        if not at_end:
+            # Try to break at sentence boundary
+            sentence_end = buffer.rfind('.', start - buffer_start, end - buffer_start)
+            if sentence_end != -1 and sentence_end + buffer_start > start + chunk_size // 2:
+                end = sentence_end + buffer_start + 1
+        else:
+            end = text_length
+
+        chunk = buffer[start - buffer_start:end - buffer_start].strip()
+        if chunk:
+            yield TextChunk(index=index, text=chunk, start=start, end=end)
+            index += 1
+
+        if at_end:
+            break
+
+        start = max(end - overlap, start + 1)
+
+        # Drop text that no future chunk can reach
+        if trim_buffer:
+            buffer = buffer[start - buffer_start:]
+            buffer_start = start
+
+
+def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
+    """Split text into overlapping chunks (eager wrapper over the generator)."""
+    return [chunk.text for chunk in iter_text_chunks(text, chunk_size, overlap)]
+
+
+def format_table_rows(df: pd.DataFrame) -> List[str]:
+    """Render a table as pipe-separated rows, header first."""
+    def clean(value: Any) -> str:
+        if value is None or (isinstance(value, float) and pd.isna(value)):
+            return ""
+        return " ".join(str(value).split())
+
+    rows = [" | ".join(clean(col) for col in df.columns)]
+    for row in df.itertuples(index=False):
+        cells = [clean(value) for value in row]
+        if any(cells):
+            rows.append(" | ".join(cells))
+    return rows
+
+
+def iter_table_chunks(
+    df: pd.DataFrame,
+    max_chunk_size: int = 1000,
+    title: Optional[str] = None
+) -> Iterator[str]:
+    """Yield table text split on row boundaries, repeating the header row."""
+    rows = format_table_rows(df)
+    header = rows[0]
+    prefix = f"{title}\n{header}" if title else header
+
+    current: List[str] = []
+    size = len(prefix)
+    for row in rows[1:]:
+        if current and size + len(row) + 1 > max_chunk_size:
+            yield "\n".join([prefix] + current)
+            current, size = [], len(prefix)
+        current.append(row)
+        size += len(row) + 1
+
+    if current:
+        yield "\n".join([prefix] + current)
+
+
+def iter_structured_chunks(
+    text_blocks: Iterable[Any],
+    tables: Iterable[Any] = (),
+    max_chunk_size: int = 1000,
+    overlap: int = 200
+) -> Iterator[TextChunk]:
+    """Yield section- and table-aligned chunks from parsed PDF structure.
+
+    ``text_blocks`` are ``TextBlock``-like objects (``text``, ``block_type``,
+    ``page_number``) in reading order and ``tables`` are ``FinancialTable``-like
+    objects (``data``, ``page_number``). Headings start a new section and
+    are carried into the chunk metadata; runs of ``table_data`` blocks and
+    extracted tables are kept whole or split only between rows; paragraphs
+    are packed up to ``max_chunk_size`` without crossing a section or page.
+    """
+    tables_by_page: Dict[int, List[Any]] = {}
+    for table in tables:
+        tables_by_page.setdefault(table.page_number, []).append(table)
+
+    def pages() -> Iterator[Tuple[Any, Iterable[Any], List[Any]]]:
+        for page_number, blocks in groupby(text_blocks, key=lambda block: block.page_number):
+            yield page_number, blocks, tables_by_page.pop(page_number, [])
+        # Tables on pages without any text
+        for page_number in sorted(tables_by_page):
+            yield page_number, (), tables_by_page.pop(page_number)
+
+    yield from iter_page_chunks(pages(), max_chunk_size, overlap)
+
+
+def iter_page_chunks(
+    pages: Iterable[Tuple[Any, Iterable[Any], Iterable[Any]]],
+    max_chunk_size: int = 1000,
+    overlap: int = 200
+) -> Iterator[TextChunk]:
+    """Yield structured chunks from ``(page_number, text_blocks, tables)`` pages.
+
+    Same rules as ``iter_structured_chunks``, but pages are consumed one
+    at a time, so chunks for a page are available as soon as that page
+    has been parsed. The current section carries across pages.
+    """
+    index = 0
+    section: Optional[str] = None
+    page: Optional[int] = None
+    buffer: List[str] = []
+    buffer_type = "text"
+    heading_only = False
+
+    def make_chunk(text: str, chunk_type: str, page_number: Optional[int]) -> TextChunk:
+        nonlocal index
+        chunk = TextChunk(
+            index=index,
+            text=text,
+            chunk_type=chunk_type,
+            page_number=page_number,
+            section=section
+        )
+        index += 1
+        return chunk
+
+    def flush() -> Iterator[TextChunk]:
+        nonlocal buffer
+        if not buffer:
+            return
+        joined = "\n".join(buffer)
+        buffer = []
+        if buffer_type == "table" or len(joined) <= max_chunk_size:
+            yield make_chunk(joined, buffer_type, page)
+        else:
+            # Oversized single paragraph: fall back to sentence-aware splitting
+            for piece in iter_text_chunks(joined, max_chunk_size, overlap):
+                yield make_chunk(piece.text, "text", page)
+
+    def table_chunks(page_tables: Iterable[Any], page_number: Optional[int]) -> Iterator[TextChunk]:
+        for table in page_tables:
+            if table.data is None or table.data.empty:
+                continue
+            for text in iter_table_chunks(table.data, max_chunk_size, title=section):
+                yield make_chunk(text, "table", page_number)
+
+    for page_number, text_blocks, page_tables in pages:
+        for block in text_blocks:
+            text = block.text.strip()
+            if not text:
+                continue
+            page = page_number
+
+            if block.block_type == "heading":
+                yield from flush()
+                section = text[:SECTION_MAX_LENGTH]
+                buffer_type = "text"
+                buffer.append(text)
+                heading_only = True
+                continue
+
+            block_type = "table" if block.block_type == "table_data" else "text"
+            # Keep table rows and prose apart; a heading stays with what follows it
+            if buffer and block_type != buffer_type and not heading_only:
+                yield from flush()
+            buffer_type = block_type
+
+            if buffer and not heading_only and sum(len(part) + 1 for part in buffer) + len(text) > max_chunk_size:
+                yield from flush()
+            buffer.append(text)
+            heading_only = False
+
+        # Chunks never cross a page; the page's tables follow its text
+        yield from flush()
+        yield from table_chunks(page_tables, page_number)
@@ -0,0 +1,103 @@
+"""
+Streaming upload storage for FinMDA-Bot.
+"""
+from dataclasses import dataclass
+from typing import Optional
+import hashlib
+import os
+import uuid
+
+import aiofiles
+
+from app.config import settings
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the configured size limit."""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"File exceeds limit of {max_bytes / 1024 / 1024:.0f}MB")
+        self.max_bytes = max_bytes
+
+
+@dataclass
+class StoredUpload:
+    """A fully written upload."""
+    file_path: str
+    file_size: int
+    sha256: str
+
+
+async def stream_upload(
+    upload,
+    directory: Optional[str] = None,
+    extension: str = "",
+    max_bytes: Optional[int] = None,
+    chunk_size: Optional[int] = None
+) -> StoredUpload:
+    """Copy an ``UploadFile`` to disk chunk by chunk.
+
+    The file is hashed while it is written and only ``chunk_size`` bytes
+    are held in memory. Writing goes to a temporary file in the target
+    directory which is renamed into place once complete, so a partial
+    upload never appears under its final name. Raises ``UploadTooLarge``
+    as soon as more than ``max_bytes`` have been received.
+    """
+    directory = directory or settings.upload_directory
+    max_bytes = max_bytes or settings.max_file_size_mb * 1024 * 1024
+    chunk_size = chunk_size or settings.upload_chunk_size_kb * 1024
+    os.makedirs(directory, exist_ok=True)
+
+    file_id = str(uuid.uuid4())
+    final_path = os.path.join(directory, f"{file_id}.{extension}" if extension else file_id)
+    temp_path = os.path.join(directory, f".{file_id}.part")
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(temp_path, "wb") as out:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                digest.update(chunk)
+                await out.write(chunk)
+        os.replace(temp_path, final_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return StoredUpload(file_path=final_path, file_size=size, sha256=digest.hexdigest())
+
+
+def blob_path(sha256: str, extension: str = "", directory: Optional[str] = None) -> str:
+    """Content-addressed location for a file with digest ``sha256``."""
+    directory = directory or settings.upload_directory
+    name = f"{sha256}.{extension}" if extension else sha256
+    return os.path.join(directory, "blobs", sha256[:2], name)
+
+
+def store_blob(stored: StoredUpload, extension: str = "", directory: Optional[str] = None) -> str:
+    """Move a streamed upload to its content-addressed path and return it.
+
+    Identical content maps to the same path, so every duplicate upload
+    shares one file on disk. Replacing an existing blob with its identical
+    copy (rather than discarding the copy) keeps the file present even if
+    the last other reference is being deleted concurrently.
+    """
+    path = blob_path(stored.sha256, extension, directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(stored.file_path, path)
+    return path
+
+
+def release_blob(file_path: str, remaining_references: int) -> bool:
+    """Delete a stored file once no document references it; returns whether it was removed."""
+    if remaining_references > 0 or not os.path.exists(file_path):
+        return False
+    os.remove(file_path)
+    return True
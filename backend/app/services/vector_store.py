@@ -0,0 +1,1133 @@
+"""
+Pluggable vector store backends for the RAG index.
+"""
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Tuple, Callable
+from collections import OrderedDict
+from contextlib import contextmanager
+import threading
+import hashlib
+import logging
+import sqlite3
+import json
+import os
+import re
+
+import numpy as np
+
+from app.config import settings
+from app.services.embedding_registry import (
+    embedding_registry,
+    DEFAULT_COLLECTION_NAME,
+    DEFAULT_COLLECTION_METADATA,
+)
+
+
+DEFAULT_INCLUDE = ("documents", "metadatas")
+SQLITE_MAX_VARIABLES = 900
+CHUNK_ID_DOCUMENT = re.compile(r"^doc_(\d+)_")
+
+
+def matches_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Chroma-style ``where`` filter against one metadata dict."""
+    if not where:
+        return True
+    for field, condition in where.items():
+        if field == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+            continue
+        if field == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+            continue
+
+        value = metadata.get(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if op == "$eq":
+                ok = value == operand
+            elif op == "$ne":
+                ok = value != operand
+            elif op == "$in":
+                ok = value in operand
+            elif op == "$nin":
+                ok = value not in operand
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                if value is None:
+                    return False
+                ok = {
+                    "$gt": value > operand,
+                    "$gte": value >= operand,
+                    "$lt": value < operand,
+                    "$lte": value <= operand,
+                }[op]
+            else:
+                raise ValueError(f"Unsupported where operator: {op}")
+            if not ok:
+                return False
+    return True
+
+
+class VectorStore:
+    """Interface shared by vector store backends.
+
+    It mirrors the part of the Chroma collection API that ``RAGService``
+    uses (``upsert``/``update``/``get``/``query``/``delete``/``count`` with
+    Chroma-shaped results), so call sites do not depend on the backend.
+    """
+
+    name: str = DEFAULT_COLLECTION_NAME
+    backend: str = ""
+
+    def upsert(
+        self,
+        ids: List[str],
+        embeddings: List[List[float]],
+        documents: Optional[List[str]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
+        raise NotImplementedError
+
+    def add(self, ids, embeddings, documents=None, metadatas=None) -> None:
+        self.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update(
+        self,
+        ids: List[str],
+        embeddings: Optional[List[List[float]]] = None,
+        documents: Optional[List[str]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
+        raise NotImplementedError
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def query(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        raise NotImplementedError
+
+    def get_in_shard(
+        self,
+        document_id: int,
+        metadata: Optional[Dict[str, Any]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """``get`` limited to the shard ``document_id`` is (or will be) written to."""
+        return self.get(where=where, include=include)
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return backend name and size."""
+        return {"backend": self.backend, "name": self.name, "chunks": self.count()}
+
+    def close(self) -> None:
+        """Release files or connections held by the store."""
+
+
+class ChromaVectorStore(VectorStore):
+    """Vector store backed by a (shared) Chroma collection."""
+
+    backend = "chroma"
+
+    def __init__(self, collection):
+        """Wrap an existing Chroma collection."""
+        self.collection = collection
+        self.name = collection.name
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None) -> None:
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None) -> None:
+        self.collection.update(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def get(self, ids=None, where=None, include=None) -> Dict[str, Any]:
+        kwargs = {"ids": ids, "where": where}
+        if include is not None:
+            kwargs["include"] = include
+        return self.collection.get(**kwargs)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=None) -> Dict[str, Any]:
+        kwargs = {"query_embeddings": query_embeddings, "n_results": n_results, "where": where}
+        if include is not None:
+            kwargs["include"] = include
+        return self.collection.query(**kwargs)
+
+    def delete(self, ids=None, where=None) -> None:
+        self.collection.delete(ids=ids, where=where)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+
+class NumpyVectorStore(VectorStore):
+    """Cosine-similarity index over a memory-mapped float32 matrix.
+
+    Vectors are L2-normalized and stored one row per slot in ``<name>.f32``
+    (an in-process array when ``persist_directory`` is ``None``); ids,
+    documents and metadata live in a SQLite side table, with ids and
+    metadata also kept in memory for filtering. Deleted slots are reused.
+
+    ``index_type="flat"`` scores every vector exactly. ``"ivf"`` clusters
+    vectors into ``nlist`` k-means cells once enough are stored and scores
+    only the ``nprobe`` cells nearest the query, falling back to an exact
+    scan when a filter leaves too few candidates in those cells.
+    Distances are ``1 - cosine`` so ``1 - distance`` is the similarity.
+
+    ``quantization="float16"`` or ``"int8"`` (per-vector scale) keeps a
+    compact copy of every vector that the scan runs over; the best
+    ``n_results * rerank_factor`` candidates are then re-scored against the
+    float32 rows, which stay on disk and are only paged in for those
+    candidates. With ``exact_rerank=False`` no float32 copy is kept at all.
+    """
+
+    backend = "numpy"
+    INDEXED_FIELDS = ("document_id", "chunk_hash")
+    MIN_TRAIN_PER_LIST = 39
+    KMEANS_ITERATIONS = 10
+    SCAN_BLOCK_ROWS = 65536
+
+    def __init__(
+        self,
+        name: str = DEFAULT_COLLECTION_NAME,
+        persist_directory: Optional[str] = None,
+        index_type: str = "flat",
+        nlist: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        quantization: Optional[str] = None,
+        exact_rerank: Optional[bool] = None,
+        rerank_factor: Optional[int] = None,
+        initial_capacity: int = 1024
+    ):
+        """Open (or create) the store, loading any persisted rows."""
+        if index_type not in ("flat", "ivf"):
+            raise ValueError(f"Unknown vector index type: {index_type}")
+        quantization = quantization or settings.vector_quantization
+        if quantization not in ("none", "float16", "int8"):
+            raise ValueError(f"Unknown vector quantization: {quantization}")
+
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.persist_directory = persist_directory
+        self.index_type = index_type
+        self.nlist = nlist or settings.ivf_nlist
+        self.nprobe = nprobe or settings.ivf_nprobe
+        self.quantization = quantization
+        self.exact_rerank = settings.vector_exact_rerank if exact_rerank is None else exact_rerank
+        self.rerank_factor = rerank_factor or settings.vector_rerank_factor
+        self.initial_capacity = initial_capacity
+        self._lock = threading.RLock()
+
+        self._dim: Optional[int] = None
+        self._matrices: Dict[str, np.ndarray] = {}
+        self._ids: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict[str, Any]]] = []
+        self._slots: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._live = np.zeros(0, dtype=bool)
+        self._field_index: Dict[str, Dict[Any, set]] = {field: {} for field in self.INDEXED_FIELDS}
+
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments = np.zeros(0, dtype=np.int32)
+
+        if persist_directory:
+            os.makedirs(persist_directory, exist_ok=True)
+            db_path = os.path.join(persist_directory, f"{name}.sqlite")
+        else:
+            db_path = ":memory:"
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "slot INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, document TEXT, metadata TEXT)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS store_info (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+        self._load()
+
+    # ----------------------------
+    # Storage
+    # ----------------------------
+
+    def _matrix_path(self, key: str) -> str:
+        return os.path.join(self.persist_directory, f"{self.name}.{key}")
+
+    @property
+    def _centroid_path(self) -> str:
+        return os.path.join(self.persist_directory, f"{self.name}.ivf.npy")
+
+    @property
+    def _capacity(self) -> int:
+        return next((matrix.shape[0] for matrix in self._matrices.values()), 0)
+
+    @property
+    def _scan_key(self) -> str:
+        """Matrix the similarity scan runs over."""
+        return {"none": "f32", "float16": "f16", "int8": "i8"}[self.quantization]
+
+    def _matrix_specs(self) -> Dict[str, Tuple[Any, int]]:
+        """Per-slot matrices (dtype, columns) kept for the configured quantization."""
+        specs = {}
+        if self.quantization == "none" or self.exact_rerank:
+            specs["f32"] = (np.float32, self._dim)
+        if self.quantization == "float16":
+            specs["f16"] = (np.float16, self._dim)
+        if self.quantization == "int8":
+            specs["i8"] = (np.int8, self._dim)
+            specs["scale"] = (np.float32, 1)
+        return specs
+
+    def _load(self) -> None:
+        """Restore slots, metadata and vectors from disk."""
+        info = dict(self._db.execute("SELECT key, value FROM store_info").fetchall())
+        if "dim" not in info:
+            return
+        self._dim = int(info["dim"])
+        stored = (info.get("quantization", "none"), info.get("exact_rerank", "1") == "1")
+        if stored != (self.quantization, self.exact_rerank):
+            self.logger.warning(f"Vector store {self.name} was built with quantization {stored}; using it")
+            self.quantization, self.exact_rerank = stored
+
+        rows = self._db.execute("SELECT slot, id, metadata FROM chunks").fetchall()
+        size = max((slot for slot, _, _ in rows), default=-1) + 1
+        self._ids = [None] * size
+        self._metadatas = [None] * size
+        self._live = np.zeros(size, dtype=bool)
+        self._assignments = np.full(size, -1, dtype=np.int32)
+        for slot, chunk_id, metadata in rows:
+            self._set_row(slot, chunk_id, json.loads(metadata) if metadata else {})
+        self._free = [slot for slot in range(size) if not self._live[slot]]
+
+        specs = self._matrix_specs()
+        if self.persist_directory and all(os.path.exists(self._matrix_path(key)) for key in specs):
+            capacity = min(
+                os.path.getsize(self._matrix_path(key)) // (np.dtype(dtype).itemsize * columns)
+                for key, (dtype, columns) in specs.items()
+            )
+            for key, (dtype, columns) in specs.items():
+                self._matrices[key] = np.memmap(
+                    self._matrix_path(key), dtype=dtype, mode="r+", shape=(capacity, columns)
+                )
+            self._resize_slot_arrays(capacity)
+        else:
+            self._allocate(max(size, self.initial_capacity))
+
+        if self.index_type == "ivf" and self.persist_directory and os.path.exists(self._centroid_path):
+            self._centroids = np.load(self._centroid_path)
+            self._assign(np.flatnonzero(self._live))
+
+    def _allocate(self, capacity: int) -> None:
+        """Grow every vector matrix to ``capacity`` rows, keeping existing rows."""
+        for key, (dtype, columns) in self._matrix_specs().items():
+            old = self._matrices.pop(key, None)
+            if self.persist_directory:
+                if old is not None:
+                    old.flush()
+                    del old
+                with open(self._matrix_path(key), "ab") as f:
+                    f.truncate(capacity * columns * np.dtype(dtype).itemsize)
+                self._matrices[key] = np.memmap(
+                    self._matrix_path(key), dtype=dtype, mode="r+", shape=(capacity, columns)
+                )
+            else:
+                matrix = np.zeros((capacity, columns), dtype=dtype)
+                if old is not None:
+                    matrix[:old.shape[0]] = old
+                self._matrices[key] = matrix
+        self._resize_slot_arrays(capacity)
+
+    def _write_vectors(self, slots: List[int], vectors: np.ndarray) -> None:
+        """Store normalized ``vectors`` (and their quantized codes) at ``slots``."""
+        if "f32" in self._matrices:
+            self._matrices["f32"][slots] = vectors
+        if "f16" in self._matrices:
+            self._matrices["f16"][slots] = vectors.astype(np.float16)
+        if "i8" in self._matrices:
+            scales = np.maximum(np.abs(vectors).max(axis=1, keepdims=True), 1e-12) / 127
+            self._matrices["i8"][slots] = np.clip(np.rint(vectors / scales), -127, 127).astype(np.int8)
+            self._matrices["scale"][slots] = scales
+
+    def _dense(self, slots: Any) -> np.ndarray:
+        """Return float32 rows for ``slots`` (dequantized if no float32 copy)."""
+        if "f32" in self._matrices:
+            return np.asarray(self._matrices["f32"][slots], dtype=np.float32)
+        if "f16" in self._matrices:
+            return np.asarray(self._matrices["f16"][slots], dtype=np.float32)
+        return np.asarray(self._matrices["i8"][slots], dtype=np.float32) * self._matrices["scale"][slots]
+
+    def _resize_slot_arrays(self, capacity: int) -> None:
+        """Grow the per-slot live mask and IVF assignments with the matrix."""
+        live = np.zeros(capacity, dtype=bool)
+        live[:len(self._live)] = self._live[:capacity]
+        assignments = np.full(capacity, -1, dtype=np.int32)
+        assignments[:len(self._assignments)] = self._assignments[:capacity]
+        self._live = live
+        self._assignments = assignments
+
+    def _take_slot(self) -> int:
+        if self._free:
+            return self._free.pop()
+        slot = len(self._ids)
+        if slot >= self._capacity:
+            self._allocate(max(self.initial_capacity, self._capacity * 2))
+        self._ids.append(None)
+        self._metadatas.append(None)
+        return slot
+
+    def _set_row(self, slot: int, chunk_id: str, metadata: Dict[str, Any]) -> None:
+        self._unindex(slot)
+        self._ids[slot] = chunk_id
+        self._metadatas[slot] = metadata
+        self._slots[chunk_id] = slot
+        self._live[slot] = True
+        for field in self.INDEXED_FIELDS:
+            if field in metadata:
+                self._field_index[field].setdefault(metadata[field], set()).add(slot)
+
+    def _unindex(self, slot: int) -> None:
+        metadata = self._metadatas[slot]
+        if metadata is None:
+            return
+        for field in self.INDEXED_FIELDS:
+            slots = self._field_index[field].get(metadata.get(field))
+            if slots is not None:
+                slots.discard(slot)
+                if not slots:
+                    del self._field_index[field][metadata.get(field)]
+
+    def _fetch_documents(self, slots: Iterable[int]) -> Dict[int, Optional[str]]:
+        slots = list(slots)
+        documents = {}
+        for offset in range(0, len(slots), SQLITE_MAX_VARIABLES):
+            batch = slots[offset:offset + SQLITE_MAX_VARIABLES]
+            placeholders = ",".join("?" * len(batch))
+            for slot, document in self._db.execute(
+                f"SELECT slot, document FROM chunks WHERE slot IN ({placeholders})", batch
+            ):
+                documents[slot] = document
+        return documents
+
+    def _flush(self) -> None:
+        self._db.commit()
+        for matrix in self._matrices.values():
+            if isinstance(matrix, np.memmap):
+                matrix.flush()
+
+    @staticmethod
+    def _normalize(embeddings: Any) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    # ----------------------------
+    # Filtering
+    # ----------------------------
+
+    def _filter_slots(self, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Return live slots matching ``where`` (``None`` means every live slot)."""
+        if not where:
+            return None
+
+        if len(where) == 1:
+            field, condition = next(iter(where.items()))
+            if field in self._field_index:
+                values = None
+                if not isinstance(condition, dict):
+                    values = [condition]
+                elif set(condition) == {"$eq"}:
+                    values = [condition["$eq"]]
+                elif set(condition) == {"$in"}:
+                    values = condition["$in"]
+                if values is not None:
+                    slots = set()
+                    for value in values:
+                        slots |= self._field_index[field].get(value, set())
+                    return np.fromiter(sorted(slots), dtype=np.int64, count=len(slots))
+
+        return np.fromiter(
+            (slot for slot in np.flatnonzero(self._live) if matches_where(self._metadatas[slot], where)),
+            dtype=np.int64
+        )
+
+    # ----------------------------
+    # IVF
+    # ----------------------------
+
+    def train(self, sample_size: Optional[int] = None) -> bool:
+        """Cluster stored vectors into ``nlist`` cells (spherical k-means)."""
+        with self._lock:
+            live = np.flatnonzero(self._live)
+            if len(live) < self.nlist:
+                return False
+
+            rng = np.random.default_rng(0)
+            sample_size = sample_size or self.nlist * 256
+            sample = live if len(live) <= sample_size else rng.choice(live, sample_size, replace=False)
+            data = self._dense(np.sort(sample))
+
+            centroids = data[rng.choice(len(data), self.nlist, replace=False)].copy()
+            for _ in range(self.KMEANS_ITERATIONS):
+                labels = np.argmax(data @ centroids.T, axis=1)
+                for cell in range(self.nlist):
+                    members = data[labels == cell]
+                    # Re-seed empty cells from a random point
+                    centroids[cell] = members.sum(axis=0) if len(members) else data[rng.integers(len(data))]
+                centroids = self._normalize(centroids)
+
+            self._centroids = centroids
+            self._assign(live)
+            if self.persist_directory:
+                tmp_path = f"{self._centroid_path}.tmp.npy"
+                np.save(tmp_path, centroids)
+                os.replace(tmp_path, self._centroid_path)
+            return True
+
+    def _assign(self, slots: np.ndarray, chunk_size: int = 65536) -> None:
+        for offset in range(0, len(slots), chunk_size):
+            batch = slots[offset:offset + chunk_size]
+            self._assignments[batch] = np.argmax(
+                self._dense(batch) @ self._centroids.T, axis=1
+            )
+
+    def _ensure_trained(self) -> bool:
+        if self._centroids is not None:
+            return True
+        if int(self._live.sum()) >= self.nlist * self.MIN_TRAIN_PER_LIST:
+            return self.train()
+        return False
+
+    # ----------------------------
+    # Public API
+    # ----------------------------
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None) -> None:
+        """Insert or replace rows by ID."""
+        if not ids:
+            return
+        vectors = self._normalize(embeddings)
+        with self._lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                self._db.executemany("INSERT OR REPLACE INTO store_info VALUES (?, ?)", [
+                    ("dim", str(self._dim)),
+                    ("quantization", self.quantization),
+                    ("exact_rerank", "1" if self.exact_rerank else "0"),
+                ])
+                self._allocate(self.initial_capacity)
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match store dimension {self._dim}")
+
+            rows = []
+            slots = []
+            for i, chunk_id in enumerate(ids):
+                slot = self._slots.get(chunk_id)
+                if slot is None:
+                    slot = self._take_slot()
+                metadata = dict(metadatas[i]) if metadatas else {}
+                self._set_row(slot, chunk_id, metadata)
+                slots.append(slot)
+                rows.append((slot, chunk_id, documents[i] if documents else None, json.dumps(metadata)))
+
+            self._write_vectors(slots, vectors)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunks (slot, id, document, metadata) VALUES (?, ?, ?, ?)", rows
+            )
+            if self._centroids is not None:
+                self._assign(np.asarray(slots, dtype=np.int64))
+            self._flush()
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None) -> None:
+        """Update fields of existing rows; unknown IDs are ignored."""
+        with self._lock:
+            present = [(i, self._slots[chunk_id]) for i, chunk_id in enumerate(ids) if chunk_id in self._slots]
+            if not present:
+                return
+            if embeddings is not None:
+                vectors = self._normalize(embeddings)
+                self._write_vectors([slot for _, slot in present], vectors[[i for i, _ in present]])
+                if self._centroids is not None:
+                    self._assign(np.asarray([slot for _, slot in present], dtype=np.int64))
+            if metadatas is not None:
+                for i, slot in present:
+                    self._set_row(slot, ids[i], dict(metadatas[i]))
+                self._db.executemany(
+                    "UPDATE chunks SET metadata = ? WHERE slot = ?",
+                    [(json.dumps(self._metadatas[slot]), slot) for _, slot in present]
+                )
+            if documents is not None:
+                self._db.executemany(
+                    "UPDATE chunks SET document = ? WHERE slot = ?",
+                    [(documents[i], slot) for i, slot in present]
+                )
+            self._flush()
+
+    def get(self, ids=None, where=None, include=None) -> Dict[str, Any]:
+        """Return rows by ID and/or filter, in Chroma's ``get`` shape."""
+        include = DEFAULT_INCLUDE if include is None else include
+        with self._lock:
+            if ids is not None:
+                slots = [self._slots[chunk_id] for chunk_id in ids if chunk_id in self._slots]
+                if where:
+                    slots = [slot for slot in slots if matches_where(self._metadatas[slot], where)]
+            else:
+                filtered = self._filter_slots(where)
+                slots = (np.flatnonzero(self._live) if filtered is None else filtered).tolist()
+            return self._rows(slots, include)
+
+    def _rows(self, slots: List[int], include: Iterable[str]) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"ids": [self._ids[slot] for slot in slots]}
+        if "embeddings" in include:
+            result["embeddings"] = self._dense(slots).tolist() if slots else []
+        if "documents" in include:
+            documents = self._fetch_documents(slots)
+            result["documents"] = [documents.get(slot) for slot in slots]
+        if "metadatas" in include:
+            result["metadatas"] = [dict(self._metadatas[slot]) for slot in slots]
+        return result
+
+    def query(self, query_embeddings, n_results=10, where=None, include=None) -> Dict[str, Any]:
+        """Return the ``n_results`` nearest rows per query embedding."""
+        include = DEFAULT_INCLUDE if include is None else include
+        queries = self._normalize(query_embeddings)
+        results: Dict[str, List[Any]] = {"ids": [], "distances": []}
+        for field in ("embeddings", "documents", "metadatas"):
+            if field in include:
+                results[field] = []
+
+        with self._lock:
+            if self._dim is None:
+                for field in results:
+                    results[field] = [[] for _ in queries]
+                return results
+
+            filtered = self._filter_slots(where)
+            use_ivf = self.index_type == "ivf" and self._ensure_trained()
+            for query in queries:
+                slots, similarities = self._search(query, n_results, filtered, use_ivf)
+                rows = self._rows(slots.tolist(), include)
+                results["distances"].append((1 - similarities).tolist())
+                for field, values in rows.items():
+                    results[field].append(values)
+        return results
+
+    def _search(
+        self,
+        query: np.ndarray,
+        n_results: int,
+        filtered: Optional[np.ndarray],
+        use_ivf: bool
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        size = len(self._ids)
+        candidates = filtered
+        if use_ivf:
+            cells = np.argsort(-(self._centroids @ query))[:self.nprobe]
+            in_cells = np.isin(self._assignments[:size], cells) & self._live[:size]
+            probed = np.flatnonzero(in_cells) if filtered is None else filtered[in_cells[filtered]]
+            # Filters can empty the probed cells; an exact scan is cheap then
+            if len(probed) >= n_results:
+                candidates = probed
+
+        similarities = self._scan(query, candidates)
+        if candidates is None:
+            candidates = np.arange(size)
+
+        if self.quantization == "none":
+            top = self._top(similarities, n_results)
+            return candidates[top], similarities[top]
+
+        # Shortlist on the compact codes, then re-score exactly
+        positions = self._top(similarities, n_results * self.rerank_factor)
+        shortlist = candidates[positions]
+        if "f32" in self._matrices:
+            rescored = self._dense(shortlist) @ query
+        else:
+            rescored = similarities[positions]
+        top = self._top(rescored, n_results)
+        return shortlist[top], rescored[top]
+
+    def _scan(self, query: np.ndarray, slots: Optional[np.ndarray]) -> np.ndarray:
+        """Similarity of ``query`` to ``slots`` (or every slot) on the scan matrix."""
+        key = self._scan_key
+        matrix = self._matrices[key]
+        size = len(self._ids)
+        total = size if slots is None else len(slots)
+        similarities = np.empty(total, dtype=np.float32)
+
+        for offset in range(0, total, self.SCAN_BLOCK_ROWS):
+            rows = slice(offset, min(offset + self.SCAN_BLOCK_ROWS, total))
+            index = rows if slots is None else slots[rows]
+            block = np.asarray(matrix[index], dtype=np.float32) @ query
+            if key == "i8":
+                block *= self._matrices["scale"][index, 0]
+            similarities[rows] = block
+
+        if slots is None:
+            similarities[~self._live[:size]] = -np.inf
+        return similarities
+
+    @staticmethod
+    def _top(similarities: np.ndarray, k: int) -> np.ndarray:
+        """Positions of the ``k`` highest finite similarities, best first."""
+        k = min(k, int(np.isfinite(similarities).sum()))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        top = np.argpartition(-similarities, k - 1)[:k]
+        return top[np.argsort(-similarities[top])]
+
+    def delete(self, ids=None, where=None) -> None:
+        """Delete rows by ID and/or filter."""
+        with self._lock:
+            if ids is not None:
+                slots = [self._slots[chunk_id] for chunk_id in ids if chunk_id in self._slots]
+                if where:
+                    slots = [slot for slot in slots if matches_where(self._metadatas[slot], where)]
+            elif where:
+                slots = self._filter_slots(where).tolist()
+            else:
+                return
+
+            for slot in slots:
+                self._unindex(slot)
+                del self._slots[self._ids[slot]]
+                self._ids[slot] = None
+                self._metadatas[slot] = None
+                self._live[slot] = False
+                self._assignments[slot] = -1
+                self._free.append(slot)
+
+            for offset in range(0, len(slots), SQLITE_MAX_VARIABLES):
+                batch = slots[offset:offset + SQLITE_MAX_VARIABLES]
+                self._db.execute(f"DELETE FROM chunks WHERE slot IN ({','.join('?' * len(batch))})", batch)
+            self._db.commit()
+
+    def count(self) -> int:
+        return len(self._slots)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return size, memory footprint and index state."""
+        return {
+            "backend": self.backend,
+            "name": self.name,
+            "index_type": self.index_type,
+            "chunks": self.count(),
+            "dimension": self._dim,
+            "capacity": self._capacity,
+            "quantization": self.quantization,
+            "exact_rerank": self.exact_rerank,
+            "scan_bytes": self._matrices[self._scan_key].nbytes if self._matrices else 0,
+            "vector_bytes": sum(matrix.nbytes for matrix in self._matrices.values()),
+            "ivf_trained": self._centroids is not None,
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+        }
+
+    def close(self) -> None:
+        """Flush vectors and close the SQLite connection."""
+        with self._lock:
+            self._flush()
+            self._db.close()
+
+
+class ShardRouter:
+    """Assign documents to vector store shards and remember the assignment.
+
+    Strategies:
+    - ``document``: one shard per document
+    - ``company``: one shard per company (``company`` in document metadata)
+    - ``hash``: ``buckets`` shards, chosen by a stable hash of the document ID
+
+    The routing table (document ID -> shard) is authoritative once written,
+    so changing strategy later never strands already-indexed documents.
+    """
+
+    def __init__(
+        self,
+        strategy: str,
+        base_name: str = DEFAULT_COLLECTION_NAME,
+        buckets: int = 16,
+        path: Optional[str] = None,
+        company_field: str = "company"
+    ):
+        """Initialize router, loading the persisted routing table if any."""
+        if strategy not in ("document", "company", "hash"):
+            raise ValueError(f"Unknown shard strategy: {strategy}")
+
+        self.logger = logging.getLogger(__name__)
+        self.strategy = strategy
+        self.base_name = base_name
+        self.buckets = buckets
+        self.path = path
+        self.company_field = company_field
+        self._lock = threading.Lock()
+        self._routes: Dict[int, str] = {}
+
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._routes = {int(doc_id): shard for doc_id, shard in data.get("routes", {}).items()}
+            if data.get("strategy") != strategy:
+                self.logger.warning(
+                    f"Shard strategy changed from {data.get('strategy')} to {strategy}; "
+                    f"existing documents keep their shards"
+                )
+
+    def _compute(self, document_id: int, metadata: Dict[str, Any]) -> str:
+        if self.strategy == "document":
+            return f"{self.base_name}_doc_{document_id}"
+        if self.strategy == "hash":
+            bucket = int(hashlib.md5(str(document_id).encode()).hexdigest()[:8], 16) % self.buckets
+            return f"{self.base_name}_h{bucket:03d}"
+        company = re.sub(r"[^a-z0-9]+", "_", str(metadata.get(self.company_field) or "").lower()).strip("_")
+        return f"{self.base_name}_co_{company[:40] or 'unassigned'}"
+
+    def _persist(self) -> None:
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"strategy": self.strategy, "routes": self._routes}, f)
+        os.replace(tmp_path, self.path)
+
+    def assign(self, document_id: int, metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Return the shard for ``document_id``, recording it on first sight."""
+        with self._lock:
+            shard = self._routes.get(document_id)
+            if shard is None:
+                shard = self._compute(document_id, metadata or {})
+                self._routes[document_id] = shard
+                self._persist()
+            return shard
+
+    def shard_for(self, document_id: int) -> Optional[str]:
+        """Return the shard holding ``document_id`` (``None`` if never indexed)."""
+        return self._routes.get(document_id)
+
+    def shards(self) -> List[str]:
+        """Return every shard that holds at least one routed document."""
+        return sorted(set(self._routes.values()))
+
+
+def _chunk_document_id(chunk_id: str) -> Optional[int]:
+    """Return the document ID encoded in a ``doc_<id>_...`` chunk ID."""
+    match = CHUNK_ID_DOCUMENT.match(chunk_id)
+    return int(match.group(1)) if match else None
+
+
+def _document_ids_in(where: Optional[Dict[str, Any]]) -> Optional[List[Any]]:
+    """Extract the document IDs a filter is restricted to, if it is."""
+    if not where:
+        return None
+    if "document_id" in where:
+        condition = where["document_id"]
+        if not isinstance(condition, dict):
+            return [condition]
+        if "$eq" in condition:
+            return [condition["$eq"]]
+        if "$in" in condition:
+            return list(condition["$in"])
+    for clause in where.get("$and", []):
+        document_ids = _document_ids_in(clause)
+        if document_ids is not None:
+            return document_ids
+    return None
+
+
+class ShardedVectorStore(VectorStore):
+    """Route rows to per-document/company/bucket shards of another backend.
+
+    Writes go to the shard of each row's ``document_id``; updates and
+    deletes find it from the ``doc_<id>_`` chunk ID or the row's metadata
+    and only scan shards for IDs that carry neither. Reads whose filter
+    pins ``document_id`` touch only those shards; anything else fans out to
+    every shard and, for ``query``, merges hits by distance.
+
+    At most ``max_open_shards`` shard handles are kept open; the least
+    recently used idle ones are closed beyond that.
+    """
+
+    backend = "sharded"
+
+    def __init__(
+        self,
+        router: ShardRouter,
+        open_shard: Callable[[str], VectorStore],
+        max_open_shards: Optional[int] = None
+    ):
+        """Initialize over a router and a factory opening one shard by name."""
+        self.router = router
+        self.name = router.base_name
+        self.max_open_shards = max_open_shards
+        self._open_shard = open_shard
+        self._lock = threading.Lock()
+        self._handles: "OrderedDict[str, VectorStore]" = OrderedDict()
+        self._users: Dict[str, int] = {}
+
+    @contextmanager
+    def _shard(self, name: str) -> Iterator[VectorStore]:
+        """Use one shard, keeping it open while in use."""
+        with self._lock:
+            store = self._handles.get(name)
+            if store is None:
+                store = self._handles[name] = self._open_shard(name)
+            self._handles.move_to_end(name)
+            self._users[name] = self._users.get(name, 0) + 1
+        try:
+            yield store
+        finally:
+            with self._lock:
+                self._users[name] -= 1
+                self._evict_idle()
+
+    def _evict_idle(self) -> None:
+        """Close least recently used idle shards beyond ``max_open_shards`` (lock held)."""
+        if not self.max_open_shards:
+            return
+        for name in list(self._handles):
+            if len(self._handles) <= self.max_open_shards:
+                break
+            if self._users.get(name):
+                continue
+            self._handles.pop(name).close()
+            self._users.pop(name, None)
+
+    def _shard_names_for(self, where: Optional[Dict[str, Any]]) -> List[str]:
+        document_ids = _document_ids_in(where)
+        if document_ids is None:
+            return self.router.shards()
+        return sorted({
+            shard for shard in (self.router.shard_for(doc_id) for doc_id in document_ids) if shard
+        })
+
+    def _route(self, ids: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> Dict[str, List[int]]:
+        """Group positions in ``ids`` by the shard holding them.
+
+        The document ID comes from the chunk ID, else from the row's
+        metadata; only IDs with neither are looked up shard by shard.
+        """
+        groups: Dict[str, List[int]] = {}
+        unrouted: List[int] = []
+        for i, chunk_id in enumerate(ids):
+            document_id = _chunk_document_id(chunk_id)
+            if document_id is None and metadatas and metadatas[i]:
+                document_id = metadatas[i].get("document_id")
+            if document_id is None:
+                unrouted.append(i)
+                continue
+            shard = self.router.shard_for(document_id)
+            if shard:
+                groups.setdefault(shard, []).append(i)
+
+        if unrouted:
+            for shard, positions in self._locate([ids[i] for i in unrouted]).items():
+                groups.setdefault(shard, []).extend(unrouted[p] for p in positions)
+        return groups
+
+    def _locate(self, ids: List[str]) -> Dict[str, List[int]]:
+        """Group positions in ``ids`` by the shard currently holding them."""
+        positions = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        located: Dict[str, List[int]] = {}
+        for name in self.router.shards():
+            with self._shard(name) as store:
+                found = store.get(ids=ids, include=[])["ids"]
+            if found:
+                located[name] = [positions[chunk_id] for chunk_id in found]
+        return located
+
+    @staticmethod
+    def _pick(values: Optional[List[Any]], positions: List[int]) -> Optional[List[Any]]:
+        return None if values is None else [values[i] for i in positions]
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None) -> None:
+        groups: Dict[str, List[int]] = {}
+        for i in range(len(ids)):
+            metadata = metadatas[i] if metadatas else {}
+            shard = self.router.assign(metadata.get("document_id"), metadata)
+            groups.setdefault(shard, []).append(i)
+        for shard, positions in groups.items():
+            with self._shard(shard) as store:
+                store.upsert(
+                    ids=[ids[i] for i in positions],
+                    embeddings=[embeddings[i] for i in positions],
+                    documents=self._pick(documents, positions),
+                    metadatas=self._pick(metadatas, positions)
+                )
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None) -> None:
+        for shard, positions in self._route(ids, metadatas).items():
+            with self._shard(shard) as store:
+                store.update(
+                    ids=[ids[i] for i in positions],
+                    embeddings=self._pick(embeddings, positions),
+                    documents=self._pick(documents, positions),
+                    metadatas=self._pick(metadatas, positions)
+                )
+
+    def get(self, ids=None, where=None, include=None) -> Dict[str, Any]:
+        merged: Dict[str, List[Any]] = {}
+        for name in self._shard_names_for(where):
+            with self._shard(name) as store:
+                result = store.get(ids=ids, where=where, include=include)
+            for field, values in result.items():
+                if isinstance(values, list):
+                    merged.setdefault(field, []).extend(values)
+        merged.setdefault("ids", [])
+        return merged
+
+    def get_in_shard(self, document_id, metadata=None, where=None, include=None) -> Dict[str, Any]:
+        with self._shard(self.router.assign(document_id, metadata)) as store:
+            return store.get(where=where, include=include)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=None) -> Dict[str, Any]:
+        include = DEFAULT_INCLUDE if include is None else include
+        fields = ["ids", "distances"] + [f for f in ("embeddings", "documents", "metadatas") if f in include]
+        hits: List[List[Tuple[float, Dict[str, Any]]]] = [[] for _ in query_embeddings]
+
+        for name in self._shard_names_for(where):
+            with self._shard(name) as store:
+                result = store.query(query_embeddings=query_embeddings, n_results=n_results, where=where, include=include)
+            for q, distances in enumerate(result["distances"]):
+                for j, distance in enumerate(distances):
+                    hits[q].append((distance, {field: result[field][q][j] for field in fields}))
+
+        merged: Dict[str, List[Any]] = {field: [] for field in fields}
+        for query_hits in hits:
+            top = sorted(query_hits, key=lambda hit: hit[0])[:n_results]
+            for field in fields:
+                merged[field].append([row[field] for _, row in top])
+        return merged
+
+    def delete(self, ids=None, where=None) -> None:
+        if ids is not None:
+            for shard, positions in self._route(ids).items():
+                with self._shard(shard) as store:
+                    store.delete(ids=[ids[i] for i in positions], where=where)
+        elif where:
+            for name in self._shard_names_for(where):
+                with self._shard(name) as store:
+                    store.delete(where=where)
+
+    def _shard_counts(self) -> Dict[str, int]:
+        counts = {}
+        for name in self.router.shards():
+            with self._shard(name) as store:
+                counts[name] = store.count()
+        return counts
+
+    def count(self) -> int:
+        return sum(self._shard_counts().values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return per-shard chunk counts."""
+        shards = self._shard_counts()
+        return {
+            "backend": self.backend,
+            "name": self.name,
+            "strategy": self.router.strategy,
+            "chunks": sum(shards.values()),
+            "shards": shards,
+            "open_shards": len(self._handles),
+        }
+
+    def close(self) -> None:
+        """Close every open shard."""
+        with self._lock:
+            for store in self._handles.values():
+                store.close()
+            self._handles.clear()
+            self._users.clear()
+
+
+_stores: Dict[Tuple[str, str], VectorStore] = {}
+_stores_lock = threading.RLock()
+
+
+def _create_store(name: str, backend: str) -> VectorStore:
+    """Open the unsharded store ``name`` on ``backend``."""
+    if backend == "chroma":
+        return ChromaVectorStore(embedding_registry.get_collection(
+            name,
+            settings.chroma_persist_directory,
+            DEFAULT_COLLECTION_METADATA
+        ))
+    if backend == "numpy":
+        return NumpyVectorStore(
+            name,
+            settings.vector_store_directory,
+            index_type=settings.vector_index_type,
+            quantization=settings.vector_quantization
+        )
+    raise ValueError(f"Unknown vector store backend: {backend}")
+
+
+def _warn_unsupported_quantization(name: str, backend: str) -> None:
+    """Warn that ``settings.vector_quantization`` has no effect on ``backend``."""
+    if backend != "numpy" and settings.vector_quantization != "none":
+        logging.getLogger(__name__).warning(
+            f"Vector quantization '{settings.vector_quantization}' is only supported by the numpy "
+            f"backend; vector store {name} on '{backend}' stores float32 embeddings"
+        )
+
+
+def _open_store(name: str, backend: str) -> VectorStore:
+    """Return the process-wide unsharded store ``name`` on ``backend``."""
+    key = (backend, name)
+    with _stores_lock:
+        if key not in _stores:
+            _warn_unsupported_quantization(name, backend)
+            _stores[key] = _create_store(name, backend)
+        return _stores[key]
+
+
+def get_vector_store(name: str = DEFAULT_COLLECTION_NAME, backend: Optional[str] = None) -> VectorStore:
+    """Return the process-wide vector store selected by ``settings``.
+
+    With ``settings.vector_shard_strategy`` other than ``"none"`` the store
+    is a ``ShardedVectorStore`` whose shards are ``name``-prefixed stores on
+    ``backend``, at most ``settings.vector_max_open_shards`` of them open.
+    """
+    backend = backend or settings.vector_store_backend
+    strategy = settings.vector_shard_strategy
+    if strategy == "none":
+        return _open_store(name, backend)
+
+    key = (f"sharded:{backend}", name)
+    with _stores_lock:
+        if key not in _stores:
+            _warn_unsupported_quantization(name, backend)
+            router = ShardRouter(
+                strategy,
+                base_name=name,
+                buckets=settings.vector_shard_buckets,
+                path=os.path.join(settings.vector_store_directory, f"{name}_shards.json")
+            )
+            _stores[key] = ShardedVectorStore(
+                router,
+                lambda shard: _create_store(shard, backend),
+                max_open_shards=settings.vector_max_open_shards
+            )
+        return _stores[key]
+
+
+def shutdown_vector_stores() -> None:
+    """Close every open vector store."""
+    with _stores_lock:
+        for store in _stores.values():
+            store.close()
+        _stores.clear()
@@ -3,8 +3,10 @@ Utility functions for FinMDA-Bot.
 """
 import re
 import json
+import asyncio
 import hashlib
-from typing import Dict, Any, List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Union, Iterable, AsyncIterator
 from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
@@ -110,6 +112,32 @@ def generate_document_hash(content: str) -> str:
     return hashlib.md5(content.encode()).hexdigest()
 
 
+async def iterate_in_thread(iterable: Iterable[Any]) -> AsyncIterator[Any]:
+    """Consume a blocking iterable on a dedicated thread without blocking the event loop.
+
+    The next item is produced while the caller handles the current one,
+    and every step runs on the same thread, so generators holding
+    thread-affine resources (e.g. an open PDF) are safe to stream.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1)
+    iterator = iter(iterable)
+    done = object()
+    try:
+        pending = loop.run_in_executor(executor, next, iterator, done)
+        while True:
+            item = await pending
+            if item is done:
+                break
+            pending = loop.run_in_executor(executor, next, iterator, done)
+            yield item
+    finally:
+        # Runs after any in-flight step, on the producer's thread
+        if hasattr(iterator, "close"):
+            executor.submit(iterator.close)
+        executor.shutdown(wait=False)
+
+
 def validate_financial_data(data: Dict[str, Any]) -> Dict[str, Any]:
     """Validate financial data for completeness and consistency."""
     validation_results = {
@@ -279,7 +279,7 @@ class TestRAGService:
                 metadata={"type": "financial_statement"}
             )
             
-            assert result is True
+            assert result["success"]
             mock_add.assert_called_once()
     
     @pytest.mark.asyncio
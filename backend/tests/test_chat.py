@@ -0,0 +1,158 @@
+"""
+Tests for streamed chat answers over SSE and WebSocket.
+"""
+import pytest
+import json
+from unittest.mock import patch
+
+import numpy as np
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api.endpoints import chat
+from app.database import Base, get_db
+from app.models import ChatMessage
+from app.services import agent_system as agent_module
+from app.services.agent_system import AgentSystem
+from app.services.cache_service import ResponseCache
+from app.services.llm_client import LLMError
+
+
+class FakeLLM:
+    """Streams the words of a scripted answer; prompts mentioning 'explode' fail mid-stream."""
+
+    model = "fake-model"
+
+    def __init__(self):
+        self.streams = 0
+
+    async def stream(self, prompt, **kwargs):
+        self.streams += 1
+        yield "Revenue "
+        if "explode" in prompt:
+            raise LLMError("Gemini returned 503: overloaded", status_code=503)
+        yield "grew "
+        yield "25%."
+
+
+async def fake_embed_query(query):
+    return np.array([len(query), sum(map(ord, query)) % 97, 1.0], dtype=np.float32)
+
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class TestChatStreaming:
+    """Test the SSE and WebSocket chat endpoints against a fake LLM stream."""
+
+    def setup_method(self):
+        """Setup an app with the chat router, a scratch database and a fake agent."""
+        self.engine = create_engine(
+            "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+
+        self.llm = FakeLLM()
+        self.agent = AgentSystem(llm_client=self.llm, cache=ResponseCache(16, 60, 0.99))
+
+        def override_get_db():
+            db = self.Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app = FastAPI()
+        app.include_router(chat.router, prefix="/chat")
+        app.dependency_overrides[get_db] = override_get_db
+        self.client = TestClient(app)
+
+        self.patchers = [
+            patch.object(chat, "SessionLocal", self.Session),
+            patch.object(chat, "get_agent_system", lambda: self.agent),
+            patch.object(agent_module, "embed_query", fake_embed_query),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def teardown_method(self):
+        """Restore patched globals and drop the database."""
+        for patcher in self.patchers:
+            patcher.stop()
+        self.engine.dispose()
+
+    def stream(self, query, **fields):
+        response = self.client.post("/chat/query/stream", json={"query": query, **fields})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        return parse_sse(response.text)
+
+    def test_sse_streams_tokens_then_done(self):
+        """Test SSE framing: start, one token per piece, then done with the saved message."""
+        events = self.stream("How did revenue change?")
+
+        assert [event for event, _ in events] == ["start", "token", "token", "token", "done"]
+        assert "".join(data["text"] for event, data in events if event == "token") == "Revenue grew 25%."
+        done = events[-1][1]
+        assert done["response"] == "Revenue grew 25%."
+        assert done["session_id"] == events[0][1]["session_id"]
+        assert done["model_used"] == "fake-model"
+        assert done["time_to_first_token"] <= done["processing_time"]
+
+        with self.Session() as db:
+            message = db.query(ChatMessage).filter(ChatMessage.id == done["message_id"]).first()
+            assert message.role == "assistant" and message.content == "Revenue grew 25%."
+            assert message.time_to_first_token is not None
+
+    def test_completed_answer_is_cached(self):
+        """Test a repeated question is answered from the cache without streaming from the LLM."""
+        first = self.stream("How did revenue change?")
+        second = self.stream("How did revenue change?", session_id=first[0][1]["session_id"])
+
+        assert self.llm.streams == 1
+        assert [event for event, _ in second] == ["start", "token", "done"]
+        assert second[-1][1]["response"] == "Revenue grew 25%."
+
+    def test_sse_error_event_keeps_partial_answer(self):
+        """Test a failure mid-stream ends with an error event and the partial text is saved."""
+        events = self.stream("Why did it explode?")
+
+        assert [event for event, _ in events] == ["start", "token", "error"]
+        error = events[-1][1]
+        assert "503" in error["detail"]
+        with self.Session() as db:
+            message = db.query(ChatMessage).filter(ChatMessage.id == error["message_id"]).first()
+            assert message.content == "Revenue "
+
+        # A failed stream is not cached
+        self.stream("Why did it explode?", session_id=error["session_id"])
+        assert self.llm.streams == 2
+
+    def test_websocket_streams_and_reports_errors(self):
+        """Test the WebSocket sends the same events and survives invalid messages."""
+        with self.client.websocket_connect("/chat/ws") as websocket:
+            websocket.send_text(json.dumps({"query": ""}))
+            invalid = websocket.receive_json()
+            assert invalid["type"] == "error"
+            assert invalid["detail"][0]["loc"] == ["query"]
+
+            websocket.send_text(json.dumps({"query": "How did revenue change?"}))
+            messages = [websocket.receive_json()]
+            while messages[-1]["type"] not in ("done", "error"):
+                messages.append(websocket.receive_json())
+
+            websocket.send_text(json.dumps({"query": "Hi", "session_id": 999}))
+            missing = websocket.receive_json()
+
+        assert [m["type"] for m in messages] == ["start", "token", "token", "token", "done"]
+        assert messages[-1]["response"] == "Revenue grew 25%."
+        assert missing == {"type": "error", "detail": "Chat session not found"}
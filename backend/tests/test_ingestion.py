@@ -0,0 +1,350 @@
+"""
+Tests for the upload and background ingestion pipeline.
+"""
+import pytest
+import asyncio
+import hashlib
+import io
+import os
+
+import pandas as pd
+from fastapi import UploadFile
+
+from unittest.mock import patch
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, add_missing_columns
+from app.models import Document
+from app.services import document_processor, ingestion_queue
+from app.services.ingestion_queue import IngestionQueue, IngestionQueueFull, run_ingestion
+from app.services.document_processor import page_ranges
+from app.services.extraction_cache import ExtractionCache, frame_to_json, frame_from_json
+from app.services.upload_storage import stream_upload, store_blob, release_blob, UploadTooLarge
+
+
+class TestIngestionQueue:
+    """Test bounded concurrency and backpressure of the asyncio queue."""
+
+    def setup_method(self):
+        """Setup a runner that records concurrency."""
+        self.active = 0
+        self.max_active = 0
+        self.processed = []
+
+    async def runner(self, document_id, file_path, file_type, company=None):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        self.processed.append(document_id)
+        return document_id != 3
+
+    @pytest.mark.asyncio
+    async def test_workers_bound_concurrency(self):
+        """Test no more than num_workers documents are ingested at once."""
+        queue = IngestionQueue(num_workers=2, max_pending=10, runner=self.runner)
+
+        job_ids = [await queue.submit(i, f"/tmp/{i}.pdf", "pdf") for i in range(6)]
+        await queue.join()
+
+        assert len(set(job_ids)) == 6
+        assert sorted(self.processed) == list(range(6))
+        assert self.max_active == 2
+        stats = queue.get_stats()
+        assert stats["completed"] == 5
+        assert stats["failed"] == 1
+        assert stats["pending"] == 0
+        await queue.stop()
+
+    @pytest.mark.asyncio
+    async def test_full_queue_rejects_submissions(self):
+        """Test submit fails fast once max_pending jobs are waiting."""
+        queue = IngestionQueue(num_workers=1, max_pending=2, runner=self.runner)
+
+        await queue.submit(1, "/tmp/1.pdf", "pdf")
+        await queue.submit(2, "/tmp/2.pdf", "pdf")
+        with pytest.raises(IngestionQueueFull):
+            await queue.submit(4, "/tmp/4.pdf", "pdf")
+
+        await queue.join()
+        assert queue.get_stats()["submitted"] == 2
+        await queue.stop()
+        assert not queue.is_running
+
+
+class FailingRAGService:
+    """RAG service whose indexing always reports failure, as the real service does."""
+
+    async def index_document(self, *args, **kwargs):
+        return {
+            "success": False,
+            "total_chunks": 0,
+            "reused_chunks": 0,
+            "embedded_chunks": 0,
+            "deleted_chunks": 0,
+            "batches": 0,
+            "error": "vector store unavailable"
+        }
+
+    def close(self):
+        pass
+
+
+class RecordingRAGService:
+    """RAG service recording which documents' indexes are deleted."""
+
+    deleted = []
+
+    async def delete_document(self, document_id):
+        self.deleted.append(document_id)
+        return True
+
+    def close(self):
+        pass
+
+
+class TestIngestionStatus:
+    """Test job status bookkeeping and schema upgrades against a scratch database."""
+
+    def setup_method(self):
+        """Setup an empty SQLite database."""
+        self.engine = None
+
+    def teardown_method(self):
+        """Dispose of the scratch database."""
+        if self.engine is not None:
+            self.engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_indexing_failure_fails_job(self, tmp_path):
+        """Test a failed index report fails the job and leaves the document unprocessed."""
+        self.engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+        Base.metadata.create_all(bind=self.engine)
+        Session = sessionmaker(bind=self.engine)
+        path = tmp_path / "report.csv"
+        path.write_text("revenue,100\n")
+        with Session() as db:
+            db.add(Document(id=1, filename="report.csv", file_path=str(path), file_type="csv", file_size=12))
+            db.commit()
+
+        with patch.object(ingestion_queue, "SessionLocal", Session), \
+                patch.object(document_processor, "SessionLocal", Session), \
+                patch.object(document_processor, "RAGService", FailingRAGService):
+            ok = await run_ingestion(1, str(path), "csv")
+
+        assert not ok
+        with Session() as db:
+            document = db.query(Document).filter(Document.id == 1).first()
+            assert document.processing_stage == "failed"
+            assert "vector store unavailable" in document.processing_error
+            assert not document.is_processed
+
+    @pytest.mark.asyncio
+    async def test_duplicates_share_content_until_last_delete(self, tmp_path):
+        """Test duplicates reference the canonical document and its content is refcounted."""
+        self.engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+        Base.metadata.create_all(bind=self.engine)
+        Session = sessionmaker(bind=self.engine)
+        blob = tmp_path / "blob.pdf"
+        blob.write_bytes(b"%PDF")
+        with Session() as db:
+            for doc_id in (1, 2, 3):
+                db.add(Document(id=doc_id, filename="a.pdf", file_path=str(blob), file_type="pdf", file_size=4))
+            db.commit()
+
+        RecordingRAGService.deleted = []
+        processor = document_processor.DocumentProcessor()
+        with patch.object(document_processor, "SessionLocal", Session), \
+                patch.object(document_processor, "RAGService", RecordingRAGService):
+            assert processor.link_duplicate(1, 2)
+            assert processor.link_duplicate(2, 3, company="ACME")
+            with Session() as db:
+                assert document_processor.content_document_ids(db, [1, 2, 3]) == {1: 1, 2: 1, 3: 1}
+
+            await processor.delete_document(1)
+            with Session() as db:
+                assert db.query(Document).filter(Document.id == 1).first().is_deleted
+            await processor.delete_document(2)
+            assert RecordingRAGService.deleted == []
+            assert blob.exists()
+
+            await processor.delete_document(3)
+
+        assert RecordingRAGService.deleted == [1]
+        assert not blob.exists()
+        with Session() as db:
+            assert db.query(Document).count() == 0
+
+    def test_missing_columns_are_added(self, tmp_path):
+        """Test columns added to models after a table was created are migrated."""
+        self.engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE documents (id INTEGER PRIMARY KEY, filename VARCHAR(255), "
+                "file_path VARCHAR(500), file_type VARCHAR(10), file_size INTEGER)"
+            ))
+            conn.execute(text("INSERT INTO documents VALUES (1, 'a.pdf', '/a.pdf', 'pdf', 10)"))
+
+        added = add_missing_columns(self.engine)
+
+        assert "documents.content_hash" in added
+        columns = {column["name"] for column in inspect(self.engine).get_columns("documents")}
+        assert {"processing_stage", "job_id", "is_processed"} <= columns
+        with self.engine.connect() as conn:
+            assert conn.execute(text("SELECT processing_stage FROM documents")).scalar() == "uploaded"
+        assert add_missing_columns(self.engine) == []
+
+
+class TestStreamUpload:
+    """Test streaming uploads to disk."""
+
+    def setup_method(self):
+        """Setup an in-memory upload."""
+        self.content = b"10-K annual report " * 1000
+
+    def _upload(self):
+        return UploadFile(file=io.BytesIO(self.content), filename="report.pdf")
+
+    @pytest.mark.asyncio
+    async def test_stream_hashes_and_renames(self, tmp_path):
+        """Test the file lands under its final name with a matching SHA-256."""
+        stored = await stream_upload(self._upload(), str(tmp_path), "pdf", chunk_size=1024)
+
+        assert stored.file_size == len(self.content)
+        assert stored.sha256 == hashlib.sha256(self.content).hexdigest()
+        assert stored.file_path.endswith(".pdf")
+        with open(stored.file_path, "rb") as f:
+            assert f.read() == self.content
+        assert os.listdir(tmp_path) == [os.path.basename(stored.file_path)]
+
+    @pytest.mark.asyncio
+    async def test_oversized_upload_aborts(self, tmp_path):
+        """Test exceeding the limit raises and leaves nothing on disk."""
+        with pytest.raises(UploadTooLarge):
+            await stream_upload(self._upload(), str(tmp_path), "pdf", max_bytes=4096, chunk_size=1024)
+
+        assert os.listdir(tmp_path) == []
+
+    @pytest.mark.asyncio
+    async def test_duplicate_uploads_share_one_blob(self, tmp_path):
+        """Test identical uploads map to one file that outlives all but its last reference."""
+        first = await stream_upload(self._upload(), str(tmp_path), "pdf")
+        second = await stream_upload(self._upload(), str(tmp_path), "pdf")
+
+        path = store_blob(first, "pdf", str(tmp_path))
+        assert store_blob(second, "pdf", str(tmp_path)) == path
+        assert not os.path.exists(first.file_path) and not os.path.exists(second.file_path)
+
+        assert not release_blob(path, remaining_references=1)
+        assert os.path.exists(path)
+        assert release_blob(path, remaining_references=0)
+        assert not os.path.exists(path)
+
+
+def test_page_ranges_cover_document_in_order():
+    """Test page ranges are contiguous, ordered and bounded."""
+    assert page_ranges(7, 3) == [(0, 3), (3, 6), (6, 7)]
+    assert page_ranges(0, 25) == []
+    ranges = page_ranges(301, 25)
+    assert ranges[0][0] == 0 and ranges[-1][1] == 301
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+
+
+class FakePage:
+    def __init__(self, number):
+        self.number = number
+
+    def get_text(self):
+        return f"page {self.number}"
+
+
+class FakePDF:
+    """Minimal stand-in for a PyMuPDF document."""
+
+    def __init__(self, pages):
+        self.pages = [FakePage(i) for i in range(pages)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def __len__(self):
+        return len(self.pages)
+
+    def __iter__(self):
+        return iter(self.pages)
+
+    def __getitem__(self, i):
+        return self.pages[i]
+
+
+def test_serial_fallback_reports_one_worker():
+    """Test a failing process pool falls back to serial extraction with one worker recorded."""
+    class FakeFitz:
+        @staticmethod
+        def open(path):
+            return FakePDF(60)
+
+    def broken_pool():
+        raise RuntimeError("pool unavailable")
+
+    metadata = {}
+    with patch.object(document_processor, "fitz", FakeFitz), \
+            patch.object(document_processor, "get_pdf_executor", broken_pool):
+        text = document_processor.DocumentProcessor()._extract_pdf_text("report.pdf", metadata)
+
+    assert text.startswith("page 0\n\npage 1") and text.endswith("page 59")
+    assert metadata["extraction_workers"] == 1
+    assert metadata["page_count"] == 60
+
+
+class TestExtractionCache:
+    """Test the on-disk extraction cache."""
+
+    def setup_method(self):
+        """Setup frames shaped like parsed blocks and tables."""
+        table = pd.DataFrame([["Revenue", "1,200"], ["Cost", "(700)"]], columns=["Item", "2024"])
+        self.frames = {
+            "text_blocks": pd.DataFrame({"page_number": [0, 1], "text": ["Overview", "Revenue grew"]}),
+            "tables": pd.DataFrame({"page_number": [1], "data": [frame_to_json(table)]}),
+        }
+        self.table = table
+
+    def test_round_trip_and_hash_key(self, tmp_path):
+        """Test entries are keyed by content and round-trip frames and meta."""
+        pdf = tmp_path / "a.pdf"
+        pdf.write_bytes(b"%PDF-1.4 filing")
+        copy = tmp_path / "b.pdf"
+        copy.write_bytes(b"%PDF-1.4 filing")
+        cache = ExtractionCache(str(tmp_path / "cache"), enabled=True)
+
+        key = cache.key_for(str(pdf), "v2")
+        assert key == cache.key_for(str(copy), "v2") != cache.key_for(str(pdf), "v3")
+        # A stored upload hash is used as-is; the file need not even exist
+        known = hashlib.sha256(b"%PDF-1.4 filing").hexdigest()
+        assert cache.key_for(str(tmp_path / "gone.pdf"), "v2", content_hash=known) == key
+        assert cache.load(key) is None
+
+        assert cache.store(key, self.frames, {"page_count": 2})
+        frames, meta = cache.load(key)
+
+        assert meta == {"page_count": 2}
+        assert frames["text_blocks"]["text"].tolist() == ["Overview", "Revenue grew"]
+        pd.testing.assert_frame_equal(frame_from_json(frames["tables"]["data"][0]), self.table)
+        assert cache.get_stats()["hits"] == 1 and cache.get_stats()["misses"] == 1
+
+    def test_corrupt_entry_is_discarded(self, tmp_path):
+        """Test an unreadable entry is treated as a miss and removed."""
+        cache = ExtractionCache(str(tmp_path), enabled=True)
+        cache.store("ab-v2", self.frames, {"page_count": 2})
+        entry = os.path.join(str(tmp_path), "ab", "ab-v2")
+        for name in os.listdir(entry):
+            if name != "manifest.json":
+                with open(os.path.join(entry, name), "wb") as f:
+                    f.write(b"garbage")
+
+        assert cache.load("ab-v2") is None
+        assert not os.path.exists(entry)
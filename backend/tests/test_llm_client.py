@@ -0,0 +1,113 @@
+"""
+Tests for the shared Gemini client against a local fake server.
+"""
+import pytest
+import asyncio
+import json
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.services.llm_client import GeminiClient, LLMError
+
+
+def candidate(text):
+    return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+
+class TestGeminiClient:
+    """Test retries, concurrency limits and streaming of GeminiClient."""
+
+    def setup_method(self):
+        """Setup a fake Gemini API whose failures are scripted per test."""
+        self.failures = []  # status codes returned before succeeding
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self.api_keys = set()
+
+        app = FastAPI()
+
+        @app.post("/v1beta/models/{model_action}")
+        async def generate(model_action: str, request: Request):
+            self.calls += 1
+            self.api_keys.add(request.headers.get("x-goog-api-key"))
+            if self.failures:
+                return JSONResponse({"error": "try again"}, status_code=self.failures.pop(0))
+
+            body = await request.json()
+            prompt = body["contents"][0]["parts"][0]["text"]
+            if model_action.endswith(":streamGenerateContent"):
+                async def events():
+                    for word in prompt.split():
+                        yield f"data: {json.dumps(candidate(word + ' '))}\n\n"
+                return StreamingResponse(events(), media_type="text/event-stream")
+
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            await asyncio.sleep(0.02)
+            self.active -= 1
+            return {**candidate(prompt.upper()), "usageMetadata": {"promptTokenCount": 3, "candidatesTokenCount": 3}}
+
+        self.transport = httpx.ASGITransport(app=app)
+
+    def client(self, **kwargs):
+        options = dict(
+            api_key="test-key", base_url="http://fake-gemini", model="fake-model",
+            requests_per_second=0, backoff_base=0.001, transport=self.transport
+        )
+        options.update(kwargs)
+        return GeminiClient(**options)
+
+    @pytest.mark.asyncio
+    async def test_generate(self):
+        """Test a plain generation round trip and its metrics."""
+        client = self.client()
+        response = await client.generate("net revenue rose")
+        await client.close()
+
+        assert response.text == "NET REVENUE ROSE"
+        assert response.model == "fake-model"
+        assert response.attempts == 1
+        assert self.api_keys == {"test-key"}
+        stats = client.get_stats()
+        assert stats["requests"] == 1
+        assert stats["prompt_tokens"] == 3
+        assert stats["latency_p95"] > 0
+
+    @pytest.mark.asyncio
+    async def test_retries_rate_limit_and_server_errors(self):
+        """Test 429/5xx are retried with backoff and 4xx are not."""
+        client = self.client(max_retries=3)
+        self.failures = [429, 503]
+        response = await client.generate("hello")
+        assert response.text == "HELLO"
+        assert response.attempts == 3
+        assert client.get_stats()["retries"] == 2
+
+        self.failures = [400]
+        with pytest.raises(LLMError) as error:
+            await client.generate("hello")
+        assert error.value.status_code == 400
+        assert self.calls == 4
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_concurrency_limit(self):
+        """Test in-flight requests never exceed max_concurrency."""
+        client = self.client(max_concurrency=2)
+        responses = await asyncio.gather(*(client.generate(f"q{i}") for i in range(6)))
+        await client.close()
+
+        assert [r.text for r in responses] == [f"Q{i}" for i in range(6)]
+        assert self.max_active == 2
+
+    @pytest.mark.asyncio
+    async def test_stream(self):
+        """Test streamed text arrives in pieces."""
+        client = self.client()
+        pieces = [text async for text in client.stream("cash flow improved")]
+        await client.close()
+
+        assert pieces == ["cash ", "flow ", "improved "]
@@ -0,0 +1,123 @@
+"""
+Tests for concurrent MD&A section generation.
+"""
+import pytest
+import asyncio
+from unittest.mock import Mock, patch
+
+for module in ("langchain", "langchain_google_genai", "prophet"):
+    pytest.importorskip(module)
+
+from app.services import md_a_generator as mda_module
+from app.services.llm_client import LLMError, LLMResponse
+from app.services.md_a_generator import MDAGenerator
+
+
+FINANCIAL_DATA = {
+    "revenue": [{"period": "Q2", "value": 1200.0}, {"period": "Q3", "value": 1500.0}],
+    "net_income": [{"period": "Q2", "value": 180.0}, {"period": "Q3", "value": 240.0}],
+}
+
+
+class StubLLM:
+    """Answers each MD&A prompt after a scripted delay, or hangs or fails on request."""
+
+    model = "stub-model"
+
+    def __init__(self, delays=None, hang=(), fail=()):
+        self.delays = delays or {}
+        self.hang = set(hang)
+        self.fail = set(fail)
+        self.finished = []
+
+    @staticmethod
+    def section(prompt):
+        for title in ("executive summary", "Results of Operations", "Liquidity and Capital Resources", "risk factors"):
+            if title in prompt:
+                return title
+        raise AssertionError("unexpected prompt")
+
+    async def generate(self, prompt, **kwargs):
+        title = self.section(prompt)
+        if title in self.hang:
+            await asyncio.sleep(60)
+        await asyncio.sleep(self.delays.get(title, 0.01))
+        if title in self.fail:
+            raise LLMError("Gemini returned 500: internal error", status_code=500)
+        self.finished.append(title)
+        return LLMResponse(text=f"Draft {title}.", model=self.model, latency=0.01)
+
+
+class TestSectionGeneration:
+    """Test timeouts, failure isolation and ordering of MD&A sections."""
+
+    def generator(self, llm, timeout=0.2, concurrency=4):
+        with patch.object(mda_module, "GoogleGenerativeAIEmbeddings", Mock()):
+            generator = MDAGenerator(llm_client=llm, rag_service=Mock())
+        generator.section_timeout = timeout
+        generator.section_concurrency = concurrency
+        return generator
+
+    def jobs(self, generator):
+        metrics = []
+        return [
+            ("Executive Summary", lambda: generator._generate_executive_summary(FINANCIAL_DATA, metrics, "Q3 2024")),
+            ("Results of Operations", lambda: generator._generate_results_of_operations(FINANCIAL_DATA, metrics, "Q3 2024")),
+            ("Liquidity and Capital Resources", lambda: generator._generate_liquidity_analysis(FINANCIAL_DATA, metrics, "Q3 2024")),
+            ("Risk Factors", lambda: generator._generate_risk_factors(FINANCIAL_DATA, {"industry": "Retail"}, "Q3 2024")),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_timed_out_section_is_reported_failed(self):
+        """Test a hanging LLM call is cut off at the section timeout and reported."""
+        llm = StubLLM(hang={"Results of Operations"})
+        generator = self.generator(llm, timeout=0.1)
+
+        sections, failed = await generator._generate_sections(self.jobs(generator))
+
+        assert [s.title for s in sections] == ["Executive Summary", "Liquidity and Capital Resources", "Risk Factors"]
+        assert failed == [{"section": "Results of Operations", "error": "timed out after 0.1s"}]
+
+    @pytest.mark.asyncio
+    async def test_failing_section_does_not_cancel_others(self):
+        """Test an LLM error in one section leaves the slower sections running to completion."""
+        llm = StubLLM(
+            delays={"Liquidity and Capital Resources": 0.0, "executive summary": 0.05, "risk factors": 0.05},
+            fail={"Liquidity and Capital Resources"}
+        )
+        generator = self.generator(llm)
+
+        sections, failed = await generator._generate_sections(self.jobs(generator))
+
+        assert len(sections) == 3
+        assert sorted(llm.finished) == ["Results of Operations", "executive summary", "risk factors"]
+        assert failed[0]["section"] == "Liquidity and Capital Resources"
+        assert "500" in failed[0]["error"]
+
+    @pytest.mark.asyncio
+    async def test_sections_keep_job_order(self):
+        """Test sections come back in job order even when they finish in reverse."""
+        llm = StubLLM(delays={
+            "executive summary": 0.08, "Results of Operations": 0.06,
+            "Liquidity and Capital Resources": 0.04, "risk factors": 0.02
+        })
+        generator = self.generator(llm)
+
+        sections, failed = await generator._generate_sections(self.jobs(generator))
+
+        assert llm.finished == ["risk factors", "Liquidity and Capital Resources", "Results of Operations", "executive summary"]
+        assert [s.title for s in sections] == [title for title, _ in self.jobs(generator)]
+        assert sections[0].content == "Draft executive summary."
+        assert failed == []
+
+    @pytest.mark.asyncio
+    async def test_draft_is_partial_when_a_section_fails(self):
+        """Test the full draft keeps the generated sections and lists the failed one."""
+        generator = self.generator(StubLLM(hang={"risk factors"}), timeout=0.1)
+
+        result = await generator.generate_md_a_draft(FINANCIAL_DATA, {"name": "Acme", "industry": "Retail"})
+
+        assert result["success"] and result["partial"]
+        assert [f["section"] for f in result["failed_sections"]] == ["Risk Factors"]
+        assert len(result["sections"]) == 3
+        assert "Draft executive summary." in result["md_a_draft"]
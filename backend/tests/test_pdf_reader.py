@@ -0,0 +1,174 @@
+"""
+Tests for table detection in the enhanced PDF reader.
+"""
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pandas as pd
+
+for module in ("fitz", "camelot", "tabula", "pdfplumber", "cv2", "pytesseract", "PIL"):
+    pytest.importorskip(module)
+
+from app.config import settings
+from app.services.enhanced_pdf_reader import EnhancedPDFReader, FinancialTable, TextBlock
+
+
+def point(x, y):
+    return SimpleNamespace(x=x, y=y)
+
+
+def rect(width, height):
+    return SimpleNamespace(width=width, height=height)
+
+
+class FakePage:
+    """Page exposing only the vector drawings the classifier reads."""
+
+    number = 0
+
+    def __init__(self, items=(), error=None):
+        self.items = list(items)
+        self.error = error
+
+    def get_drawings(self):
+        if self.error:
+            raise self.error
+        return [{"items": self.items}]
+
+
+def blocks(*block_types):
+    return [TextBlock(0, "text", {}, {}, block_type) for block_type in block_types]
+
+
+def table(method, confidence, rows):
+    return FinancialTable(
+        page_number=0,
+        table_type=method,
+        data=pd.DataFrame(rows[1:], columns=rows[0]),
+        confidence=confidence,
+        coordinates={},
+        metadata={"method": method}
+    )
+
+
+INCOME = [["Item", "2023", "2024"], ["Revenue", "1,200", "1,500"], ["Net income", "180", "240"]]
+BALANCE = [["Item", "2024"], ["Cash", "310"], ["Debt", "95"]]
+
+
+class TestTablePageClassification:
+    """Test the cheap pre-check deciding which pages get table extractors."""
+
+    def setup_method(self):
+        """Setup reader."""
+        self.reader = EnhancedPDFReader()
+
+    def test_ruled_page_is_candidate(self):
+        """Test ruling lines and thin rectangles mark a page as a ruled table candidate."""
+        lines = [("l", point(0, y), point(100, y)) for y in (10, 20, 30)]
+        lines += [("re", rect(1, 30)), ("re", rect(1, 30))]
+
+        profile = self.reader._classify_table_page(FakePage(lines), blocks("paragraph"))
+
+        assert profile["candidate"] and profile["ruled"]
+        assert profile["horizontal_rules"] == 3 and profile["vertical_rules"] == 2
+
+    def test_numeric_text_without_rules_is_candidate(self):
+        """Test a page of mostly numeric blocks is a candidate but not ruled."""
+        profile = self.reader._classify_table_page(
+            FakePage(), blocks("table_data", "financial_data", "paragraph")
+        )
+
+        assert profile["candidate"] and not profile["ruled"]
+        assert profile["numeric_ratio"] == pytest.approx(2 / 3)
+
+    def test_prose_page_is_skipped(self):
+        """Test a prose page is not a candidate even when drawings cannot be read."""
+        page = FakePage(error=RuntimeError("bad drawing"))
+
+        profile = self.reader._classify_table_page(page, blocks("paragraph", "heading"))
+
+        assert not profile["candidate"]
+        assert profile["horizontal_rules"] == 0
+
+
+class TestTableExtractionCascade:
+    """Test extractors run cheapest-first with stubbed extractors."""
+
+    def setup_method(self):
+        """Setup reader whose extractors return scripted tables."""
+        self.reader = EnhancedPDFReader()
+        self.calls = []
+        self.results = {}
+        self.reader._run_table_extractor = self.run_extractor
+        self.patcher = patch.object(settings, "table_extractors", ["pdfplumber", "camelot", "tabula"])
+        self.patcher.start()
+
+    def teardown_method(self):
+        """Restore extractor settings."""
+        self.patcher.stop()
+
+    def run_extractor(self, method, pdf_path, page_num, plumber_pdf=None):
+        self.calls.append(method)
+        result = self.results.get(method, [])
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def profile(self, candidate=True, ruled=True):
+        return {"candidate": candidate, "ruled": ruled}
+
+    def test_stops_at_first_confident_extractor(self):
+        """Test later extractors are skipped once a table is confident enough."""
+        self.results = {
+            "pdfplumber": [table("pdfplumber", 0.4, BALANCE)],
+            "camelot": [table("camelot", 0.9, INCOME)],
+            "tabula": [table("tabula", 0.95, INCOME)],
+        }
+
+        tables = self.reader._extract_page_tables("report.pdf", 0, self.profile())
+
+        assert self.calls == ["pdfplumber", "camelot"]
+        assert sorted(t.table_type for t in tables) == ["camelot", "pdfplumber"]
+
+    def test_camelot_needs_ruled_page(self):
+        """Test lattice extraction is skipped on pages without ruling lines."""
+        self.reader._extract_page_tables("report.pdf", 0, self.profile(ruled=False))
+
+        assert self.calls == ["pdfplumber", "tabula"]
+
+    def test_failing_extractor_falls_through(self):
+        """Test an extractor that raises is recorded and the next one is tried."""
+        self.results = {
+            "pdfplumber": RuntimeError("broken page"),
+            "camelot": [table("camelot", 0.8, INCOME)],
+        }
+
+        tables = self.reader._extract_page_tables("report.pdf", 0, self.profile())
+
+        assert self.calls == ["pdfplumber", "camelot"]
+        assert [t.table_type for t in tables] == ["camelot"]
+        stats = self.reader.get_table_stats()
+        assert stats["extractors"]["pdfplumber"]["calls"] == 1
+        assert stats["extractors"]["pdfplumber"]["tables"] == 0
+
+    def test_non_candidate_page_runs_nothing(self):
+        """Test pages the classifier rejected never reach an extractor."""
+        assert self.reader._extract_page_tables("report.pdf", 0, self.profile(candidate=False)) == []
+        assert self.calls == []
+        assert self.reader.get_table_stats()["pages_scanned"] == 1
+
+    def test_overlapping_tables_are_deduplicated(self):
+        """Test the same table found by two extractors is kept once, at the higher confidence."""
+        self.results = {
+            "pdfplumber": [table("pdfplumber", 0.5, INCOME), table("pdfplumber", 0.6, BALANCE)],
+            "tabula": [table("tabula", 0.7, INCOME)],
+        }
+
+        tables = self.reader._extract_page_tables("report.pdf", 0, self.profile(ruled=False))
+
+        assert len(tables) == 2
+        income = next(t for t in tables if "Revenue" in t.data["Item"].tolist())
+        assert income.table_type == "tabula"
+        assert income.metadata["also_found_by"] == ["pdfplumber"]
+        assert self.reader.get_table_stats()["duplicates_removed"] == 1
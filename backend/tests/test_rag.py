@@ -0,0 +1,824 @@
+"""
+Tests for shared RAG infrastructure.
+"""
+import asyncio
+import threading
+import time
+import pytest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from types import SimpleNamespace
+
+from app.services import embedding_registry as registry_module
+from app.services.embedding_registry import EmbeddingRegistry
+from app.services.embedding_batcher import MicroBatchEmbedder
+from app.services.cache_service import TTLCache, QueryEmbeddingCache, RetrievalCache, ResponseCache
+from app.services.prompt_packer import PromptPacker, split_context, count_tokens
+from app.services.rag_service import RAGService
+from app.services.text_chunker import TextChunk, iter_text_chunks, iter_structured_chunks, iter_page_chunks, chunk_text
+from app.utils.helpers import iterate_in_thread
+from app.services.lexical_index import BM25Index, reciprocal_rank_fusion
+from app.services.reranker import CrossEncoderReranker
+
+
+class FakeEncoder:
+    """Minimal stand-in for SentenceTransformer."""
+
+    instances = 0
+
+    def __init__(self, model_name: str, dim: int = 8):
+        FakeEncoder.instances += 1
+        self.model_name = model_name
+        self.dim = dim
+        self.encode_calls = []
+
+    def encode(self, texts, **kwargs):
+        self.encode_calls.append(list(texts))
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            vectors[i, len(text) % self.dim] = 1.0
+        return vectors
+
+
+class FakeCollection:
+    """In-memory stand-in for a Chroma collection."""
+
+    name = "fake"
+
+    def __init__(self):
+        self.rows = {}
+
+    def _matches(self, metadata, where):
+        for field, condition in (where or {}).items():
+            if isinstance(condition, dict) and "$in" in condition:
+                if metadata.get(field) not in condition["$in"]:
+                    return False
+            elif metadata.get(field) != condition:
+                return False
+        return True
+
+    def get(self, ids=None, where=None, include=None):
+        selected = [
+            (row_id, row) for row_id, row in self.rows.items()
+            if (ids is None or row_id in ids) and self._matches(row["metadata"], where)
+        ]
+        return {
+            "ids": [row_id for row_id, _ in selected],
+            "embeddings": [row["embedding"] for _, row in selected],
+            "documents": [row["document"] for _, row in selected],
+            "metadatas": [row["metadata"] for _, row in selected],
+        }
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        for row_id, embedding, document, metadata in zip(ids, embeddings, documents, metadatas):
+            self.rows[row_id] = {"embedding": embedding, "document": document, "metadata": dict(metadata)}
+
+    add = upsert
+
+    def get_in_shard(self, document_id, metadata=None, where=None, include=None):
+        return self.get(where=where, include=include)
+
+    def update(self, ids, metadatas):
+        for row_id, metadata in zip(ids, metadatas):
+            self.rows[row_id]["metadata"] = dict(metadata)
+
+    def delete(self, ids):
+        for row_id in ids:
+            self.rows.pop(row_id, None)
+
+    def count(self):
+        return len(self.rows)
+
+    def query(self, query_embeddings, n_results=10, where=None):
+        self.query_calls = getattr(self, "query_calls", 0) + 1
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for embedding in query_embeddings:
+            query = np.asarray(embedding, dtype=np.float32)
+            scored = []
+            for row_id, row in self.rows.items():
+                if self._matches(row["metadata"], where):
+                    vector = np.asarray(row["embedding"], dtype=np.float32)
+                    similarity = float(query @ vector / max(np.linalg.norm(query) * np.linalg.norm(vector), 1e-12))
+                    scored.append((1 - similarity, row_id, row))
+            scored.sort(key=lambda item: item[0])
+            scored = scored[:n_results]
+            results["ids"].append([row_id for _, row_id, _ in scored])
+            results["documents"].append([row["document"] for _, _, row in scored])
+            results["metadatas"].append([row["metadata"] for _, _, row in scored])
+            results["distances"].append([distance for distance, _, _ in scored])
+        return results
+
+
+def make_rag_service(encoder=None, collection=None):
+    """Build a RAGService wired to fakes instead of Chroma/SentenceTransformer."""
+    service = RAGService.__new__(RAGService)
+    service.client = None
+    service.embedding_model = encoder or FakeEncoder("fake")
+    service.collection = collection or FakeCollection()
+    service.lexical_index = BM25Index()
+    service._released = True
+    return service
+
+
+class TestEmbeddingRegistry:
+    """Test process-wide embedding model registry."""
+
+    def setup_method(self):
+        """Setup fresh registry with fake model loader."""
+        FakeEncoder.instances = 0
+        self.registry = EmbeddingRegistry()
+        self.patcher = patch.object(registry_module, "SentenceTransformer", FakeEncoder)
+        self.patcher.start()
+
+    def teardown_method(self):
+        """Restore model loader."""
+        self.patcher.stop()
+
+    def test_model_loaded_once(self):
+        """Test equivalent model names share one instance."""
+        first = self.registry.get_model("sentence-transformers/all-MiniLM-L6-v2")
+        second = self.registry.get_model("all-MiniLM-L6-v2")
+
+        assert first is second
+        assert FakeEncoder.instances == 1
+        metrics = self.registry.get_metrics()
+        assert "all-MiniLM-L6-v2" in metrics["models"]
+        assert metrics["models"]["all-MiniLM-L6-v2"]["load_time_seconds"] >= 0
+
+    def test_concurrent_loading(self):
+        """Test concurrent first use loads the model only once."""
+        threads = [
+            threading.Thread(target=self.registry.get_model, args=("model-a",))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert FakeEncoder.instances == 1
+
+    def test_refcount_and_unload_idle(self):
+        """Test referenced models survive unload_idle."""
+        self.registry.acquire_model("model-a")
+        self.registry.get_model("model-b")
+
+        assert self.registry.unload_idle() == ["model-b"]
+        assert self.registry.get_metrics()["models"]["model-a"]["refcount"] == 1
+
+        self.registry.release_model("model-a")
+        assert self.registry.unload_idle() == ["model-a"]
+
+
+class TestMicroBatchEmbedder:
+    """Test micro-batching query embedder."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_queries_are_batched(self):
+        """Test concurrent embeds share encode calls."""
+        encoder = FakeEncoder("fake")
+        embedder = MicroBatchEmbedder(max_batch_size=16, max_wait_ms=20, num_workers=1, encoder=encoder)
+
+        try:
+            queries = [f"query {'x' * i}" for i in range(10)]
+            vectors = await asyncio.gather(*(embedder.embed(q) for q in queries))
+        finally:
+            await embedder.stop()
+
+        assert len(vectors) == 10
+        assert len(encoder.encode_calls) < 10
+        for query, vector in zip(queries, vectors):
+            assert vector.dtype == np.float32
+            assert vector[len(query) % encoder.dim] == 1.0
+
+    @pytest.mark.asyncio
+    async def test_max_batch_size_respected(self):
+        """Test batches never exceed max_batch_size."""
+        encoder = FakeEncoder("fake")
+        embedder = MicroBatchEmbedder(max_batch_size=3, max_wait_ms=20, num_workers=1, encoder=encoder)
+
+        try:
+            await embedder.embed_many([f"q{i}" for i in range(7)])
+        finally:
+            await embedder.stop()
+
+        assert max(len(call) for call in encoder.encode_calls) <= 3
+        assert embedder.get_stats()["batches"] >= 3
+
+    @pytest.mark.asyncio
+    async def test_encode_errors_propagate(self):
+        """Test encoder failures reach every waiting caller."""
+        class BrokenEncoder:
+            def encode(self, texts, **kwargs):
+                raise RuntimeError("model unavailable")
+
+        embedder = MicroBatchEmbedder(max_batch_size=4, max_wait_ms=5, encoder=BrokenEncoder())
+        try:
+            with pytest.raises(RuntimeError):
+                await embedder.embed("what is the current ratio")
+        finally:
+            await embedder.stop()
+
+    def test_restart_on_new_loop_releases_old_pool(self):
+        """Test moving to a new event loop shuts down the previous loop's thread pool."""
+        embedder = MicroBatchEmbedder(max_batch_size=4, max_wait_ms=5, num_workers=1, encoder=FakeEncoder("fake"))
+
+        asyncio.run(embedder.embed("first"))
+        first_pool = embedder._executor
+        try:
+            asyncio.run(embedder.embed("second"))
+            assert embedder._executor is not first_pool
+            assert first_pool._shutdown
+            assert len(embedder._workers) == 1
+        finally:
+            asyncio.run(embedder.stop())
+        assert embedder._executor is None and embedder._workers == []
+
+
+class TestQueryEmbeddingCache:
+    """Test query embedding LRU/TTL cache."""
+
+    def test_normalized_queries_share_entry(self):
+        """Test whitespace/case/punctuation variants hit the same entry."""
+        cache = QueryEmbeddingCache(max_entries=10, ttl_seconds=60)
+        cache.set_embedding("What is the current ratio?", "model", np.ones(4))
+
+        cached = cache.get_embedding("  what is the   CURRENT ratio ", "model")
+
+        assert cached is not None
+        assert cached.dtype == np.float32
+        assert cache.get_embedding("what is the current ratio", "other-model") is None
+        assert cache.get_stats()["hits"] == 1
+        assert cache.get_stats()["misses"] == 1
+
+    def test_lru_eviction(self):
+        """Test least recently used entry is evicted first."""
+        cache = TTLCache(max_entries=2, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_ttl_expiry(self):
+        """Test entries expire after ttl_seconds."""
+        cache = TTLCache(max_entries=2, ttl_seconds=10)
+        with patch("app.services.cache_service.time.monotonic", return_value=100.0):
+            cache.set("a", 1)
+        with patch("app.services.cache_service.time.monotonic", return_value=111.0):
+            assert cache.get("a") is None
+        assert cache.get_stats()["expirations"] == 1
+
+
+class TestRetrievalCache:
+    """Test retrieval result cache invalidation."""
+
+    def setup_method(self):
+        """Setup cache with one cached result per scope."""
+        self.cache = RetrievalCache(max_entries=10, ttl_seconds=60)
+        self.result = {"context": "[Context 1]: Revenue grew 10%", "citations": []}
+
+    def test_hit_returns_copy(self):
+        """Test cached results are isolated from caller mutation."""
+        key = self.cache.make_key("Revenue growth?", 1, 5)
+        self.cache.set_result(key, self.result)
+
+        cached = self.cache.get_result(self.cache.make_key("revenue growth", 1, 5))
+        cached["citations"].append({"chunk_index": 0})
+
+        assert self.cache.get_result(key)["citations"] == []
+
+    def test_document_change_invalidates_scoped_and_global(self):
+        """Test reindexing a document invalidates its own and global entries only."""
+        doc_1 = self.cache.make_key("revenue", 1, 5)
+        doc_2 = self.cache.make_key("revenue", 2, 5)
+        everything = self.cache.make_key("revenue", None, 5)
+        for key in (doc_1, doc_2, everything):
+            self.cache.set_result(key, self.result)
+
+        self.cache.invalidate_document(1)
+
+        assert self.cache.get_result(self.cache.make_key("revenue", 1, 5)) is None
+        assert self.cache.get_result(self.cache.make_key("revenue", None, 5)) is None
+        assert self.cache.get_result(self.cache.make_key("revenue", 2, 5)) is not None
+
+    def test_top_k_is_part_of_key(self):
+        """Test different top_k values are cached separately."""
+        self.cache.set_result(self.cache.make_key("revenue", 1, 5), self.result)
+        assert self.cache.get_result(self.cache.make_key("revenue", 1, 10)) is None
+
+
+class TestResponseCache:
+    """Test semantic chat answer cache."""
+
+    def setup_method(self):
+        """Setup cache holding one answer for document 1."""
+        self.cache = ResponseCache(max_entries=2, ttl_seconds=60, similarity_threshold=0.95)
+        self.context = "[Context 1]: Revenue grew 10%"
+        self.answer = {"response": "Revenue grew 10%.", "citations": [{"source": "document_context"}]}
+        self.cache.store([1.0, 0.0, 0.0], 1, self.context, self.answer)
+
+    def test_near_duplicate_hits_in_same_scope(self):
+        """Test similar questions hit; other documents, contexts and topics miss."""
+        cached = self.cache.lookup([0.99, 0.05, 0.0], 1, self.context)
+        assert cached == self.answer
+        cached["citations"].clear()
+        assert self.cache.lookup([1.0, 0.0, 0.0], 1, self.context) == self.answer
+
+        assert self.cache.lookup([1.0, 0.0, 0.0], 2, self.context) is None
+        assert self.cache.lookup([1.0, 0.0, 0.0], 1, "[Context 1]: Revenue fell") is None
+        assert self.cache.lookup([0.7, 0.7, 0.0], 1, self.context) is None
+
+    def test_reindex_invalidates_and_lru_evicts(self):
+        """Test document invalidation and least-recently-used eviction."""
+        self.cache.store([0.0, 1.0, 0.0], 2, self.context, self.answer)
+        self.cache.lookup([1.0, 0.0, 0.0], 1, self.context)
+        self.cache.store([0.0, 0.0, 1.0], 3, self.context, self.answer)
+        assert self.cache.lookup([0.0, 1.0, 0.0], 2, self.context) is None
+
+        self.cache.invalidate_document(1)
+        assert self.cache.lookup([1.0, 0.0, 0.0], 1, self.context) is None
+        assert self.cache.lookup([0.0, 0.0, 1.0], 3, self.context) is not None
+
+    def test_closest_answer_in_scope_wins_and_index_follows_eviction(self):
+        """Test the best match within a scope is returned and evicted answers leave the index."""
+        close = {"response": "Close match."}
+        self.cache.store([0.98, 0.2, 0.0], 1, self.context, close)
+        assert self.cache.lookup([0.97, 0.22, 0.0], 1, self.context) == close
+
+        self.cache.store([0.0, 1.0, 0.0], 2, self.context, self.answer)
+        assert len(self.cache) == 2
+        assert sum(len(keys) for keys in self.cache._scopes.values()) == 2
+        assert self.cache.lookup([1.0, 0.0, 0.0], 1, self.context) == close
+
+        self.cache.clear()
+        assert self.cache._scopes == {}
+
+
+class TestPromptPacker:
+    """Test token-budgeted packing of retrieved context."""
+
+    def setup_method(self):
+        """Setup overlapping chunks and two chunks of one table."""
+        self.packer = PromptPacker(context_token_budget=10000, min_overlap_chars=40)
+        text = " ".join(f"Sentence {i} says revenue was {i * 100} in segment {i % 7}." for i in range(60))
+        chunks = chunk_text(text, chunk_size=500, overlap=200)
+        tables = [
+            "Segment | 2024 | 2023\nProduct A  |  1,000.00 | 900.00",
+            "Segment | 2024 | 2023\nProduct B | 2,000.00 | 1,800.00",
+        ]
+        self.context = "\n\n".join(
+            f"[Context {i + 1}]: {passage}" for i, passage in enumerate(chunks[:3] + tables)
+        )
+
+    def test_overlap_and_table_compression(self):
+        """Test shared chunk text and repeated table headers are emitted once."""
+        result = self.packer.pack_context(self.context)
+        passages = split_context(result.text)
+
+        assert [label for label, _ in passages] == [f"[Context {i}]: " for i in range(1, 6)]
+        for (_, left), (_, right) in zip(passages[:2], passages[1:3]):
+            assert left.split(". ")[-1] not in right
+        assert passages[3][1] == "Segment|2024|2023\nProduct A|1,000|900"
+        assert passages[4][1] == "Product B|2,000|1,800"
+        assert result.tokens_saved > 0
+
+    def test_budget_keeps_most_relevant(self):
+        """Test packing stops at the budget, cutting at a sentence boundary."""
+        result = self.packer.pack_context(self.context, token_budget=150)
+
+        assert result.tokens_after <= 150
+        assert result.text.startswith("[Context 1]: ")
+        assert result.text.endswith(".")
+        assert result.truncated + result.dropped > 0
+
+    def test_count_tokens(self):
+        """Test token counts are empty-safe, grow with text and back the packing stats."""
+        assert count_tokens("") == 0
+        assert 0 < count_tokens("Revenue grew.") < count_tokens("Revenue grew 10% to $1,200 million.")
+
+        result = self.packer.pack_context(self.context)
+        assert result.tokens_before == count_tokens(self.context)
+        assert result.tokens_after == count_tokens(result.text)
+
+
+class TestStreamingChunker:
+    """Test generator-based chunker."""
+
+    def setup_method(self):
+        """Setup sample filing text."""
+        sentences = ["Revenue grew 12% year over year.", "Operating costs were flat.", "Liquidity remains strong."]
+        self.text = " ".join(sentences[i % 3] for i in range(400))
+
+    def test_offsets_match_source(self):
+        """Test each chunk maps back to its source offsets."""
+        chunks = list(iter_text_chunks(self.text, chunk_size=500, overlap=100))
+
+        assert len(chunks) > 1
+        assert [chunk.index for chunk in chunks] == list(range(len(chunks)))
+        for chunk in chunks:
+            assert len(chunk.text) <= 500
+            assert self.text[chunk.start:chunk.end].strip() == chunk.text
+        assert chunks[-1].end == len(self.text)
+
+    def test_segments_match_single_string(self):
+        """Test streaming page segments yields the same chunks as one string."""
+        pages = [self.text[i:i + 333] for i in range(0, len(self.text), 333)]
+
+        assert [c.text for c in iter_text_chunks(pages)] == chunk_text(self.text)
+
+    def test_short_and_empty_text(self):
+        """Test short text is one chunk and empty text yields nothing."""
+        assert chunk_text("Net income rose.") == ["Net income rose."]
+        assert chunk_text("") == []
+
+
+class TestStructuredChunker:
+    """Test section- and table-aligned chunking."""
+
+    def setup_method(self):
+        """Setup parsed PDF structure."""
+        block = lambda text, block_type, page: SimpleNamespace(text=text, block_type=block_type, page_number=page)
+        self.blocks = [
+            block("Results of Operations", "heading", 0),
+            block("Revenue increased due to higher volume. " * 5, "paragraph", 0),
+            block("Net revenue 2024 1,200 1,050", "table_data", 0),
+            block("Cost of sales 2024 700 650", "table_data", 0),
+            block("Liquidity and Capital Resources", "heading", 1),
+            block("Cash provided by operations remained strong. " * 3, "paragraph", 1),
+        ]
+        rows = pd.DataFrame({"Item": [f"Line {i}" for i in range(40)], "2024": range(40)})
+        self.tables = [SimpleNamespace(page_number=1, data=rows)]
+
+    def test_sections_pages_and_types(self):
+        """Test chunks carry section, page and type and never mix prose with rows."""
+        chunks = list(iter_structured_chunks(self.blocks, self.tables, max_chunk_size=300))
+
+        first = chunks[0]
+        assert first.text.startswith("Results of Operations")
+        assert first.section == "Results of Operations"
+        assert first.chunk_type == "text" and first.page_number == 0
+
+        row_chunk = next(c for c in chunks if "Net revenue" in c.text)
+        assert row_chunk.chunk_type == "table"
+        assert "Cost of sales" in row_chunk.text
+        assert "Revenue increased" not in row_chunk.text
+
+        liquidity = [c for c in chunks if c.page_number == 1]
+        assert all(c.section == "Liquidity and Capital Resources" for c in liquidity)
+
+    def test_tables_split_on_rows_with_header(self):
+        """Test large tables split between rows and repeat the header."""
+        chunks = [c for c in iter_structured_chunks(self.blocks, self.tables, max_chunk_size=200)
+                  if c.chunk_type == "table" and "Item | 2024" in c.text]
+
+        assert len(chunks) > 1
+        rows = [line for c in chunks for line in c.text.split("\n") if line.startswith("Line ")]
+        assert rows == [f"Line {i} | {i}" for i in range(40)]
+
+
+    def test_page_stream_matches_whole_document(self):
+        """Test chunking page by page gives the same chunks as the whole document."""
+        pages = [
+            (page, [b for b in self.blocks if b.page_number == page], [t for t in self.tables if t.page_number == page])
+            for page in (0, 1)
+        ]
+
+        streamed = list(iter_page_chunks(iter(pages), max_chunk_size=300))
+
+        assert streamed == list(iter_structured_chunks(self.blocks, self.tables, max_chunk_size=300))
+
+
+class TestIncrementalIndexing:
+    """Test hash-based incremental re-indexing."""
+
+    def setup_method(self):
+        """Setup service over an in-memory collection."""
+        self.encoder = FakeEncoder("fake")
+        self.service = make_rag_service(encoder=self.encoder)
+        self.paragraphs = [f"Paragraph {i} discusses revenue drivers in detail." * 12 for i in range(6)]
+
+    def _embedded_texts(self):
+        return sum(len(call) for call in self.encoder.encode_calls)
+
+    @pytest.mark.asyncio
+    async def test_unchanged_document_is_not_reembedded(self):
+        """Test re-indexing identical content embeds nothing."""
+        content = "\n".join(self.paragraphs)
+        first = await self.service.index_document(1, content, {"file_type": "pdf"})
+        embedded = self._embedded_texts()
+
+        second = await self.service.index_document(1, content, {"file_type": "pdf"})
+
+        assert first["success"] and second["success"]
+        assert first["embedded_chunks"] == first["total_chunks"] == embedded
+        assert second["embedded_chunks"] == 0
+        assert second["reused_chunks"] == second["total_chunks"]
+        assert self._embedded_texts() == embedded
+
+    @pytest.mark.asyncio
+    async def test_revised_document_embeds_only_changes(self):
+        """Test only changed chunks are embedded and orphans deleted."""
+        await self.service.index_document(1, "\n".join(self.paragraphs), {})
+        revised = self.paragraphs[:-1] + ["A brand new risk factor paragraph." * 30]
+
+        report = await self.service.index_document(1, "\n".join(revised), {})
+
+        assert 0 < report["embedded_chunks"] < report["total_chunks"]
+        assert report["deleted_chunks"] > 0
+        assert self.service.collection.count() == report["total_chunks"]
+        indexes = sorted(row["metadata"]["chunk_index"] for row in self.service.collection.rows.values())
+        assert indexes == list(range(report["total_chunks"]))
+
+    @pytest.mark.asyncio
+    async def test_identical_chunks_reused_across_documents(self):
+        """Test a chunk already embedded for another document is copied, not re-encoded."""
+        content = "\n".join(self.paragraphs)
+        await self.service.index_document(1, content, {})
+        embedded = self._embedded_texts()
+
+        report = await self.service.index_document(2, content, {})
+
+        assert report["embedded_chunks"] == 0
+        assert self._embedded_texts() == embedded
+        assert self.service.collection.count() == 2 * report["total_chunks"]
+
+    @pytest.mark.asyncio
+    async def test_streamed_chunks_indexed_as_produced(self):
+        """Test async chunk streams are indexed batch by batch while still being produced."""
+        produced = []
+
+        def parse_pages():
+            for chunk in iter_text_chunks("\n".join(self.paragraphs * 3)):
+                produced.append(chunk.index)
+                yield chunk
+
+        sink_calls = []
+        with patch("app.services.rag_service.settings.index_batch_size", 2):
+            report = await self.service.index_document(
+                4, "", {}, chunks=iterate_in_thread(parse_pages()),
+                chunk_sink=lambda records: sink_calls.append(len(produced))
+            )
+
+        assert report["success"] and report["batches"] > 2
+        assert report["total_chunks"] == len(produced)
+        # The first batch was written long before the producer finished
+        assert sink_calls[0] < len(produced)
+
+    @pytest.mark.asyncio
+    async def test_large_document_written_in_batches(self):
+        """Test chunks are embedded and written in bounded batches."""
+        content = iter([p + "\n" for p in self.paragraphs * 10])
+        with patch("app.services.rag_service.settings.index_batch_size", 4):
+            report = await self.service.index_document(3, content, {})
+
+        assert report["success"]
+        assert report["batches"] > 1
+        assert max(len(call) for call in self.encoder.encode_calls) <= 4
+
+    @pytest.mark.asyncio
+    async def test_failure_is_reported_not_raised(self):
+        """Test a failed index returns an unsuccessful report carrying the error."""
+        with patch.object(self.service.collection, "get", side_effect=RuntimeError("vector store unavailable")):
+            report = await self.service.index_document(5, "\n".join(self.paragraphs), {})
+
+        assert report["success"] is False
+        assert report["error"] == "vector store unavailable"
+        assert report["total_chunks"] == 0
+
+    @pytest.mark.asyncio
+    async def test_structured_chunks_metadata_and_sink(self):
+        """Test structural fields reach chunk metadata and the chunk sink."""
+        block = SimpleNamespace(text="Revenue grew strongly.", block_type="paragraph", page_number=2)
+        heading = SimpleNamespace(text="Overview", block_type="heading", page_number=2)
+        records = []
+
+        report = await self.service.index_document(
+            4, "", {"file_type": "pdf"},
+            chunks=iter_structured_chunks([heading, block]),
+            chunk_sink=records.extend
+        )
+
+        assert report["total_chunks"] == 1
+        metadata = records[0]["metadata"]
+        assert metadata["page_number"] == 2
+        assert metadata["section"] == "Overview"
+        assert metadata["chunk_type"] == "text"
+        assert "char_start" not in metadata
+        assert records[0]["id"] in self.service.collection.rows
+
+
+class TestHybridRetrieval:
+    """Test BM25 index and hybrid retrieval."""
+
+    def setup_method(self):
+        """Setup service and chunk texts."""
+        self.service = make_rag_service()
+        self.texts = [
+            "Operating income improved on lower costs.",
+            "Adjusted EBITDA for Q3 2024 was $412 million.",
+            "The company repurchased shares during the year.",
+        ]
+
+    def test_exact_tokens_rank_first(self):
+        """Test rare exact terms like EBITDA and quarter labels are matched."""
+        index = BM25Index()
+        for i, text in enumerate(self.texts):
+            index.add(1, f"c{i}", text)
+
+        assert index.search("EBITDA Q3 2024")[0][0] == "c1"
+        assert index.search("ebitda", document_ids=[2]) == []
+
+    def test_persistence_and_document_removal(self, tmp_path):
+        """Test per-document files reload and are removed with the document."""
+        index = BM25Index(str(tmp_path))
+        index.add(1, "a", self.texts[1])
+        index.add(2, "b", self.texts[2])
+        index.persist_document(1)
+        index.persist_document(2)
+
+        reloaded = BM25Index(str(tmp_path))
+        assert len(reloaded) == 2
+        assert reloaded.search("EBITDA")[0][0] == "a"
+
+        reloaded.remove_document(1)
+        assert "a" not in reloaded
+        assert len(BM25Index(str(tmp_path))) == 1
+
+    def test_reciprocal_rank_fusion(self):
+        """Test items ranked well in both lists win."""
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+        assert fused[0][0] == "b"
+        assert {item for item, _ in fused} == {"a", "b", "c", "d"}
+
+    @pytest.mark.asyncio
+    async def test_index_updates_lexical_index(self):
+        """Test indexing and deletion keep the BM25 index in step."""
+        await self.service.index_document(1, " ".join(self.texts), {})
+        assert len(self.service.lexical_index) == self.service.collection.count()
+
+        await self.service.delete_document(1)
+        assert len(self.service.lexical_index) == 0
+
+    @pytest.mark.asyncio
+    async def test_hybrid_surfaces_lexical_match(self):
+        """Test a chunk missed by the dense ranking is recovered by BM25."""
+        for i, text in enumerate(self.texts):
+            await self.service.index_document(i + 1, text, {})
+
+        async def embed_query(query):
+            # Points at the "repurchased shares" chunk, away from the EBITDA one
+            return [self.service.embedding_model.encode([self.texts[2]])[0].tolist()]
+
+        self.service._embed_query = embed_query
+        result = await self.service.retrieve_hybrid("EBITDA Q3 2024", top_k=2, candidate_k=1)
+
+        assert result["retrieval_mode"] == "hybrid"
+        sources = [c["content"] for c in result["citations"]]
+        assert self.texts[1] in sources
+        ebitda = next(c for c in result["citations"] if c["content"] == self.texts[1])
+        assert ebitda["lexical_rank"] == 1 and ebitda["dense_rank"] is None
+
+
+class KeywordScorer:
+    """Cross-encoder stand-in scoring passages by query-word overlap."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+
+    def predict(self, pairs, **kwargs):
+        self.batches.append(len(pairs))
+        if self.delay:
+            time.sleep(self.delay)
+        return [len(set(q.lower().split()) & set(p.lower().split())) for q, p in pairs]
+
+
+class TestReranker:
+    """Test cross-encoder reranking and its latency budget."""
+
+    @pytest.mark.asyncio
+    async def test_reorders_in_batches(self):
+        """Test candidates are scored in batches and cut to top_k."""
+        scorer = KeywordScorer()
+        reranker = CrossEncoderReranker(batch_size=2, budget_ms=1000, scorer=scorer)
+        passages = ["cash flow", "net revenue growth", "revenue", "debt"]
+
+        ranking = await reranker.rerank("net revenue growth", passages, top_k=2)
+
+        assert ranking["reranked"]
+        assert ranking["order"] == [1, 2]
+        assert scorer.batches == [2, 2]
+        assert reranker.get_stats()["pairs_scored"] == 4
+
+    @pytest.mark.asyncio
+    async def test_budget_exceeded_keeps_vector_order(self):
+        """Test a slow model falls back to the original order."""
+        reranker = CrossEncoderReranker(batch_size=1, budget_ms=20, scorer=KeywordScorer(delay=0.05))
+
+        ranking = await reranker.rerank("revenue", ["a", "b", "revenue"], top_k=2)
+
+        assert not ranking["reranked"] and ranking["timed_out"]
+        assert ranking["order"] == [0, 1]
+        assert reranker.get_stats()["timeouts"] == 1
+
+    @pytest.mark.asyncio
+    async def test_abandoned_batch_does_not_stall_later_requests(self):
+        """Test requests fall back at once while a timed-out batch still occupies the pool."""
+        reranker = CrossEncoderReranker(batch_size=2, budget_ms=20, num_workers=1, scorer=KeywordScorer(delay=0.2))
+        first = await reranker.rerank("revenue", ["a", "revenue"], top_k=1)
+        assert first["timed_out"]
+
+        start = time.perf_counter()
+        second = await reranker.rerank("revenue", ["a", "revenue"], top_k=1)
+        assert not second["reranked"] and not second["timed_out"]
+        assert time.perf_counter() - start < 0.02
+        assert reranker.get_stats()["busy"] == 1
+
+        await asyncio.sleep(0.25)
+        reranker.budget_ms = 1000
+        third = await reranker.rerank("revenue", ["a", "revenue"], top_k=1)
+        assert third["reranked"] and third["order"] == [1]
+        reranker.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_retrieve_with_citations_reranks(self):
+        """Test the rerank stage over-fetches and replaces vector relevance."""
+        service = make_rag_service()
+        texts = ["Revenue grew 12% on pricing.", "Debt was refinanced early.", "Cash flow was stable."]
+        for i, text in enumerate(texts):
+            await service.index_document(i + 1, text, {})
+
+        async def embed_query(query):
+            return [service.embedding_model.encode([texts[1]])[0].tolist()]
+
+        service._embed_query = embed_query
+        reranker = CrossEncoderReranker(budget_ms=1000, scorer=KeywordScorer())
+        with patch("app.services.rag_service.get_reranker", return_value=reranker):
+            result = await service.retrieve_with_citations("revenue grew", top_k=1, rerank=True)
+
+        assert result["rerank"]["reranked"]
+        assert result["rerank"]["candidates"] == 3
+        assert result["citations"][0]["content"] == texts[0]
+        assert result["citations"][0]["vector_rank"] > 1
+
+
+class TestBulkRetrieval:
+    """Test batched multi-query, multi-document retrieval."""
+
+    @pytest.mark.asyncio
+    async def test_single_query_call_with_per_document_cap(self):
+        """Test all queries share one collection query and documents are diversified."""
+        service = make_rag_service()
+        # Document 1 has many near-identical chunks that would crowd out document 2
+        await service.index_document(1, "x" * 20, {}, chunks=iter(
+            [TextChunk(index=i, text=f"Revenue note {i:02d}.") for i in range(6)]
+        ))
+        await service.index_document(2, "Revenue outlook.", {})
+        await service.index_document(3, "Unrelated filing.", {})
+
+        async def embed_query(query):
+            return [service.embedding_model.encode([query])[0].tolist()]
+
+        service._embed_query = embed_query
+        service.collection.query_calls = 0
+        result = await service.retrieve_bulk(
+            ["Revenue note 01.", "Revenue outlook."],
+            document_ids=[1, 2],
+            max_chunks_per_document=2
+        )
+
+        assert service.collection.query_calls == 1
+        assert result["total_queries"] == 2
+        for entry in result["results"]:
+            doc_ids = {doc["document_id"] for doc in entry["documents"]}
+            assert doc_ids == {1, 2}
+            assert all(len(doc["chunks"]) <= 2 for doc in entry["documents"])
+
+    @pytest.mark.asyncio
+    async def test_crowded_out_document_is_topped_up(self):
+        """Test a requested document missing from a full batched result gets its own query."""
+        service = make_rag_service()
+        await service.index_document(1, "x" * 20, {}, chunks=iter(
+            [TextChunk(index=i, text=f"Revenue note {i:02d}.") for i in range(6)]
+        ))
+        await service.index_document(2, "Cash position.", {})
+
+        async def embed_query(query):
+            return [service.embedding_model.encode([query])[0].tolist()]
+
+        service._embed_query = embed_query
+        service.collection.query_calls = 0
+        result = await service.retrieve_bulk(
+            ["Revenue note 01."], document_ids=[1, 2], max_chunks_per_document=2, candidate_k=3
+        )
+
+        assert service.collection.query_calls == 2
+        documents = {doc["document_id"]: doc for doc in result["results"][0]["documents"]}
+        assert set(documents) == {1, 2}
+        assert len(documents[1]["chunks"]) == 2
@@ -0,0 +1,257 @@
+"""
+Tests for vector store backends.
+"""
+import pytest
+import logging
+from unittest.mock import patch
+
+import numpy as np
+
+from app.config import settings
+from app.services import vector_store
+from app.services.vector_store import NumpyVectorStore, ShardRouter, ShardedVectorStore, matches_where
+
+
+def random_vectors(n, dim=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+class TestNumpyVectorStore:
+    """Test the memory-mapped numpy backend."""
+
+    def setup_method(self):
+        """Setup sample rows across two documents."""
+        self.vectors = random_vectors(40)
+        self.ids = [f"c{i}" for i in range(40)]
+        self.documents = [f"chunk {i}" for i in range(40)]
+        self.metadatas = [{"document_id": i % 2 + 1, "chunk_index": i} for i in range(40)]
+
+    def _filled(self, **kwargs):
+        store = NumpyVectorStore("test", **kwargs)
+        store.upsert(ids=self.ids, embeddings=self.vectors.tolist(),
+                     documents=self.documents, metadatas=self.metadatas)
+        return store
+
+    def test_query_matches_exact_cosine(self):
+        """Test flat search returns exact nearest neighbours with cosine distances."""
+        store = self._filled()
+        query = self.vectors[7] + 0.01
+
+        result = store.query(query_embeddings=[query.tolist()], n_results=3)
+
+        normalized = self.vectors / np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        expected = np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:3]
+        assert result["ids"][0] == [self.ids[i] for i in expected]
+        assert result["documents"][0][0] == "chunk 7"
+        assert result["distances"][0][0] == pytest.approx(0.0, abs=1e-3)
+
+    def test_where_filters_and_delete(self):
+        """Test document filters on query/get and slot reuse after delete."""
+        store = self._filled()
+
+        result = store.query(query_embeddings=[self.vectors[0].tolist()], n_results=5, where={"document_id": 2})
+        assert all(m["document_id"] == 2 for m in result["metadatas"][0])
+
+        store.delete(where={"document_id": 1})
+        assert store.count() == 20
+        assert store.get(where={"document_id": {"$in": [1]}})["ids"] == []
+
+        store.upsert(ids=["new"], embeddings=[self.vectors[0].tolist()], documents=["n"], metadatas=[{"document_id": 3}])
+        assert store.get_stats()["capacity"] == 1024
+        assert store.get(ids=["new"])["documents"] == ["n"]
+
+    def test_persistence_round_trip(self, tmp_path):
+        """Test rows, vectors and metadata survive reopening the store."""
+        store = self._filled(persist_directory=str(tmp_path))
+        store.update(ids=["c1"], metadatas=[{"document_id": 2, "chunk_index": 99}])
+        store.delete(ids=["c0"])
+        store.close()
+
+        reopened = NumpyVectorStore("test", persist_directory=str(tmp_path))
+        assert reopened.count() == 39
+        assert reopened.get(ids=["c1"])["metadatas"][0]["chunk_index"] == 99
+        result = reopened.query(query_embeddings=[self.vectors[5].tolist()], n_results=1,
+                                include=["embeddings"])
+        assert result["ids"][0] == ["c5"]
+        assert "documents" not in result
+
+    def test_ivf_recall(self):
+        """Test IVF search finds most exact neighbours once trained."""
+        vectors = random_vectors(2000, dim=32, seed=1)
+        flat = NumpyVectorStore("flat")
+        ivf = NumpyVectorStore("ivf", index_type="ivf", nlist=16, nprobe=4)
+        ids = [str(i) for i in range(len(vectors))]
+        for store in (flat, ivf):
+            store.upsert(ids=ids, embeddings=vectors.tolist(), metadatas=[{} for _ in ids])
+
+        queries = random_vectors(20, dim=32, seed=2).tolist()
+        exact = flat.query(query_embeddings=queries, n_results=10)["ids"]
+        approx = ivf.query(query_embeddings=queries, n_results=10)["ids"]
+
+        assert ivf.get_stats()["ivf_trained"]
+        recall = np.mean([len(set(a) & set(e)) / 10 for a, e in zip(approx, exact)])
+        assert recall >= 0.5
+
+    @pytest.mark.parametrize("quantization", ["float16", "int8"])
+    def test_quantized_scan_with_exact_rerank(self, quantization, tmp_path):
+        """Test quantized stores return exact distances and survive reopening."""
+        flat = self._filled()
+        quantized = self._filled(persist_directory=str(tmp_path), quantization=quantization)
+        queries = random_vectors(5, seed=9).tolist()
+
+        expected = flat.query(query_embeddings=queries, n_results=5)
+        result = quantized.query(query_embeddings=queries, n_results=5)
+
+        assert result["ids"] == expected["ids"]
+        assert np.allclose(result["distances"], expected["distances"], atol=1e-5)
+        quantized.close()
+        reopened = NumpyVectorStore("test", persist_directory=str(tmp_path))
+        assert reopened.quantization == quantization
+        assert reopened.query(query_embeddings=queries, n_results=5)["ids"] == expected["ids"]
+
+    def test_int8_without_float32_copy(self):
+        """Test dropping the float32 copy shrinks storage and stays close to exact."""
+        store = self._filled(quantization="int8", exact_rerank=False)
+        stats = store.get_stats()
+
+        assert stats["vector_bytes"] < self._filled().get_stats()["vector_bytes"] / 3
+        embedding = store.get(ids=["c3"], include=["embeddings"])["embeddings"][0]
+        normalized = self.vectors[3] / np.linalg.norm(self.vectors[3])
+        assert np.allclose(embedding, normalized, atol=0.02)
+
+
+class TestShardedVectorStore:
+    """Test shard routing, scoped queries and fan-out merging."""
+
+    def setup_method(self):
+        """Setup rows for four documents."""
+        self.vectors = random_vectors(40, seed=3)
+        self.ids = [f"c{i}" for i in range(40)]
+        self.metadatas = [{"document_id": i % 4, "company": "ACME" if i % 4 < 2 else "Globex"} for i in range(40)]
+        self.opened = {}
+        self.queried = []
+        self.fetched = []
+
+    def _open(self, name):
+        if name not in self.opened:
+            store = NumpyVectorStore(name)
+            original_query, original_get = store.query, store.get
+
+            def query(*args, **kwargs):
+                self.queried.append(name)
+                return original_query(*args, **kwargs)
+
+            def get(*args, **kwargs):
+                self.fetched.append(name)
+                return original_get(*args, **kwargs)
+
+            store.query, store.get = query, get
+            self.opened[name] = store
+        return self.opened[name]
+
+    def _sharded(self, strategy, path=None):
+        store = ShardedVectorStore(ShardRouter(strategy, base_name="idx", path=path), self._open)
+        store.upsert(ids=self.ids, embeddings=self.vectors.tolist(),
+                     documents=self.ids, metadatas=self.metadatas)
+        return store
+
+    def test_document_scoped_query_hits_one_shard(self):
+        """Test a document filter is routed to that document's shard only."""
+        store = self._sharded("document")
+
+        result = store.query(query_embeddings=[self.vectors[1].tolist()], n_results=3, where={"document_id": 1})
+
+        assert self.queried == ["idx_doc_1"]
+        assert result["ids"][0][0] == "c1"
+        assert len(self.opened) == 4
+
+    def test_global_query_merges_like_unsharded(self):
+        """Test fan-out results equal a single-store search."""
+        store = self._sharded("company")
+        single = NumpyVectorStore("single")
+        single.upsert(ids=self.ids, embeddings=self.vectors.tolist(), metadatas=self.metadatas)
+        queries = random_vectors(3, seed=4).tolist()
+
+        merged = store.query(query_embeddings=queries, n_results=5)
+
+        assert sorted(self.opened) == ["idx_co_acme", "idx_co_globex"]
+        assert merged["ids"] == single.query(query_embeddings=queries, n_results=5)["ids"]
+        assert store.count() == 40
+
+    def test_routes_persist_and_ids_are_located(self, tmp_path):
+        """Test the routing table survives restarts and updates find owning shards."""
+        path = str(tmp_path / "routes.json")
+        store = self._sharded("hash", path=path)
+
+        reopened = ShardedVectorStore(ShardRouter("hash", base_name="idx", path=path), self._open)
+        assert reopened.router.shards() == store.router.shards()
+
+        reopened.update(ids=["c5"], metadatas=[{"document_id": 1, "chunk_index": 7}])
+        reopened.delete(ids=["c6"])
+        assert reopened.get(ids=["c5"])["metadatas"][0]["chunk_index"] == 7
+        assert reopened.count() == 39
+
+    def test_chunk_ids_route_updates_and_deletes(self):
+        """Test doc_<id>_ chunk IDs reach their shard without scanning the others."""
+        store = self._sharded("document")
+        store.upsert(ids=["doc_2_a", "doc_2_b"], embeddings=self.vectors[:2].tolist(),
+                     metadatas=[{"document_id": 2}, {"document_id": 2}])
+        self.fetched.clear()
+
+        store.update(ids=["doc_2_a"], metadatas=[{"document_id": 2, "chunk_index": 3}])
+        store.delete(ids=["doc_2_b"])
+        embeddings = store.get_in_shard(2, where={"chunk_hash": {"$in": ["x"]}})
+
+        assert self.fetched == ["idx_doc_2"]
+        assert embeddings["ids"] == []
+        assert self.opened["idx_doc_2"].get(ids=["doc_2_a"])["metadatas"][0]["chunk_index"] == 3
+        assert self.opened["idx_doc_2"].count() == 11
+
+    def test_idle_shards_are_closed_beyond_limit(self, tmp_path):
+        """Test at most max_open_shards handles stay open and evicted shards reopen intact."""
+        closed = []
+
+        def open_shard(name):
+            store = NumpyVectorStore(name, str(tmp_path))
+            original = store.close
+
+            def close():
+                closed.append(name)
+                original()
+
+            store.close = close
+            return store
+
+        store = ShardedVectorStore(ShardRouter("document", base_name="idx"), open_shard, max_open_shards=2)
+        store.upsert(ids=self.ids, embeddings=self.vectors.tolist(), metadatas=self.metadatas)
+
+        assert store.get_stats()["open_shards"] == 2
+        assert len(closed) >= 2
+        assert store.count() == 40
+        store.close()
+
+
+def test_matches_where_operators():
+    """Test Chroma-style where operators."""
+    metadata = {"document_id": 3, "chunk_type": "table"}
+    assert matches_where(metadata, {"document_id": {"$in": [1, 3]}})
+    assert matches_where(metadata, {"$and": [{"document_id": {"$gte": 3}}, {"chunk_type": "table"}]})
+    assert not matches_where(metadata, {"chunk_type": {"$ne": "table"}})
+
+
+def test_quantization_on_unsupported_backend_is_warned(caplog):
+    """Test quantization configured for a non-numpy backend logs a warning when the store opens."""
+    with patch.object(settings, "vector_quantization", "int8"), \
+            patch.object(settings, "vector_shard_strategy", "none"), \
+            patch.object(vector_store, "_create_store", lambda name, backend: object()), \
+            patch.dict(vector_store._stores, clear=True), \
+            caplog.at_level(logging.WARNING, logger=vector_store.__name__):
+        vector_store.get_vector_store("quantized", backend="numpy")
+        assert caplog.text == ""
+
+        vector_store.get_vector_store("quantized", backend="chroma")
+        vector_store.get_vector_store("quantized", backend="chroma")
+
+    warnings = [r.getMessage() for r in caplog.records]
+    assert len(warnings) == 1
+    assert "'int8'" in warnings[0] and "'chroma'" in warnings[0]
@@ -0,0 +1,152 @@
+"""
+Chunking Benchmark: character chunker vs structure-aware chunker
+
+Chunks a PDF filing with both strategies used by RAGService, embeds the chunks
+with the shared embedding model and reports recall@k on probe queries along
+with index size (chunk count, stored characters, embedding bytes).
+
+Probe queries are derived from the filing itself: each financial line item or
+table row becomes a probe whose query is its label text (numbers removed) and
+whose target is the full row. A hit means a top-k chunk contains the row
+intact, i.e. the figures were retrieved together with their label.
+
+Usage (CLI): python evaluation/benchmark_chunking.py --pdf ./data/10k.pdf --k 1 3 5
+
+Requirements: backend requirements (PyMuPDF, camelot, tabula, pdfplumber,
+sentence-transformers).
+"""
+from __future__ import annotations
+
+import os
+import re
+import sys
+import json
+import random
+import argparse
+from typing import List, Dict, Any
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app.config import settings
+from app.services.embedding_registry import embedding_registry
+from app.services.enhanced_pdf_reader import EnhancedPDFReader
+from app.services.text_chunker import iter_text_chunks, iter_structured_chunks, format_table_rows
+
+
+# ----------------------------
+# Probe construction
+# ----------------------------
+
+def _squash(text: str) -> str:
+    """Lowercase and drop whitespace so layout differences don't matter."""
+    return re.sub(r"\s+", "", text).lower()
+
+
+def build_probes(parsed: Dict[str, Any], max_probes: int, seed: int = 7) -> List[Dict[str, str]]:
+    """Create (query, target) probes from line items and table rows."""
+    candidates = []
+    for block in parsed["text_blocks"]:
+        if block.block_type in ("financial_data", "table_data"):
+            candidates.append(block.text.strip())
+    for table in parsed["tables"]:
+        candidates.extend(format_table_rows(table.data)[1:])
+
+    probes = []
+    for target in candidates:
+        label = re.sub(r"[\d$%,.()|\-]+", " ", target)
+        label = " ".join(label.split())
+        # Need a meaningful label and at least one figure to retrieve
+        if len(label.split()) >= 2 and re.search(r"\d", target):
+            probes.append({"query": label, "target": target})
+
+    random.Random(seed).shuffle(probes)
+    return probes[:max_probes]
+
+
+# ----------------------------
+# Evaluation
+# ----------------------------
+
+def embed(texts: List[str]) -> np.ndarray:
+    """Embed and L2-normalize texts with the shared model."""
+    model = embedding_registry.get_model(settings.embedding_model)
+    vectors = np.asarray(model.encode(texts, batch_size=64, convert_to_numpy=True), dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def recall_at_k(chunks: List[str], probes: List[Dict[str, str]], ks: List[int]) -> Dict[int, float]:
+    """Fraction of probes whose target row is contained in a top-k chunk."""
+    chunk_vectors = embed(chunks)
+    query_vectors = embed([p["query"] for p in probes])
+    squashed = [_squash(c) for c in chunks]
+
+    ranking = np.argsort(-(query_vectors @ chunk_vectors.T), axis=1)
+    hits = {k: 0 for k in ks}
+    for probe, order in zip(probes, ranking):
+        target = _squash(probe["target"])
+        first_hit = next((rank for rank, idx in enumerate(order) if target in squashed[idx]), None)
+        for k in ks:
+            if first_hit is not None and first_hit < k:
+                hits[k] += 1
+    return {k: hits[k] / len(probes) for k in ks}
+
+
+def index_size(chunks: List[str], dim: int) -> Dict[str, Any]:
+    """Approximate index footprint for a chunking."""
+    return {
+        "chunks": len(chunks),
+        "stored_chars": sum(len(c) for c in chunks),
+        "embedding_bytes": len(chunks) * dim * 4,
+    }
+
+
+def run_benchmark(pdf_path: str, ks: List[int], max_probes: int) -> Dict[str, Any]:
+    """Compare both chunkers on one PDF."""
+    import fitz  # PyMuPDF
+
+    parsed = EnhancedPDFReader().read_pdf(pdf_path)
+    if not parsed.get("success"):
+        raise RuntimeError(f"Could not parse {pdf_path}: {parsed.get('error')}")
+
+    # Same text DocumentProcessor indexes in 'text' mode
+    with fitz.open(pdf_path) as doc:
+        full_text = "\n\n".join(page.get_text() for page in doc)
+
+    strategies = {
+        "text": [c.text for c in iter_text_chunks(full_text)],
+        "structured": [c.text for c in iter_structured_chunks(parsed["text_blocks"], parsed["tables"])],
+    }
+
+    probes = build_probes(parsed, max_probes)
+    if not probes:
+        raise RuntimeError("No line items or table rows found to build probes from")
+
+    dim = embed(["dimension probe"]).shape[1]
+    report = {"pdf": pdf_path, "probes": len(probes), "strategies": {}}
+    for name, chunks in strategies.items():
+        report["strategies"][name] = {
+            "recall_at_k": recall_at_k(chunks, probes, ks),
+            **index_size(chunks, dim),
+        }
+    return report
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark character vs structure-aware chunking")
+    p.add_argument("--pdf", required=True, help="PDF filing to benchmark on")
+    p.add_argument("--k", type=int, nargs="+", default=[1, 3, 5], help="k values for recall@k")
+    p.add_argument("--queries", type=int, default=100, help="Maximum number of probe queries")
+    p.add_argument("--out", default=None, help="Write JSON report to this path (optional)")
+    args = p.parse_args()
+
+    report = run_benchmark(args.pdf, args.k, args.queries)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
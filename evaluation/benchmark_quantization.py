@@ -0,0 +1,160 @@
+"""
+Quantization Benchmark: float32 vs float16 vs int8 embedding storage
+
+Embeds a sample corpus of SEC filings, loads it into NumpyVectorStore with
+each quantization setting and reports memory (bytes scanned per query and
+bytes stored) against recall@k relative to exact float32 search, with and
+without the exact float32 rerank of the top candidates.
+
+Queries are the opening words of randomly chosen chunks, so each has a
+natural home in the corpus; recall is measured against the float32 top-k
+for the same query rather than against that home chunk.
+
+Usage (CLI): python evaluation/benchmark_quantization.py --pdf ./data/*.pdf --k 1 5 10
+             python evaluation/benchmark_quantization.py --synthetic 200000
+
+Requirements: backend requirements (PyMuPDF, sentence-transformers) unless
+--synthetic is used.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from typing import List, Dict, Any
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app.config import settings
+from app.services.vector_store import NumpyVectorStore
+from app.services.text_chunker import iter_text_chunks
+
+
+CONFIGURATIONS = [
+    ("float32", "none", True),
+    ("float16+rerank", "float16", True),
+    ("float16", "float16", False),
+    ("int8+rerank", "int8", True),
+    ("int8", "int8", False),
+]
+
+
+# ----------------------------
+# Corpus
+# ----------------------------
+
+def load_pdf_corpus(pdf_paths: List[str], max_queries: int, seed: int = 7):
+    """Chunk and embed PDFs; queries are the first words of sampled chunks."""
+    import fitz  # PyMuPDF
+    from app.services.embedding_registry import embedding_registry
+
+    chunks = []
+    for path in pdf_paths:
+        with fitz.open(path) as doc:
+            chunks.extend(c.text for c in iter_text_chunks(page.get_text() for page in doc))
+
+    rng = random.Random(seed)
+    queries = [" ".join(c.split()[:12]) for c in rng.sample(chunks, min(max_queries, len(chunks)))]
+
+    model = embedding_registry.get_model(settings.embedding_model)
+    corpus = np.asarray(model.encode(chunks, batch_size=64, convert_to_numpy=True), dtype=np.float32)
+    query_vectors = np.asarray(model.encode(queries, batch_size=64, convert_to_numpy=True), dtype=np.float32)
+    return corpus, query_vectors
+
+
+def load_synthetic_corpus(n: int, dim: int, max_queries: int, seed: int = 7):
+    """Clustered unit vectors standing in for chunk embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(n // 500, 1), dim)).astype(np.float32)
+    corpus = centers[rng.integers(len(centers), size=n)] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+    picks = corpus[rng.choice(n, max_queries, replace=False)]
+    queries = picks + 0.1 * rng.normal(size=picks.shape).astype(np.float32)
+    return corpus, queries
+
+
+# ----------------------------
+# Evaluation
+# ----------------------------
+
+def build_store(corpus: np.ndarray, quantization: str, exact_rerank: bool, batch_size: int = 2000):
+    store = NumpyVectorStore(
+        f"bench_{quantization}",
+        quantization=quantization,
+        exact_rerank=exact_rerank,
+        initial_capacity=len(corpus)
+    )
+    for offset in range(0, len(corpus), batch_size):
+        batch = corpus[offset:offset + batch_size]
+        ids = [str(i) for i in range(offset, offset + len(batch))]
+        store.upsert(ids=ids, embeddings=batch, metadatas=[{} for _ in ids])
+    return store
+
+
+def run_benchmark(corpus: np.ndarray, queries: np.ndarray, ks: List[int]) -> Dict[str, Any]:
+    """Measure every configuration against exact float32 search."""
+    max_k = max(ks)
+    normalized = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    normalized_queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    exact = np.argsort(-(normalized_queries @ normalized.T), axis=1)[:, :max_k]
+
+    report = {"chunks": len(corpus), "dimension": corpus.shape[1], "queries": len(queries), "configurations": {}}
+    baseline_bytes = None
+    for label, quantization, exact_rerank in CONFIGURATIONS:
+        store = build_store(corpus, quantization, exact_rerank)
+        stats = store.get_stats()
+
+        start = time.perf_counter()
+        result = store.query(query_embeddings=queries, n_results=max_k, include=[])
+        elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        recall = {}
+        for k in ks:
+            hits = sum(
+                len({int(i) for i in found[:k]} & set(truth[:k].tolist()))
+                for found, truth in zip(result["ids"], exact)
+            )
+            recall[k] = hits / (len(queries) * k)
+
+        baseline_bytes = baseline_bytes or stats["scan_bytes"]
+        report["configurations"][label] = {
+            "scan_bytes": stats["scan_bytes"],
+            "stored_bytes": stats["vector_bytes"],
+            "scan_bytes_saved": 1 - stats["scan_bytes"] / baseline_bytes,
+            "recall_at_k": recall,
+            "query_ms": elapsed_ms,
+        }
+        store.close()
+    return report
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark quantized embedding storage")
+    p.add_argument("--pdf", nargs="*", default=[], help="SEC filing PDFs forming the sample corpus")
+    p.add_argument("--synthetic", type=int, default=0, help="Use N synthetic vectors instead of PDFs")
+    p.add_argument("--dim", type=int, default=384, help="Dimension of synthetic vectors")
+    p.add_argument("--k", type=int, nargs="+", default=[1, 5, 10], help="k values for recall@k")
+    p.add_argument("--queries", type=int, default=200, help="Number of queries")
+    p.add_argument("--out", default=None, help="Write JSON report to this path (optional)")
+    args = p.parse_args()
+
+    if args.synthetic:
+        corpus, queries = load_synthetic_corpus(args.synthetic, args.dim, args.queries)
+    elif args.pdf:
+        corpus, queries = load_pdf_corpus(args.pdf, args.queries)
+    else:
+        p.error("pass --pdf files or --synthetic N")
+
+    report = run_benchmark(corpus, queries, args.k)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
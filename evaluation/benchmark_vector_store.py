@@ -0,0 +1,195 @@
+"""
+Vector Store Benchmark: Chroma vs numpy flat vs numpy IVF
+
+Loads the same synthetic embedding corpus into each vector store backend
+and reports build time, single-query latency (p50/p95), recall@k against
+exact search, and memory, extrapolated to one million chunks.
+
+The corpus is a mixture of Gaussian clusters on the unit sphere, which
+behaves closer to sentence embeddings than uniform noise. Queries are
+perturbed copies of stored vectors.
+
+Usage (CLI): python evaluation/benchmark_vector_store.py --n 100000 --dim 384 --backends numpy-flat numpy-ivf chroma
+
+Requirements: numpy; chromadb for the chroma backend.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import resource
+from typing import List, Dict, Any
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app.services.vector_store import NumpyVectorStore, ChromaVectorStore
+
+
+# ----------------------------
+# Data
+# ----------------------------
+
+def make_corpus(n: int, dim: int, clusters: int = 200, seed: int = 7) -> np.ndarray:
+    """Clustered unit vectors resembling sentence embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(clusters, size=n)
+    vectors = centers[labels] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(corpus: np.ndarray, count: int, seed: int = 11) -> np.ndarray:
+    """Noisy copies of random stored vectors."""
+    rng = np.random.default_rng(seed)
+    picks = corpus[rng.choice(len(corpus), count, replace=False)]
+    queries = picks + 0.1 * rng.normal(size=picks.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform != "darwin" else peak / (1024 * 1024)
+
+
+# ----------------------------
+# Backends
+# ----------------------------
+
+def open_store(backend: str, directory: str, nlist: int, nprobe: int):
+    """Create an empty store for ``backend`` under ``directory``."""
+    if backend == "numpy-flat":
+        return NumpyVectorStore("bench", directory, index_type="flat")
+    if backend == "numpy-ivf":
+        return NumpyVectorStore("bench", directory, index_type="ivf", nlist=nlist, nprobe=nprobe)
+    if backend == "chroma":
+        import chromadb
+        from chromadb.config import Settings as ChromaSettings
+        client = chromadb.PersistentClient(path=directory, settings=ChromaSettings(anonymized_telemetry=False))
+        return ChromaVectorStore(client.get_or_create_collection("bench", metadata={"hnsw:space": "cosine"}))
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+def directory_size(path: str) -> int:
+    """Total bytes of files under ``path``."""
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(path)
+        for name in files
+    )
+
+
+def bench_backend(
+    backend: str,
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    exact: List[List[int]],
+    k: int,
+    batch_size: int,
+    nlist: int,
+    nprobe: int
+) -> Dict[str, Any]:
+    """Build, query and measure one backend."""
+    directory = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+    try:
+        rss_before = rss_mb()
+        store = open_store(backend, directory, nlist, nprobe)
+
+        start = time.perf_counter()
+        for offset in range(0, len(corpus), batch_size):
+            batch = corpus[offset:offset + batch_size]
+            ids = [str(i) for i in range(offset, offset + len(batch))]
+            store.upsert(
+                ids=ids,
+                embeddings=batch.tolist(),
+                documents=[f"chunk {i}" for i in ids],
+                metadatas=[{"document_id": int(i) % 100} for i in ids]
+            )
+        if isinstance(store, NumpyVectorStore) and store.index_type == "ivf":
+            store.train()
+        build_seconds = time.perf_counter() - start
+
+        latencies = []
+        hits = 0
+        for query, truth in zip(queries, exact):
+            start = time.perf_counter()
+            result = store.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += len({int(i) for i in result["ids"][0]} & set(truth))
+
+        disk_bytes = directory_size(directory)
+        rss_growth = max(rss_mb() - rss_before, 0.0)
+        scale = 1_000_000 / len(corpus)
+        store.close()
+        return {
+            "build_seconds": build_seconds,
+            "query_ms_p50": float(np.percentile(latencies, 50)),
+            "query_ms_p95": float(np.percentile(latencies, 95)),
+            f"recall_at_{k}": hits / (len(queries) * k),
+            "disk_mb": disk_bytes / 1e6,
+            "peak_rss_growth_mb": rss_growth,
+            "disk_mb_per_million": disk_bytes / 1e6 * scale,
+            "rss_mb_per_million": rss_growth * scale,
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run_benchmark(
+    n: int,
+    dim: int,
+    backends: List[str],
+    num_queries: int,
+    k: int,
+    batch_size: int,
+    nlist: int,
+    nprobe: int
+) -> Dict[str, Any]:
+    """Benchmark every requested backend on one synthetic corpus."""
+    corpus = make_corpus(n, dim)
+    queries = make_queries(corpus, num_queries)
+    exact = np.argsort(-(queries @ corpus.T), axis=1)[:, :k].tolist()
+
+    report = {"n": n, "dim": dim, "queries": num_queries, "k": k, "backends": {}}
+    for backend in backends:
+        try:
+            report["backends"][backend] = bench_backend(
+                backend, corpus, queries, exact, k, batch_size, nlist, nprobe
+            )
+        except ImportError as e:
+            report["backends"][backend] = {"skipped": str(e)}
+    return report
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark vector store backends")
+    p.add_argument("--n", type=int, default=50000, help="Number of stored vectors")
+    p.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    p.add_argument("--backends", nargs="+", default=["numpy-flat", "numpy-ivf", "chroma"])
+    p.add_argument("--queries", type=int, default=200, help="Number of timed queries")
+    p.add_argument("--k", type=int, default=10, help="Neighbours per query")
+    p.add_argument("--batch-size", type=int, default=1000, help="Upsert batch size")
+    p.add_argument("--nlist", type=int, default=256, help="IVF cells")
+    p.add_argument("--nprobe", type=int, default=8, help="IVF cells probed per query")
+    p.add_argument("--out", default=None, help="Write JSON report to this path (optional)")
+    args = p.parse_args()
+
+    report = run_benchmark(
+        args.n, args.dim, args.backends, args.queries, args.k,
+        args.batch_size, args.nlist, args.nprobe
+    )
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -38,7 +38,17 @@ try:
 except Exception:  # graceful if not installed
     genai = None
 
+# Share the backend's process-wide model/collection registry when available
+_BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+if os.path.isdir(_BACKEND_DIR) and _BACKEND_DIR not in sys.path:
+    sys.path.append(_BACKEND_DIR)
+try:
+    from app.services.embedding_registry import embedding_registry
+except Exception:  # standalone use without the backend package
+    embedding_registry = None
+
 DEFAULT_EMBED_MODEL = "all-MiniLM-L6-v2"
+_EMBEDDERS: Dict[str, SentenceTransformer] = {}
 
 # ----------------------------
 # Data Loading & Preparation
@@ -175,12 +185,25 @@ def build_text_chunks(df: pd.DataFrame, max_rows: int = 2000) -> List[Dict[str,
     return chunks
 
 
+def get_embedder(model_name: str = DEFAULT_EMBED_MODEL) -> SentenceTransformer:
+    """Return a shared embedder, loading it at most once per process."""
+    if embedding_registry is not None:
+        return embedding_registry.get_model(model_name)
+    if model_name not in _EMBEDDERS:
+        _EMBEDDERS[model_name] = SentenceTransformer(model_name)
+    return _EMBEDDERS[model_name]
+
+
 def build_index(chunks: List[Dict[str, Any]], persist_path: Optional[str] = None) -> Tuple[chromadb.Client, Any]:
     """Create a Chroma collection and upsert chunk embeddings."""
-    client = chromadb.PersistentClient(path=persist_path, settings=Settings(anonymized_telemetry=False)) if persist_path else chromadb.Client(Settings(anonymized_telemetry=False))
-    collection = client.get_or_create_collection(name="mda_chunks")
+    if embedding_registry is not None:
+        client = embedding_registry.get_client(persist_path)
+        collection = embedding_registry.get_collection("mda_chunks", persist_path)
+    else:
+        client = chromadb.PersistentClient(path=persist_path, settings=Settings(anonymized_telemetry=False)) if persist_path else chromadb.Client(Settings(anonymized_telemetry=False))
+        collection = client.get_or_create_collection(name="mda_chunks")
     # Embed
-    embedder = SentenceTransformer(DEFAULT_EMBED_MODEL)
+    embedder = get_embedder()
     texts = [c["text"] for c in chunks]
     embs = embedder.encode(texts, convert_to_numpy=True).tolist()
     ids = [c["id"] for c in chunks]
@@ -191,8 +214,8 @@ def build_index(chunks: List[Dict[str, Any]], persist_path: Optional[str] = None
 
 def retrieve(collection, query: str, top_k: int = 8) -> Dict[str, Any]:
     """Retrieve top_k chunks for a query."""
-    # Use embedder again to get query embedding for better relevance
-    embedder = SentenceTransformer(DEFAULT_EMBED_MODEL)
+    # Reuse the shared embedder rather than reloading the model per query
+    embedder = get_embedder()
     q_emb = embedder.encode([query], convert_to_numpy=True).tolist()
     res = collection.query(query_embeddings=q_emb, n_results=top_k)
     return res